@@ -1,8 +1,9 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Request, WebSocket, WebSocketDisconnect
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
@@ -19,6 +20,9 @@ from services.supabase_service import supabase_service
 from services.payment_service import payment_service
 from services.ai_analysis_service import ai_analysis_service
 from services.marketplace_service import marketplace_service
+from services.market_data import market_data_hub, asset_channel, user_channel
+from services.candle_service import candle_service
+from services.price_oracle import price_oracle
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -32,6 +36,8 @@ api_router = APIRouter(prefix="/api")
 # Security
 security = HTTPBearer()
 JWT_SECRET = os.getenv("JWT_SECRET_KEY", "solcraft-nexus-super-secret-jwt-key-2024")
+# Wallet addresses allowed to call maintenance endpoints (comma-separated)
+ADMIN_ADDRESSES = {address.strip() for address in os.getenv("ADMIN_WALLET_ADDRESSES", "").split(",") if address.strip()}
 
 # Pydantic models
 class WalletConnection(BaseModel):
@@ -107,9 +113,39 @@ class CreateOrderRequest(BaseModel):
     side: str        # "buy", "sell"
     quantity: int
     price: Optional[float] = None
+    stop_price: Optional[float] = None  # required for "stop"; with price it is a stop-limit
+    time_in_force: str = "GTC"          # "GTC", "IOC", "FOK"
     user_id: Optional[str] = None
     wallet_address: Optional[str] = None
 
+class BatchOrderItem(BaseModel):
+    asset_id: str
+    order_type: str
+    side: str
+    quantity: int
+    price: Optional[float] = None
+    stop_price: Optional[float] = None
+    time_in_force: str = "GTC"
+
+class BatchCreateOrdersRequest(BaseModel):
+    orders: List[BatchOrderItem]
+    user_id: Optional[str] = None
+    wallet_address: Optional[str] = None
+
+class ReplaceOrderItem(BaseModel):
+    order_id: str
+    quantity: Optional[int] = None
+    price: Optional[float] = None
+    stop_price: Optional[float] = None
+
+class BatchReplaceOrdersRequest(BaseModel):
+    orders: List[ReplaceOrderItem]
+    user_id: str
+
+class BatchCancelOrdersRequest(BaseModel):
+    order_ids: List[str]
+    user_id: str
+
 # Authentication dependency
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
@@ -120,6 +156,11 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+async def get_admin_user(user=Depends(get_current_user)):
+    if user.get("address") not in ADMIN_ADDRESSES:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
+
 # Basic endpoints
 @api_router.get("/")
 async def root():
@@ -147,7 +188,10 @@ async def health_check():
             "database": db_health["status"],
             "xrpl": "connected",
             "xumm": "available" if xumm_service.is_available() else "unavailable"
-        }
+        },
+        "xrpl_cache": xrpl_service.cache.stats(),
+        "xrpl_single_flight": xrpl_service.single_flight.stats(),
+        "market_data": market_data_hub.stats()
     }
 
 # Wallet endpoints
@@ -206,19 +250,15 @@ async def connect_wallet(wallet_data: WalletConnection):
 async def get_wallet_balance(address: str):
     """Get wallet XRP and token balances"""
     try:
-        # Get XRP balance
-        account_info = await xrpl_service.get_account_info(address)
+        # Issue XRP balance and token lookups together so they are in flight
+        # concurrently on the shared XRPL transport
+        account_info, user_tokens = await asyncio.gather(
+            xrpl_service.get_account_info(address),
+            tokenization_service.get_user_tokens(address)
+        )
         if not account_info["success"]:
             raise HTTPException(status_code=404, detail="Account not found")
         
-        # Get token balances
-        tokens = await xrpl_service.get_account_tokens(address)
-        if not tokens["success"]:
-            tokens = {"tokens": [], "count": 0}
-        
-        # Get user's tokenized assets
-        user_tokens = await tokenization_service.get_user_tokens(address)
-        
         return {
             "success": True,
             "address": address,
@@ -608,9 +648,11 @@ async def get_marketplace_assets(
     sort_by: str = "created_at",
     sort_order: str = "desc",
     limit: int = 50,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    include_total: bool = False
 ):
-    """Get marketplace assets with optional filtering"""
+    """Get marketplace assets with optional filtering (continue with next_cursor)"""
     try:
         assets = await marketplace_service.list_marketplace_assets(
             category=category,
@@ -619,17 +661,62 @@ async def get_marketplace_assets(
             sort_by=sort_by,
             sort_order=sort_order,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=cursor,
+            include_total=include_total
         )
         
         return {
             "status": "success",
             "data": assets
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching marketplace assets: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _split_param(value: Optional[str]) -> Optional[List[str]]:
+    return [item.strip() for item in value.split(",") if item.strip()] if value else None
+
+@api_router.get("/marketplace/search")
+async def search_marketplace_assets(
+    q: Optional[str] = None,
+    category: Optional[str] = None,
+    asset_type: Optional[str] = None,
+    apy_range: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort_by: Optional[str] = None,
+    sort_order: str = "desc",
+    limit: int = 50,
+    offset: int = 0
+):
+    """Search marketplace assets with facet counts (facet filters take comma-separated values)"""
+    try:
+        results = await marketplace_service.search_marketplace_assets(
+            query=q,
+            categories=_split_param(category),
+            asset_types=_split_param(asset_type),
+            apy_ranges=_split_param(apy_range),
+            min_price=min_price,
+            max_price=max_price,
+            sort_by=sort_by,
+            sort_order=sort_order,
+            limit=limit,
+            offset=offset
+        )
+
+        return {
+            "status": "success",
+            "data": results
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error searching marketplace assets: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.get("/marketplace/assets/{asset_id}")
 async def get_asset_details(asset_id: str):
     """Get detailed information about a specific asset"""
@@ -644,6 +731,94 @@ async def get_asset_details(asset_id: str):
         logger.error(f"Error fetching asset details: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/marketplace/assets/{asset_id}/order-book")
+async def get_order_book(asset_id: str, depth: Optional[int] = None):
+    """Get aggregated order book depth for an asset"""
+    try:
+        order_book = await marketplace_service.get_order_book(asset_id, depth)
+        
+        return {
+            "status": "success",
+            "data": order_book
+        }
+    except Exception as e:
+        logger.error(f"Error fetching order book: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/marketplace/assets/{asset_id}/order-book/diffs")
+async def get_order_book_diffs(asset_id: str, since: int, epoch: Optional[str] = None):
+    """Get order book diffs after a snapshot sequence number (and epoch)"""
+    try:
+        diffs = await marketplace_service.get_order_book_diffs(asset_id, since, epoch)
+        
+        return {
+            "status": "success",
+            "data": diffs
+        }
+    except Exception as e:
+        logger.error(f"Error fetching order book diffs: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/marketplace/assets/{asset_id}/price")
+async def get_asset_price(asset_id: str, source: Optional[str] = None):
+    """Get the reference market price of an asset (mid, last trade or VWAP)"""
+    try:
+        result = marketplace_service.get_market_price(asset_id, source)
+        
+        return {
+            "status": "success",
+            "data": result["price"]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching market price: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/marketplace/assets/{asset_id}/candles")
+async def get_asset_candles(
+    asset_id: str,
+    interval: str = "1h",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    limit: int = 500
+):
+    """Get OHLCV candles (1m, 5m, 15m, 1h, 4h, 1d) for an asset"""
+    try:
+        candles = await marketplace_service.get_price_candles(
+            asset_id=asset_id,
+            interval=interval,
+            start=start,
+            end=end,
+            limit=limit
+        )
+        
+        return {
+            "status": "success",
+            "data": candles
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching candles: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/marketplace/assets/{asset_id}/candles/backfill")
+async def backfill_asset_candles(
+    asset_id: str,
+    start: Optional[str] = None,
+    user=Depends(get_admin_user)
+):
+    """Rebuild stored candles for an asset from its trade history (admins only)"""
+    result = await candle_service.backfill(asset_id, start=start)
+    if not result["success"]:
+        raise HTTPException(status_code=500, detail=result["error"])
+    
+    return {
+        "status": "success",
+        "data": result
+    }
+
 @api_router.get("/marketplace/categories")
 async def get_marketplace_categories():
     """Get available marketplace categories"""
@@ -671,35 +846,100 @@ async def create_order(request: CreateOrderRequest):
             order_type=request.order_type,
             side=request.side,
             quantity=request.quantity,
-            price=request.price
+            price=request.price,
+            stop_price=request.stop_price,
+            time_in_force=request.time_in_force
         )
         
         return {
             "status": "success",
             "data": order_result
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating order: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/marketplace/orders/batch")
+async def create_orders_batch(request: BatchCreateOrdersRequest):
+    """Create and match up to MARKETPLACE_MAX_BATCH_ORDERS orders at once"""
+    try:
+        result = await marketplace_service.create_orders(
+            user_id=request.user_id or "anonymous",
+            wallet_address=request.wallet_address or "",
+            orders=[order.dict() for order in request.orders]
+        )
+        
+        return {
+            "status": "success",
+            "data": result
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating order batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/marketplace/orders/replace")
+async def replace_orders_batch(request: BatchReplaceOrdersRequest):
+    """Cancel/replace a batch of open orders"""
+    try:
+        result = await marketplace_service.replace_orders(
+            user_id=request.user_id,
+            replacements=[order.dict(exclude_none=True) for order in request.orders]
+        )
+        
+        return {
+            "status": "success",
+            "data": result
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error replacing order batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/marketplace/orders/cancel")
+async def cancel_orders_batch(request: BatchCancelOrdersRequest):
+    """Cancel a batch of open orders"""
+    try:
+        result = await marketplace_service.cancel_orders(request.order_ids, request.user_id)
+        
+        return {
+            "status": "success",
+            "data": result
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error cancelling order batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.get("/marketplace/orders/{user_id}")
 async def get_user_orders(
     user_id: str,
     status: Optional[str] = None,
-    limit: int = 50
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    include_total: bool = False
 ):
-    """Get user's trading orders"""
+    """Get user's trading orders (continue with next_cursor)"""
     try:
         orders = await marketplace_service.get_user_orders(
             user_id=user_id,
             status=status,
-            limit=limit
+            limit=limit,
+            cursor=cursor,
+            include_total=include_total
         )
         
         return {
             "status": "success",
             "data": orders
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching user orders: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -714,6 +954,8 @@ async def cancel_order(order_id: str, user_id: str):
             "status": "success",
             "data": result
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error cancelling order: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -722,24 +964,107 @@ async def cancel_order(order_id: str, user_id: str):
 async def get_trading_history(
     user_id: Optional[str] = None,
     asset_id: Optional[str] = None,
-    limit: int = 100
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    include_total: bool = False
 ):
-    """Get trading history"""
+    """Get trading history (continue with next_cursor)"""
     try:
         history = await marketplace_service.get_trading_history(
             user_id=user_id,
             asset_id=asset_id,
-            limit=limit
+            limit=limit,
+            cursor=cursor,
+            include_total=include_total
         )
         
         return {
             "status": "success",
             "data": history
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching trading history: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def _stream_channels(assets: Optional[List[str]], user_id: Optional[str]) -> List[str]:
+    channels = [asset_channel(asset_id) for asset_id in (assets or []) if asset_id]
+    if user_id:
+        channels.append(user_channel(user_id))
+    return channels
+
+async def _send_snapshots(websocket: WebSocket, channels: List[str]):
+    for channel in channels:
+        if channel.startswith("asset:"):
+            snapshot = await marketplace_service.book_snapshot(channel.split(":", 1)[1])
+            await websocket.send_json({"channel": channel, "type": "snapshot", "data": snapshot})
+
+@api_router.websocket("/marketplace/stream")
+async def marketplace_stream(
+    websocket: WebSocket,
+    assets: Optional[str] = None,
+    user_id: Optional[str] = None
+):
+    """Stream book diffs and trades per asset and order updates per user
+    
+    Subscribe with ?assets=a,b&user_id=u or by sending
+    {"action": "subscribe" | "unsubscribe", "assets": [...], "user_id": "..."}.
+    Each asset subscription starts with a book snapshot; apply the diffs whose
+    sequence is above the snapshot's. After an "overflow" event the client
+    was too slow and fresh snapshots follow.
+    """
+    await websocket.accept()
+    subscription = market_data_hub.open()
+    
+    def subscribe(channels: List[str]):
+        # Subscribe before snapshotting so no diff can fall in between; the
+        # snapshots are sent by send(), the only writer to the socket
+        subscription.subscribe(channels)
+        subscription.request_snapshots(channels)
+    
+    async def receive():
+        while True:
+            message = await websocket.receive_json()
+            channels = _stream_channels(message.get("assets"), message.get("user_id"))
+            if message.get("action") == "unsubscribe":
+                subscription.unsubscribe(channels)
+            else:
+                subscribe(channels)
+    
+    async def send():
+        while True:
+            event = await subscription.get()
+            if event["type"] == "overflow":
+                # Dropped events cannot be replayed (the queue was cleared
+                # behind the notice): start over from fresh snapshots
+                subscription.overflowed = False
+                await websocket.send_json(event)
+                await _send_snapshots(websocket, list(subscription.channels))
+                continue
+            if event["type"] == "snapshot_request":
+                await _send_snapshots(
+                    websocket, [channel for channel in event["channels"] if channel in subscription.channels]
+                )
+                continue
+            await websocket.send_json(event)
+    
+    tasks = []
+    try:
+        subscribe(_stream_channels(assets.split(",") if assets else None, user_id))
+        tasks = [asyncio.create_task(receive()), asyncio.create_task(send())]
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Error in marketplace stream: {str(e)}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        subscription.close()
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -761,15 +1086,36 @@ logger = logging.getLogger(__name__)
 @app.on_event("startup")
 async def startup_event():
     logger.info("Solcraft Nexus API started with Supabase")
-    logger.info(f"XRPL Network: {xrpl_service.network}")
+    logger.info(f"XRPL Network: {xrpl_service.network} (transport: {xrpl_service.transport})")
     logger.info(f"XUMM Available: {xumm_service.is_available()}")
     
+    # Open pooled XRPL connections
+    await xrpl_service.startup()
+    
     # Initialize database tables
     await supabase_service.initialize_tables()
+    supabase_service.start_platform_stats_refresh()
+    
+    # Rebuild marketplace order books from open orders
+    await price_oracle.load()
+    marketplace_service.start_matching_engine()
+    await marketplace_service.load_order_books()
+    marketplace_service.start_order_writer()
+    marketplace_service.start_expiry_sweeper()
+    candle_service.start()
+    price_oracle.start()
     
     db_health = await supabase_service.health_check()
     logger.info(f"Supabase Status: {db_health['status']}")
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    logger.info("Solcraft Nexus API shutting down")
\ No newline at end of file
+    logger.info("Solcraft Nexus API shutting down")
+    await xrpl_service.shutdown()
+    await marketplace_service.stop_expiry_sweeper()
+    await marketplace_service.stop_order_writer()
+    await marketplace_service.stop_matching_engine()
+    await candle_service.stop()
+    await price_oracle.stop()
+    await supabase_service.stop_platform_stats_refresh()
+    supabase_service.shutdown()
\ No newline at end of file
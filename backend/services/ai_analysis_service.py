@@ -8,7 +8,7 @@ import uuid
 from typing import Dict, Any, List, Optional
 from datetime import datetime
 from emergentintegrations.llm.chat import LlmChat, UserMessage
-from .supabase_service import get_supabase_client
+from .supabase_service import get_supabase_client, execute_query
 
 class AIAnalysisService:
     def __init__(self):
@@ -467,7 +467,7 @@ class AIAnalysisService:
         }
         
         try:
-            result = supabase.table("ai_analyses").insert(analysis_data).execute()
+            result = await execute_query(supabase.table("ai_analyses").insert(analysis_data))
             return result.data[0] if result.data else {"id": session_id}
         except Exception as e:
             # If table doesn't exist, return mock response
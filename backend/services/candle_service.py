@@ -0,0 +1,331 @@
+"""
+Solcraft Nexus - Candle Service
+OHLCV bars rolled up from marketplace trades, kept incrementally and served
+from the candles table (database/candles.sql)
+"""
+
+import os
+import asyncio
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from .supabase_service import get_supabase_client, execute_query
+
+logger = logging.getLogger(__name__)
+
+# Intervals stored in the candles table
+BASE_INTERVALS = {
+    "1m": 60,
+    "5m": 300,
+    "1h": 3600,
+    "1d": 86400
+}
+
+# Every interval that can be served; the others are downsampled from a base interval
+INTERVALS = {
+    "1m": 60,
+    "5m": 300,
+    "15m": 900,
+    "1h": 3600,
+    "4h": 14400,
+    "1d": 86400
+}
+
+BarKey = Tuple[str, str, int]  # (asset_id, interval, bucket start as epoch seconds)
+
+
+def to_epoch(value: Any) -> int:
+    """Epoch seconds of an ISO timestamp (naive timestamps are taken as UTC)"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def to_iso(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat()
+
+
+def aggregate_bars(ts: np.ndarray, open_: np.ndarray, high: np.ndarray, low: np.ndarray,
+                   close: np.ndarray, volume: np.ndarray, count: np.ndarray,
+                   seconds: int) -> Dict[str, np.ndarray]:
+    """Roll rows sorted by ``ts`` into ``seconds``-wide bars
+
+    Rows may be trades (open = high = low = close = price, count = 1) or bars
+    of a finer interval, so the same pass serves backfills and downsampling.
+    """
+    buckets = (ts // seconds) * seconds
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+
+    return {
+        "bucket": buckets[starts],
+        "open": open_[starts],
+        "high": np.maximum.reduceat(high, starts),
+        "low": np.minimum.reduceat(low, starts),
+        "close": close[ends],
+        "volume": np.add.reduceat(volume, starts),
+        "trade_count": np.add.reduceat(count, starts)
+    }
+
+
+def merge_bar(bar: Dict[str, Any], delta: Dict[str, Any]):
+    """Fold a later partial bar into ``bar`` in place"""
+    bar["high"] = max(bar["high"], delta["high"])
+    bar["low"] = min(bar["low"], delta["low"])
+    bar["close"] = delta["close"]
+    bar["volume"] += delta["volume"]
+    bar["trade_count"] += delta["trade_count"]
+
+
+class CandleService:
+    """Incremental OHLCV aggregation
+
+    Trades update per-bucket deltas in memory; a background task merges the
+    deltas into the candles table with the merge_candles() function, which
+    keeps the stored open and adds volume, so writes are correct across
+    restarts and across processes trading different assets.
+    """
+
+    def __init__(self):
+        self.flush_interval = float(os.getenv("CANDLE_FLUSH_INTERVAL", "2"))
+        self.max_bars = int(os.getenv("CANDLE_MAX_BARS", "1000"))
+        # Not yet written: (asset, interval, bucket) -> partial bar
+        self.pending: Dict[BarKey, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def add_trade(self, trade: Dict[str, Any]):
+        """Apply one trade to every base interval"""
+        ts = to_epoch(trade["created_at"])
+        price = float(trade["price"])
+        quantity = float(trade["quantity"])
+
+        for interval, seconds in BASE_INTERVALS.items():
+            key = (trade["asset_id"], interval, ts - ts % seconds)
+            delta = {
+                "open": price, "high": price, "low": price, "close": price,
+                "volume": quantity, "trade_count": 1
+            }
+            bar = self.pending.get(key)
+            if bar is None:
+                self.pending[key] = delta
+            else:
+                merge_bar(bar, delta)
+
+    async def flush(self):
+        if not self.pending:
+            return
+
+        pending, self.pending = self.pending, {}
+        rows = [
+            {"asset_id": asset_id, "interval": interval, "bucket_start": to_iso(bucket), **bar}
+            for (asset_id, interval, bucket), bar in pending.items()
+        ]
+
+        try:
+            supabase = get_supabase_client()
+            await execute_query(supabase.rpc("merge_candles", {"bars": rows}))
+        except Exception as e:
+            logger.error(f"Error writing {len(rows)} candle updates: {str(e)}")
+            # Keep the deltas (and anything that arrived meanwhile) for the next flush
+            for key, bar in pending.items():
+                later = self.pending.get(key)
+                if later is not None:
+                    merge_bar(bar, later)
+                self.pending[key] = bar
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def get_candles(
+        self,
+        asset_id: str,
+        interval: str = "1h",
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: int = 500
+    ) -> List[Dict[str, Any]]:
+        """Bars for ``[start, end)``, oldest first (by default the latest ``limit`` bars)"""
+        if interval not in INTERVALS:
+            raise ValueError(f"Unsupported interval: {interval}")
+
+        limit = min(limit, self.max_bars)
+        seconds = INTERVALS[interval]
+        # Coarsest stored interval that evenly divides the requested one
+        base = max(
+            (name for name, base_seconds in BASE_INTERVALS.items() if seconds % base_seconds == 0),
+            key=BASE_INTERVALS.get
+        )
+        base_seconds = BASE_INTERVALS[base]
+
+        end_ts = to_epoch(end) if end else to_epoch(datetime.now(timezone.utc)) + seconds
+        end_ts -= end_ts % seconds
+        start_ts = to_epoch(start) if start else end_ts - limit * seconds
+        start_ts -= start_ts % seconds
+
+        supabase = get_supabase_client()
+        result = await execute_query(
+            supabase.table("candles")
+            .select("bucket_start, open, high, low, close, volume, trade_count")
+            .eq("asset_id", asset_id)
+            .eq("interval", base)
+            .gte("bucket_start", to_iso(start_ts))
+            .lt("bucket_start", to_iso(end_ts))
+            .order("bucket_start")
+            .limit(limit * (seconds // base_seconds))
+        )
+
+        bars = {
+            to_epoch(row["bucket_start"]): {
+                "open": float(row["open"]), "high": float(row["high"]),
+                "low": float(row["low"]), "close": float(row["close"]),
+                "volume": float(row["volume"]), "trade_count": int(row["trade_count"])
+            }
+            for row in result.data
+        }
+
+        # Overlay updates that have not been flushed yet
+        for (pending_asset, pending_interval, bucket), delta in self.pending.items():
+            if pending_asset != asset_id or pending_interval != base or not start_ts <= bucket < end_ts:
+                continue
+            if bucket in bars:
+                merge_bar(bars[bucket], delta)
+            else:
+                bars[bucket] = dict(delta)
+
+        if not bars:
+            return []
+
+        buckets = sorted(bars)
+        if base_seconds == seconds:
+            return [{"time": to_iso(bucket), **bars[bucket]} for bucket in buckets][-limit:]
+
+        columns = {
+            field: np.array([bars[bucket][field] for bucket in buckets], dtype=float)
+            for field in ("open", "high", "low", "close", "volume", "trade_count")
+        }
+        rolled = aggregate_bars(
+            np.array(buckets, dtype=np.int64), columns["open"], columns["high"], columns["low"],
+            columns["close"], columns["volume"], columns["trade_count"], seconds
+        )
+        return self._rows(rolled)[-limit:]
+
+    async def backfill(self, asset_id: str, start: Optional[str] = None,
+                       end: Optional[str] = None, page_size: int = 10000) -> Dict[str, Any]:
+        """Rebuild stored bars for an asset from raw trades
+
+        Only buckets that closed before ``end`` (default: now) are written, so
+        live updates for the current bars are not overwritten. ``start`` is
+        aligned down to the start of its day, the widest stored bucket, so no
+        bar is rebuilt from only part of its trades. Pending deltas are flushed
+        first: the rebuilt bars replace stored ones, and a delta merged after
+        them would count its trades a second time.
+        """
+        supabase = get_supabase_client()
+        end_ts = to_epoch(end) if end else to_epoch(datetime.now(timezone.utc))
+        start_ts = None
+        if start:
+            start_ts = to_epoch(start)
+            start_ts -= start_ts % max(BASE_INTERVALS.values())
+
+        await self.flush()
+        if any(pending_asset == asset_id and bucket < end_ts for pending_asset, _, bucket in self.pending):
+            return {"success": False, "asset_id": asset_id, "error": "Pending candle updates could not be written"}
+
+        try:
+            ts_parts: List[np.ndarray] = []
+            price_parts: List[np.ndarray] = []
+            quantity_parts: List[np.ndarray] = []
+            offset = 0
+
+            while True:
+                query = supabase.table("trades").select("created_at, price, quantity") \
+                    .eq("asset_id", asset_id).lt("created_at", to_iso(end_ts))
+                if start_ts is not None:
+                    query = query.gte("created_at", to_iso(start_ts))
+                result = await execute_query(
+                    query.order("created_at").order("id").range(offset, offset + page_size - 1)
+                )
+
+                if result.data:
+                    ts_parts.append(np.array([to_epoch(row["created_at"]) for row in result.data], dtype=np.int64))
+                    price_parts.append(np.array([row["price"] for row in result.data], dtype=float))
+                    quantity_parts.append(np.array([row["quantity"] for row in result.data], dtype=float))
+
+                if len(result.data) < page_size:
+                    break
+                offset += page_size
+
+            if not ts_parts:
+                return {"success": True, "asset_id": asset_id, "trades": 0, "bars": 0}
+
+            ts = np.concatenate(ts_parts)
+            prices = np.concatenate(price_parts)
+            quantities = np.concatenate(quantity_parts)
+            counts = np.ones(len(ts))
+
+            rows = []
+            for interval, seconds in BASE_INTERVALS.items():
+                rolled = aggregate_bars(ts, prices, prices, prices, prices, quantities, counts, seconds)
+                closed = rolled["bucket"] + seconds <= end_ts
+                for bar in self._rows({field: values[closed] for field, values in rolled.items()}):
+                    bar["bucket_start"] = bar.pop("time")
+                    rows.append({"asset_id": asset_id, "interval": interval, **bar})
+
+            for i in range(0, len(rows), page_size):
+                await execute_query(
+                    supabase.table("candles").upsert(
+                        rows[i:i + page_size], on_conflict="asset_id,interval,bucket_start"
+                    )
+                )
+
+            logger.info(f"Backfilled {len(rows)} candles for {asset_id} from {len(ts)} trades")
+            return {"success": True, "asset_id": asset_id, "trades": int(len(ts)), "bars": len(rows)}
+
+        except Exception as e:
+            logger.error(f"Error backfilling candles for {asset_id}: {str(e)}")
+            return {"success": False, "asset_id": asset_id, "error": str(e)}
+
+    @staticmethod
+    def _rows(bars: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+        return [
+            {
+                "time": to_iso(int(bucket)),
+                "open": float(open_),
+                "high": float(high),
+                "low": float(low),
+                "close": float(close),
+                "volume": float(volume),
+                "trade_count": int(count)
+            }
+            for bucket, open_, high, low, close, volume, count in zip(
+                bars["bucket"], bars["open"], bars["high"], bars["low"],
+                bars["close"], bars["volume"], bars["trade_count"]
+            )
+        ]
+
+
+# Global service instance
+candle_service = CandleService()
@@ -0,0 +1,260 @@
+"""
+Solcraft Nexus - Token Holder Index
+Per-token holder balances seeded once from AccountLines and kept current from
+validated transaction metadata
+"""
+
+import os
+import json
+import heapq
+import asyncio
+from decimal import Decimal
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TokenHolderIndex:
+    """Holder balances of one issued currency, with O(1) holder count and supply"""
+
+    def __init__(self, currency: str, issuer: str, ledger_index: Optional[int] = None,
+                 balances: Optional[Dict[str, Decimal]] = None):
+        self.currency = currency
+        self.issuer = issuer
+        # Last validated ledger whose changes are reflected in the index
+        self.ledger_index = ledger_index
+        # holder address -> positive amount held (zero balances are not stored)
+        self.balances: Dict[str, Decimal] = {}
+        self.supply = Decimal("0")
+        self.dirty = False
+
+        for holder, amount in (balances or {}).items():
+            self.set_balance(holder, amount)
+        self.dirty = False
+
+    @property
+    def holder_count(self) -> int:
+        return len(self.balances)
+
+    def set_balance(self, holder: str, amount: Decimal):
+        """Replace a holder's balance, keeping supply and count in step"""
+        previous = self.balances.get(holder, Decimal("0"))
+        if amount > 0:
+            self.balances[holder] = amount
+        else:
+            amount = Decimal("0")
+            self.balances.pop(holder, None)
+
+        if amount != previous:
+            self.supply += amount - previous
+            self.dirty = True
+
+    def top_holders(self, n: int = 10) -> List[Dict[str, Any]]:
+        """Largest holders by balance"""
+        top = heapq.nlargest(n, self.balances.items(), key=lambda item: item[1])
+        return [{"address": holder, "balance": float(amount)} for holder, amount in top]
+
+    def apply_ripple_state(self, fields: Dict[str, Any], deleted: bool = False):
+        """Apply the final state of a RippleState (trustline) ledger entry"""
+        balance = fields.get("Balance")
+        if not isinstance(balance, dict) or balance.get("currency") != self.currency:
+            return
+
+        high = fields.get("HighLimit", {}).get("issuer")
+        low = fields.get("LowLimit", {}).get("issuer")
+        # Balance is expressed from the low account's side of the line
+        if high == self.issuer:
+            holder, sign = low, Decimal("1")
+        elif low == self.issuer:
+            holder, sign = high, Decimal("-1")
+        else:
+            return
+
+        amount = Decimal("0") if deleted else Decimal(balance["value"]) * sign
+        self.set_balance(holder, amount)
+
+    def apply_metadata(self, meta: Dict[str, Any]):
+        """Apply every trustline change for this token in a transaction's metadata"""
+        for affected in meta.get("AffectedNodes", []):
+            for kind, node in affected.items():
+                if node.get("LedgerEntryType") != "RippleState":
+                    continue
+                if kind == "CreatedNode":
+                    self.apply_ripple_state(node.get("NewFields", {}))
+                elif kind == "ModifiedNode":
+                    self.apply_ripple_state(node.get("FinalFields", {}))
+                elif kind == "DeletedNode":
+                    self.apply_ripple_state(node.get("FinalFields", {}), deleted=True)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "currency": self.currency,
+            "issuer": self.issuer,
+            "ledger_index": self.ledger_index,
+            "balances": {holder: str(amount) for holder, amount in self.balances.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TokenHolderIndex":
+        return cls(
+            currency=data["currency"],
+            issuer=data["issuer"],
+            ledger_index=data.get("ledger_index"),
+            balances={holder: Decimal(amount) for holder, amount in data.get("balances", {}).items()}
+        )
+
+
+class HolderIndexRegistry:
+    """Tracks holder indexes for requested tokens and keeps them current
+
+    An index is loaded from its on-disk snapshot (or seeded with one full
+    AccountLines scan pinned to a validated ledger) the first time a token is
+    requested. A background task then replays the issuer's validated transactions
+    since the indexed ledger and persists the snapshot. Snapshot files are read
+    and written on a worker thread, never on the event loop.
+    """
+
+    def __init__(self, xrpl_service):
+        self.xrpl = xrpl_service
+        self.snapshot_dir = Path(os.getenv(
+            "XRPL_HOLDER_INDEX_DIR",
+            str(Path(__file__).parent.parent / "data" / "holder_index")
+        ))
+        self.sync_interval = float(os.getenv("XRPL_HOLDER_INDEX_SYNC_INTERVAL", "4"))
+        # Reseed instead of replaying when a snapshot is this many ledgers behind
+        self.max_replay_ledgers = int(os.getenv("XRPL_HOLDER_INDEX_MAX_REPLAY", "20000"))
+
+        self.indexes: Dict[Tuple[str, str], TokenHolderIndex] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    async def get_index(self, currency: str, issuer: str) -> TokenHolderIndex:
+        """Get a token's holder index, loading or seeding it on first use"""
+        key = (currency, issuer)
+        index = self.indexes.get(key)
+        if index is not None:
+            return index
+
+        return await self.xrpl.single_flight.do(("holder_index", key), lambda: self._load(key))
+
+    async def _load(self, key: Tuple[str, str]) -> TokenHolderIndex:
+        current_ledger = await self.xrpl.get_validated_ledger_index()
+        index = await self._read_snapshot(key)
+
+        if index is not None and index.ledger_index is not None \
+                and current_ledger - index.ledger_index <= self.max_replay_ledgers:
+            await self._sync(index)
+        else:
+            index = await self._seed(key, current_ledger)
+
+        self.indexes[key] = index
+        await self._write_snapshot(index)
+        return index
+
+    async def _seed(self, key: Tuple[str, str], ledger_index: int) -> TokenHolderIndex:
+        """Build an index with one full trustline scan pinned to a validated ledger"""
+        currency, issuer = key
+        index = TokenHolderIndex(currency, issuer, ledger_index=ledger_index)
+
+        async for line in self.xrpl.iter_account_lines(issuer, ledger_index=ledger_index):
+            if line["currency"] == currency:
+                # From the issuer's side a holder's line carries a negative balance
+                index.set_balance(line["account"], -Decimal(line["balance"]))
+
+        logger.info(f"Seeded holder index for {currency}.{issuer} at ledger {ledger_index}: "
+                    f"{index.holder_count} holders")
+        return index
+
+    async def _sync(self, index: TokenHolderIndex):
+        """Replay the issuer's validated transactions since the indexed ledger"""
+        key = (index.currency, index.issuer)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+
+        async with lock:
+            # Captured before replaying: account_tx covers at least up to this ledger
+            validated_ledger = self.xrpl.cache.ledger_index or index.ledger_index
+            start = index.ledger_index + 1
+            if start > validated_ledger:
+                return
+            last_ledger = index.ledger_index
+            async for tx in self.xrpl.iter_account_transactions(
+                index.issuer, forward=True, ledger_index_min=start
+            ):
+                if not tx.get("validated"):
+                    continue
+                index.apply_metadata(tx.get("meta") or {})
+                last_ledger = max(last_ledger, int(tx["ledger_index"]))
+
+            index.ledger_index = max(last_ledger, validated_ledger)
+
+    async def sync_all(self):
+        for index in list(self.indexes.values()):
+            try:
+                await self._sync(index)
+                if index.dirty:
+                    await self._write_snapshot(index)
+            except Exception as e:
+                logger.warning(f"Error syncing holder index for {index.currency}.{index.issuer}: {str(e)}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            await self.sync_all()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for index in list(self.indexes.values()):
+            if index.dirty:
+                await self._write_snapshot(index)
+
+    def _snapshot_path(self, key: Tuple[str, str]) -> Path:
+        currency, issuer = key
+        return self.snapshot_dir / f"{issuer}_{currency}.json"
+
+    async def _read_snapshot(self, key: Tuple[str, str]) -> Optional[TokenHolderIndex]:
+        return await asyncio.to_thread(self._read_snapshot_file, self._snapshot_path(key))
+
+    @staticmethod
+    def _read_snapshot_file(path: Path) -> Optional[TokenHolderIndex]:
+        if not path.exists():
+            return None
+        try:
+            with open(path) as f:
+                return TokenHolderIndex.from_dict(json.load(f))
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable holder index snapshot {path}: {str(e)}")
+            return None
+
+    async def _write_snapshot(self, index: TokenHolderIndex):
+        # Serialized on the loop, so the snapshot is consistent with one ledger
+        data = index.to_dict()
+        index.dirty = False
+        path = self._snapshot_path((index.currency, index.issuer))
+        if not await asyncio.to_thread(self._write_snapshot_file, path, data):
+            index.dirty = True
+
+    @staticmethod
+    def _write_snapshot_file(path: Path, data: Dict[str, Any]) -> bool:
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+            return True
+        except Exception as e:
+            logger.warning(f"Error writing holder index snapshot: {str(e)}")
+            return False
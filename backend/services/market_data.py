@@ -0,0 +1,121 @@
+"""
+Solcraft Nexus - Market Data Hub
+In-process pub/sub that fans marketplace events out to streaming subscribers
+"""
+
+import os
+import asyncio
+from typing import Dict, Any, Set, Iterable
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def asset_channel(asset_id: str) -> str:
+    return f"asset:{asset_id}"
+
+
+def user_channel(user_id: str) -> str:
+    return f"user:{user_id}"
+
+
+class Subscription:
+    """One subscriber's bounded event queue and channel set"""
+
+    def __init__(self, hub: "MarketDataHub", max_queue: int):
+        self.hub = hub
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.channels: Set[str] = set()
+        # Set when the subscriber fell behind and events were dropped
+        self.overflowed = False
+
+    def subscribe(self, channels: Iterable[str]):
+        self.hub._subscribe(self, channels)
+
+    def unsubscribe(self, channels: Iterable[str]):
+        self.hub._unsubscribe(self, channels)
+
+    def close(self):
+        self.hub._unsubscribe(self, list(self.channels))
+
+    def request_snapshots(self, channels: Iterable[str]):
+        """Queue a snapshot request, so the consumer sends snapshots in line with the events"""
+        self._offer({"type": "snapshot_request", "channels": list(channels)})
+
+    def drain(self):
+        """Discard every queued event (they predate the snapshots about to be sent)"""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+    async def get(self) -> Dict[str, Any]:
+        return await self.queue.get()
+
+    def _offer(self, event: Dict[str, Any]):
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A slow consumer must not hold up publishers or grow without bound;
+            # it has to resubscribe from a snapshot, so the queued events are
+            # useless and the overflow notice is the next thing it reads
+            self.overflowed = True
+            self.drain()
+            self.queue.put_nowait({"type": "overflow"})
+
+
+class MarketDataHub:
+    """Channel -> subscribers registry; publishing is O(subscribers) and never awaits
+
+    Each event is produced once by the marketplace and shared by reference
+    between every subscriber of its channel.
+    """
+
+    def __init__(self):
+        self.max_queue = int(os.getenv("MARKET_DATA_MAX_QUEUE", "1000"))
+        self.channels: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+        self.delivered = 0
+
+    def open(self) -> Subscription:
+        return Subscription(self, self.max_queue)
+
+    def _subscribe(self, subscription: Subscription, channels: Iterable[str]):
+        for channel in channels:
+            self.channels.setdefault(channel, set()).add(subscription)
+            subscription.channels.add(channel)
+
+    def _unsubscribe(self, subscription: Subscription, channels: Iterable[str]):
+        for channel in channels:
+            subscribers = self.channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.channels[channel]
+            subscription.channels.discard(channel)
+
+    def has_subscribers(self, channel: str) -> bool:
+        return channel in self.channels
+
+    def publish(self, channel: str, event: Dict[str, Any]):
+        subscribers = self.channels.get(channel)
+        self.published += 1
+        if not subscribers:
+            return
+
+        message = {"channel": channel, **event}
+        for subscription in list(subscribers):
+            subscription._offer(message)
+        self.delivered += len(subscribers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "channels": len(self.channels),
+            "subscriptions": sum(len(s) for s in self.channels.values()),
+            "published": self.published,
+            "delivered": self.delivered
+        }
+
+
+# Global hub instance
+market_data_hub = MarketDataHub()
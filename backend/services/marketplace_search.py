@@ -0,0 +1,185 @@
+"""
+Solcraft Nexus - Marketplace Search
+Full-text and faceted search over marketplace listings
+"""
+
+import re
+import heapq
+from collections import Counter
+from typing import Dict, Any, List, Optional, Set, Iterable
+
+# Upper bounds of the APY facet buckets; keep in step with
+# marketplace_apy_range() in database/marketplace_search.sql
+APY_RANGES = (("0-5", 5.0), ("5-10", 10.0), ("10-15", 15.0), ("15+", None))
+
+SEARCH_SORTS = {
+    "relevance": None,
+    "volume": "volume_24h",
+    "market_cap": "market_cap",
+    "apy": "apy",
+    "price": "token_price",
+    "created_at": "created_at"
+}
+
+FACETS = ("category", "asset_type", "apy_range")
+
+# Term weights per field, mirroring the A/B/C weights of the tsvector
+FIELD_WEIGHTS = (("name", 3), ("location", 2), ("description", 1))
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _TOKEN.findall(text.lower()) if text else []
+
+
+def apy_range(apy: Optional[float]) -> Optional[str]:
+    if apy is None:
+        return None
+    for label, upper in APY_RANGES:
+        if upper is None or apy < upper:
+            return label
+    return None
+
+
+class SearchIndex:
+    """In-process inverted index over listings
+
+    Used when the database search function is unavailable. Listings are added,
+    replaced and removed one at a time, so the index never needs a rebuild;
+    queries intersect posting sets instead of scanning every listing.
+    """
+
+    def __init__(self):
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.facets: Dict[str, Dict[str, Set[str]]] = {facet: {} for facet in FACETS}
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    @staticmethod
+    def _facet_values(doc: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        return {
+            "category": doc.get("category"),
+            "asset_type": doc.get("asset_type") or doc.get("category"),
+            "apy_range": apy_range(doc.get("apy"))
+        }
+
+    def upsert(self, asset: Dict[str, Any]):
+        asset_id = asset["id"]
+        self.remove(asset_id)
+
+        doc = dict(asset)
+        doc["asset_type"] = doc.get("asset_type") or doc.get("category")
+        doc["apy_range"] = apy_range(doc.get("apy"))
+        self.docs[asset_id] = doc
+
+        weights: Counter = Counter()
+        for field, weight in FIELD_WEIGHTS:
+            for term in tokenize(doc.get(field)):
+                weights[term] += weight
+        for term, weight in weights.items():
+            self.postings.setdefault(term, {})[asset_id] = weight
+
+        for facet, value in self._facet_values(doc).items():
+            if value is not None:
+                self.facets[facet].setdefault(value, set()).add(asset_id)
+
+    def remove(self, asset_id: str):
+        doc = self.docs.pop(asset_id, None)
+        if doc is None:
+            return
+
+        for field, _ in FIELD_WEIGHTS:
+            for term in tokenize(doc.get(field)):
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.pop(asset_id, None)
+                    if not posting:
+                        del self.postings[term]
+
+        for facet, value in self._facet_values(doc).items():
+            ids = self.facets[facet].get(value)
+            if ids is not None:
+                ids.discard(asset_id)
+                if not ids:
+                    del self.facets[facet][value]
+
+    def _facet_ids(self, facet: str, values: Optional[Iterable[str]]) -> Optional[Set[str]]:
+        if not values:
+            return None
+        ids: Set[str] = set()
+        for value in values:
+            ids |= self.facets[facet].get(value, set())
+        return ids
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        filters: Optional[Dict[str, List[str]]] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort_by: str = "relevance",
+        sort_desc: bool = True,
+        limit: int = 50,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """One page of matches plus facet counts (same shape as the database search)"""
+
+        filters = filters or {}
+        scores: Dict[str, int] = {}
+        terms = tokenize(query)
+        if terms:
+            # Every term must match; rarest posting first keeps the intersection small
+            postings = sorted((self.postings.get(term, {}) for term in terms), key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates &= posting.keys()
+            scores = {asset_id: sum(posting[asset_id] for posting in postings) for asset_id in candidates}
+            base = candidates
+        else:
+            base = set(self.docs)
+
+        if min_price is not None or max_price is not None:
+            base = {
+                asset_id for asset_id in base
+                if (min_price is None or self.docs[asset_id].get("token_price", 0) >= min_price)
+                and (max_price is None or self.docs[asset_id].get("token_price", 0) <= max_price)
+            }
+
+        selected = {facet: self._facet_ids(facet, filters.get(facet)) for facet in FACETS}
+
+        def restrict(ids: Set[str], skip: Optional[str] = None) -> Set[str]:
+            for facet, allowed in selected.items():
+                if facet != skip and allowed is not None:
+                    ids = ids & allowed
+            return ids
+
+        matched = restrict(base)
+
+        # Each facet is counted under every filter except its own
+        facets = {}
+        for facet in FACETS:
+            ids = restrict(base, skip=facet)
+            counts = {value: len(ids & members) for value, members in self.facets[facet].items()}
+            facets[facet] = {value: count for value, count in counts.items() if count}
+
+        # Only the rows up to the end of the page need ordering
+        top = heapq.nlargest if sort_desc else heapq.nsmallest
+        count = offset + limit
+        field = SEARCH_SORTS.get(sort_by)
+        if field is None:
+            ordered = top(count, matched, key=lambda asset_id: (scores.get(asset_id, 0), asset_id))
+        else:
+            # Listings without the sort value go last either way, as in SQL NULLS LAST
+            valued = [asset_id for asset_id in matched if self.docs[asset_id].get(field) is not None]
+            ordered = top(count, valued, key=lambda asset_id: (self.docs[asset_id][field], asset_id))
+            if len(ordered) < count:
+                ordered += sorted(matched.difference(valued))[:count - len(ordered)]
+
+        return {
+            "assets": [self.docs[asset_id] for asset_id in ordered[offset:offset + limit]],
+            "total": len(matched),
+            "facets": facets
+        }
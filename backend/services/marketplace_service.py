@@ -5,13 +5,53 @@ Handles trading, order book, and marketplace operations for tokenized assets
 
 import os
 import uuid
-from typing import Dict, Any, List, Optional
-from datetime import datetime, timedelta
+import time
+import asyncio
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
 from fastapi import HTTPException
-from .supabase_service import get_supabase_client
+from .supabase_service import get_supabase_client, execute_query
+from .matching_engine import BookOrder
+from .matching_shards import create_engine_client
+from .market_data import market_data_hub, asset_channel, user_channel
+from .price_oracle import price_oracle, PRICE_SOURCES
+from .candle_service import candle_service, INTERVALS
+from .pagination import apply_keyset, page_result, quote
+from .marketplace_search import SearchIndex, SEARCH_SORTS
+
+logger = logging.getLogger(__name__)
+
+# Columns the listing may be sorted (and keyset-paginated) by
+ASSET_SORT_COLUMNS = ("created_at", "token_price", "market_cap", "apy", "volume_24h", "price_change_24h", "name")
 
 class MarketplaceService:
     def __init__(self):
+        # In-memory order books; the orders table is the durable copy. With
+        # MARKETPLACE_MATCHING_SHARDS > 1 assets are spread over worker processes
+        self.book_depth = int(os.getenv("MARKETPLACE_BOOK_DEPTH", "10"))
+        self.engine = create_engine_client(
+            shards=int(os.getenv("MARKETPLACE_MATCHING_SHARDS", "1")),
+            diff_history=int(os.getenv("MARKETPLACE_BOOK_DIFF_HISTORY", "1000")),
+            timeout=float(os.getenv("MARKETPLACE_MATCHING_TIMEOUT", "10"))
+        )
+        # A restarted shard comes back empty: reload the open orders it owns
+        self.engine.on_restart = lambda shard: self.load_order_books(shard=shard)
+        # A command applied after its caller timed out is still persisted and published
+        self.engine.on_late_result = self._apply_late_result
+        
+        # Order/trade writes are group-committed: everything queued while one
+        # batch is in flight goes out in the next apply_order_batch() call
+        self.write_batch_size = int(os.getenv("MARKETPLACE_WRITE_BATCH_SIZE", "500"))
+        self.max_batch_orders = int(os.getenv("MARKETPLACE_MAX_BATCH_ORDERS", "100"))
+        
+        # Longest the expiry sweeper sleeps; it wakes earlier when an order is due
+        self.expiry_sweep_interval = float(os.getenv("MARKETPLACE_EXPIRY_SWEEP_INTERVAL", "1"))
+        self._expiry_task: Optional[asyncio.Task] = None
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._mock_search_index: Optional[SearchIndex] = None
+
         # Order types
         self.ORDER_TYPES = {
             "market": "Market Order",
@@ -19,6 +59,13 @@ class MarketplaceService:
             "stop": "Stop Order"
         }
         
+        # Time in force
+        self.TIME_IN_FORCE = {
+            "GTC": "Good Till Cancelled",
+            "IOC": "Immediate Or Cancel",
+            "FOK": "Fill Or Kill"
+        }
+        
         # Order sides
         self.ORDER_SIDES = {
             "buy": "Buy",
@@ -52,9 +99,15 @@ class MarketplaceService:
         sort_by: str = "created_at",
         sort_order: str = "desc",
         limit: int = 50,
-        offset: int = 0
+        offset: int = 0,
+        cursor: Optional[str] = None,
+        include_total: bool = False
     ) -> Dict[str, Any]:
-        """Get list of assets available in marketplace"""
+        """Get list of assets available in marketplace
+        
+        Pages are keyed on (sort_by, id): pass the returned next_cursor to get
+        the following page. offset is still honoured when no cursor is given.
+        """
         
         supabase = get_supabase_client()
         
@@ -63,7 +116,7 @@ class MarketplaceService:
             query = supabase.table("marketplace_assets").select("""
                 *,
                 asset_info:tokenizations(*)
-            """)
+            """, count="estimated" if include_total else None)
             
             # Apply filters
             if category and category in self.MARKETPLACE_CATEGORIES:
@@ -75,25 +128,26 @@ class MarketplaceService:
             if max_price is not None:
                 query = query.lte("token_price", max_price)
             
-            # Apply sorting
-            if sort_order == "desc":
-                query = query.order(sort_by, desc=True)
-            else:
-                query = query.order(sort_by)
-                
-            # Apply pagination
-            query = query.range(offset, offset + limit - 1)
+            # Apply sorting and pagination
+            query = apply_keyset(query, sort_by, sort_order == "desc", cursor, limit, ASSET_SORT_COLUMNS)
+            if offset and not cursor:
+                query = query.offset(offset)
             
-            result = query.execute()
+            result = await execute_query(query)
+            page = page_result(result.data, sort_by, limit)
             
             return {
                 "success": True,
-                "assets": result.data,
-                "total": len(result.data),
+                "assets": page["rows"],
+                "total": result.count if include_total else None,
                 "offset": offset,
-                "limit": limit
+                "limit": limit,
+                "next_cursor": page["next_cursor"],
+                "has_more": page["has_more"]
             }
             
+        except HTTPException:
+            raise
         except Exception as e:
             # Return mock marketplace data if table doesn't exist
             mock_assets = self._get_mock_marketplace_assets()
@@ -119,21 +173,96 @@ class MarketplaceService:
                 "total": len(filtered_assets),
                 "offset": offset,
                 "limit": limit,
+                "next_cursor": None,
+                "has_more": False,
                 "mock": True
             }
 
+    async def search_marketplace_assets(
+        self,
+        query: Optional[str] = None,
+        categories: Optional[List[str]] = None,
+        asset_types: Optional[List[str]] = None,
+        apy_ranges: Optional[List[str]] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        sort_by: Optional[str] = None,
+        sort_order: str = "desc",
+        limit: int = 50,
+        offset: int = 0
+    ) -> Dict[str, Any]:
+        """Full-text search over listings with category/asset type/APY facets
+
+        Served by the search_marketplace_assets database function (GIN-indexed
+        tsvector); facet counts come back with the page in the same call.
+        """
+
+        sort_by = sort_by or ("relevance" if query else "created_at")
+        if sort_by not in SEARCH_SORTS:
+            raise HTTPException(status_code=400, detail=f"Invalid sort: {sort_by}")
+
+        supabase = get_supabase_client()
+
+        try:
+            result = await execute_query(supabase.rpc("search_marketplace_assets", {
+                "p_query": query,
+                "p_categories": categories or None,
+                "p_asset_types": asset_types or None,
+                "p_apy_ranges": apy_ranges or None,
+                "p_min_price": min_price,
+                "p_max_price": max_price,
+                "p_sort_by": sort_by,
+                "p_sort_desc": sort_order == "desc",
+                "p_limit": limit,
+                "p_offset": offset
+            }))
+            found = result.data
+            mock = False
+
+        except Exception as e:
+            logger.error(f"Error searching marketplace assets: {str(e)}")
+            # Search the demo listings when the search function is not deployed
+            if self._mock_search_index is None:
+                self._mock_search_index = SearchIndex()
+                for asset in self._get_mock_marketplace_assets():
+                    self._mock_search_index.upsert(asset)
+
+            found = self._mock_search_index.search(
+                query,
+                filters={"category": categories, "asset_type": asset_types, "apy_range": apy_ranges},
+                min_price=min_price,
+                max_price=max_price,
+                sort_by=sort_by,
+                sort_desc=sort_order == "desc",
+                limit=limit,
+                offset=offset
+            )
+            mock = True
+
+        response = {
+            "success": True,
+            "assets": found["assets"],
+            "total": found["total"],
+            "facets": found["facets"],
+            "offset": offset,
+            "limit": limit,
+            "has_more": offset + len(found["assets"]) < found["total"]
+        }
+        if mock:
+            response["mock"] = True
+        return response
+
     async def get_asset_details(self, asset_id: str) -> Dict[str, Any]:
         """Get detailed information about a marketplace asset"""
         
         supabase = get_supabase_client()
         
         try:
-            result = supabase.table("marketplace_assets").select("""
+            result = await execute_query(supabase.table("marketplace_assets").select("""
                 *,
                 asset_info:tokenizations(*),
-                recent_trades:trades(*),
-                order_book:orders(*)
-            """).eq("id", asset_id).execute()
+                recent_trades:trades(*)
+            """).eq("id", asset_id))
             
             if not result.data:
                 raise HTTPException(status_code=404, detail="Asset not found")
@@ -165,7 +294,7 @@ class MarketplaceService:
                 "mock": True
             }
 
-    async def create_order(
+    def _build_order(
         self,
         asset_id: str,
         user_id: str,
@@ -173,11 +302,12 @@ class MarketplaceService:
         order_type: str,
         side: str,
         quantity: int,
-        price: Optional[float] = None
-    ) -> Dict[str, Any]:
-        """Create a new trading order"""
+        price: Optional[float] = None,
+        stop_price: Optional[float] = None,
+        time_in_force: str = "GTC"
+    ) -> BookOrder:
+        """Validate order parameters and build the engine order"""
         
-        # Validate inputs
         if order_type not in self.ORDER_TYPES:
             raise HTTPException(status_code=400, detail=f"Invalid order type: {order_type}")
         
@@ -190,80 +320,315 @@ class MarketplaceService:
         if order_type == "limit" and (price is None or price <= 0):
             raise HTTPException(status_code=400, detail="Limit orders require a positive price")
         
-        # Get current market price for market orders
-        if order_type == "market":
-            price = await self._get_current_market_price(asset_id)
+        if order_type == "stop" and (stop_price is None or stop_price <= 0):
+            raise HTTPException(status_code=400, detail="Stop orders require a positive stop price")
         
-        order_id = str(uuid.uuid4())
+        if order_type == "stop" and price is not None and price <= 0:
+            raise HTTPException(status_code=400, detail="Stop-limit price must be positive")
         
-        order_data = {
-            "id": order_id,
-            "asset_id": asset_id,
-            "user_id": user_id,
-            "wallet_address": wallet_address,
-            "order_type": order_type,
-            "side": side,
-            "quantity": quantity,
-            "price": price,
-            "filled_quantity": 0,
-            "remaining_quantity": quantity,
-            "status": "pending",
-            "created_at": datetime.now().isoformat(),
-            "expires_at": (datetime.now() + timedelta(days=30)).isoformat()  # 30 day expiry
-        }
+        if time_in_force not in self.TIME_IN_FORCE:
+            raise HTTPException(status_code=400, detail=f"Invalid time in force: {time_in_force}")
         
-        supabase = get_supabase_client()
+        return BookOrder(
+            id=str(uuid.uuid4()),
+            asset_id=asset_id,
+            user_id=user_id,
+            wallet_address=wallet_address,
+            order_type=order_type,
+            side=side,
+            quantity=quantity,
+            # Market orders take whatever the book offers; the engine sets their price to the average fill
+            price=price if order_type != "market" else None,
+            stop_price=stop_price if order_type == "stop" else None,
+            expires_at=(datetime.now(timezone.utc) + timedelta(days=30)).isoformat(),  # 30 day expiry
+            time_in_force=time_in_force
+        )
+
+    async def _submit(self, order: BookOrder, changes: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Match an order and collect the resulting rows into ``changes``"""
+        
+        result = await self.engine.submit(order)
+        self._check_market_fill(order, result)
+        return self._apply_result(order.asset_id, result, changes)
+
+    def _check_market_fill(self, order: BookOrder, result: Dict[str, Any]):
+        """Reject a market order that found nothing to trade against
+        
+        It never rests and changed nothing on the book, so it is neither
+        published nor stored (it would have no price).
+        """
+        
+        if order.order_type == "market" and not result["trades"]:
+            raise HTTPException(status_code=400, detail="No liquidity for a market order")
+
+    def _apply_result(self, asset_id: str, result: Dict[str, Any], changes: Dict[str, Any]) -> List[Dict[str, Any]]:
+        order_rows = result["orders"]
+        trades = result["trades"]
+        
+        self._publish(asset_id, order_rows, trades, result["diff"])
+        for trade in trades:
+            candle_service.add_trade(trade)
+            price_oracle.record_trade(trade)
+        
+        for row in order_rows:
+            changes["orders"][row["id"]] = row
+        changes["trades"].extend(trades)
+        return trades
+
+    async def _cancel(self, order_id: str, user_id: str, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Cancel an open order owned by ``user_id``; None when there is no such order"""
+        
+        cancelled = await self.engine.cancel(order_id, user_id=user_id)
+        if cancelled is None:
+            return None
+        return self._apply_cancel(cancelled, changes)
+
+    def _apply_cancel(self, cancelled: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+        order_row = cancelled["order"]
+        order_row["cancelled_at"] = datetime.now(timezone.utc).isoformat()
+        self._publish(order_row["asset_id"], [order_row], [], cancelled["diff"])
+        
+        changes["orders"][order_row["id"]] = order_row
+        return order_row
+
+    async def _apply_late_result(self, op: str, result: Any):
+        """Persist and publish an engine result whose caller had already timed out"""
+        
+        changes = {"orders": {}, "trades": []}
+        if op == "submit":
+            self._apply_result(result["orders"][0]["asset_id"], result, changes)
+        elif op == "submit_many":
+            for item in result:
+                self._apply_result(item["orders"][0]["asset_id"], item, changes)
+        elif op == "cancel" and result is not None:
+            self._apply_cancel(result, changes)
+        elif op == "expire_due":
+            for group in result:
+                self._publish(group["asset_id"], group["orders"], [], group["diff"])
+                for row in group["orders"]:
+                    changes["orders"][row["id"]] = row
+        
+        if changes["orders"]:
+            try:
+                await self._persist_changes(changes)
+            except HTTPException:
+                logger.error(f"Late {op} result could not be stored; order books and database differ "
+                             f"until the books are reloaded")
+
+    async def _persist_changes(self, changes: Dict[str, Any]):
+        """Write collected order rows and trades in one transaction
+        
+        Raises 503 when they could not be stored: the order books already hold
+        the result, so it must not be reported as done.
+        """
         
         try:
-            # Store order in database
-            result = supabase.table("orders").insert(order_data).execute()
+            await self._persist(list(changes["orders"].values()), changes["trades"])
+        except Exception as e:
+            logger.error(f"Error persisting {len(changes['orders'])} orders and "
+                         f"{len(changes['trades'])} trades: {str(e)}")
+            raise HTTPException(status_code=503, detail="Order changes could not be stored")
+
+    def _check_batch_size(self, size: int):
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Batch is empty")
+        if size > self.max_batch_orders:
+            raise HTTPException(status_code=400, detail=f"Batch exceeds {self.max_batch_orders} orders")
+
+    async def create_order(
+        self,
+        asset_id: str,
+        user_id: str,
+        wallet_address: str,
+        order_type: str,
+        side: str,
+        quantity: int,
+        price: Optional[float] = None,
+        stop_price: Optional[float] = None,
+        time_in_force: str = "GTC"
+    ) -> Dict[str, Any]:
+        """Create a new trading order and match it against the asset's order book"""
+        
+        order = self._build_order(
+            asset_id, user_id, wallet_address, order_type, side, quantity, price, stop_price, time_in_force
+        )
+        
+        changes = {"orders": {}, "trades": []}
+        trades = await self._submit(order, changes)
+        await self._persist_changes(changes)
+        
+        return {
+            "success": True,
+            "order": changes["orders"][order.id],
+            "matches": trades,
+            "order_id": order.id
+        }
+
+    async def create_orders(
+        self,
+        user_id: str,
+        wallet_address: str,
+        orders: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Validate and match a batch of orders, persisting them in one write
+        
+        Invalid orders are reported individually and do not stop the rest.
+        """
+        
+        self._check_batch_size(len(orders))
+        
+        changes = {"orders": {}, "trades": []}
+        results = []
+        valid = []
+        
+        for index, params in enumerate(orders):
+            try:
+                order = self._build_order(
+                    asset_id=params.get("asset_id"),
+                    user_id=user_id,
+                    wallet_address=wallet_address,
+                    order_type=params.get("order_type"),
+                    side=params.get("side"),
+                    quantity=params.get("quantity", 0),
+                    price=params.get("price"),
+                    stop_price=params.get("stop_price"),
+                    time_in_force=params.get("time_in_force") or "GTC"
+                )
+            except HTTPException as e:
+                results.append({"index": index, "success": False, "error": e.detail})
+                continue
             
-            # Try to match order immediately
-            matches = await self._match_order(order_data)
+            item = {"index": index, "success": True, "order_id": order.id}
+            valid.append((order, item))
+            results.append(item)
+        
+        submitted = await self.engine.submit_many([order for order, _ in valid])
+        for (order, item), result in zip(valid, submitted):
+            try:
+                self._check_market_fill(order, result)
+            except HTTPException as e:
+                del item["order_id"]
+                item.update({"success": False, "error": e.detail})
+                continue
+            item["matches"] = self._apply_result(order.asset_id, result, changes)
+        
+        # Report final state: a later order in the batch may have filled an earlier one
+        for result in results:
+            if result["success"]:
+                result["order"] = changes["orders"][result["order_id"]]
+        
+        if changes["orders"]:
+            await self._persist_changes(changes)
+        return {"success": True, "results": results}
+
+    async def cancel_orders(self, order_ids: List[str], user_id: str) -> Dict[str, Any]:
+        """Cancel a batch of open orders in one write"""
+        
+        self._check_batch_size(len(order_ids))
+        
+        changes = {"orders": {}, "trades": []}
+        results = []
+        
+        for order_id in order_ids:
+            if await self._cancel(order_id, user_id, changes) is None:
+                results.append({"order_id": order_id, "success": False, "error": "Order not found or not open"})
+            else:
+                results.append({"order_id": order_id, "success": True})
+        
+        if changes["orders"]:
+            await self._persist_changes(changes)
+        return {"success": True, "results": results}
+
+    async def replace_orders(
+        self,
+        user_id: str,
+        replacements: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Cancel/replace a batch of open orders in one write
+        
+        Each replacement names an order_id and the new quantity and/or price
+        (and stop_price for stop orders). The replacement is a new order and
+        loses the original's time priority.
+        """
+        
+        self._check_batch_size(len(replacements))
+        
+        changes = {"orders": {}, "trades": []}
+        results = []
+        
+        for params in replacements:
+            order_id = params.get("order_id")
+            original = await self.engine.get_order(order_id)
+            if original is None or original["user_id"] != user_id:
+                results.append({"order_id": order_id, "success": False, "error": "Order not found or not open"})
+                continue
             
-            return {
-                "success": True,
-                "order": order_data,
-                "matches": matches,
-                "order_id": order_id
-            }
+            try:
+                order = self._build_order(
+                    asset_id=original["asset_id"],
+                    user_id=user_id,
+                    wallet_address=original["wallet_address"],
+                    order_type=original["order_type"],
+                    side=original["side"],
+                    quantity=params.get("quantity") or original["remaining_quantity"],
+                    price=params.get("price", original["price"]),
+                    stop_price=params.get("stop_price", original["stop_price"]),
+                    time_in_force=original["time_in_force"]
+                )
+            except HTTPException as e:
+                results.append({"order_id": order_id, "success": False, "error": e.detail})
+                continue
             
-        except Exception as e:
-            # Mock order creation if database not available
-            return {
-                "success": True,
-                "order": order_data,
-                "matches": [],
-                "order_id": order_id,
-                "mock": True,
-                "message": "Order created successfully (mock mode)"
-            }
+            if await self._cancel(order_id, user_id, changes) is None:
+                # Filled or cancelled since it was read
+                results.append({"order_id": order_id, "success": False, "error": "Order not found or not open"})
+                continue
+            trades = await self._submit(order, changes)
+            results.append({"order_id": order_id, "success": True, "new_order_id": order.id, "matches": trades})
+        
+        for result in results:
+            if result["success"]:
+                result["order"] = changes["orders"][result["new_order_id"]]
+        
+        if changes["orders"]:
+            await self._persist_changes(changes)
+        return {"success": True, "results": results}
 
     async def get_user_orders(
         self,
         user_id: str,
         status: Optional[str] = None,
-        limit: int = 50
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        include_total: bool = False
     ) -> Dict[str, Any]:
-        """Get user's trading orders"""
+        """Get user's trading orders, newest first"""
         
         supabase = get_supabase_client()
         
         try:
-            query = supabase.table("orders").select("*").eq("user_id", user_id)
+            query = supabase.table("orders").select(
+                "*", count="estimated" if include_total else None
+            ).eq("user_id", user_id)
             
             if status and status in self.ORDER_STATUS:
                 query = query.eq("status", status)
             
-            query = query.order("created_at", desc=True).limit(limit)
+            query = apply_keyset(query, "created_at", True, cursor, limit, ("created_at",))
             
-            result = query.execute()
+            result = await execute_query(query)
+            page = page_result(result.data, "created_at", limit)
             
             return {
                 "success": True,
-                "orders": result.data
+                "orders": page["rows"],
+                "total": result.count if include_total else None,
+                "next_cursor": page["next_cursor"],
+                "has_more": page["has_more"]
             }
             
+        except HTTPException:
+            raise
         except Exception as e:
             # Return mock user orders
             mock_orders = self._get_mock_user_orders(user_id)
@@ -278,52 +643,44 @@ class MarketplaceService:
             }
 
     async def cancel_order(self, order_id: str, user_id: str) -> Dict[str, Any]:
-        """Cancel a pending order"""
+        """Cancel an open order"""
         
-        supabase = get_supabase_client()
+        changes = {"orders": {}, "trades": []}
         
-        try:
-            # Check if order exists and belongs to user
-            order_result = supabase.table("orders").select("*").eq("id", order_id).eq("user_id", user_id).execute()
+        if await self._cancel(order_id, user_id, changes) is None:
+            # Not on any book: either unknown, or no longer open
+            supabase = get_supabase_client()
+            try:
+                order_result = await execute_query(supabase.table("orders").select("status").eq("id", order_id).eq("user_id", user_id))
+            except Exception as e:
+                # Mock cancellation
+                return {
+                    "success": True,
+                    "message": "Order cancelled successfully (mock mode)",
+                    "order_id": order_id,
+                    "mock": True
+                }
             
             if not order_result.data:
                 raise HTTPException(status_code=404, detail="Order not found")
-            
-            order = order_result.data[0]
-            
-            if order["status"] != "pending":
-                raise HTTPException(status_code=400, detail="Only pending orders can be cancelled")
-            
-            # Update order status
-            update_result = supabase.table("orders").update({
-                "status": "cancelled",
-                "cancelled_at": datetime.now().isoformat()
-            }).eq("id", order_id).execute()
-            
-            return {
-                "success": True,
-                "message": "Order cancelled successfully",
-                "order_id": order_id
-            }
-            
-        except HTTPException:
-            raise
-        except Exception as e:
-            # Mock cancellation
-            return {
-                "success": True,
-                "message": "Order cancelled successfully (mock mode)",
-                "order_id": order_id,
-                "mock": True
-            }
+            raise HTTPException(status_code=400, detail="Only open orders can be cancelled")
+        
+        await self._persist_changes(changes)
+        return {
+            "success": True,
+            "message": "Order cancelled successfully",
+            "order_id": order_id
+        }
 
     async def get_trading_history(
         self,
         user_id: Optional[str] = None,
         asset_id: Optional[str] = None,
-        limit: int = 100
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        include_total: bool = False
     ) -> Dict[str, Any]:
-        """Get trading history"""
+        """Get trading history, newest first"""
         
         supabase = get_supabase_client()
         
@@ -333,23 +690,31 @@ class MarketplaceService:
                 asset_info:marketplace_assets(name, token_symbol),
                 buyer_info:profiles(wallet_address),
                 seller_info:profiles(wallet_address)
-            """)
+            """, count="estimated" if include_total else None)
             
+            # One or= filter: the user's side condition and the cursor are ANDed in it
+            condition = None
             if user_id:
-                query = query.or_(f"buyer_id.eq.{user_id},seller_id.eq.{user_id}")
+                condition = f"or(buyer_id.eq.{quote(user_id)},seller_id.eq.{quote(user_id)})"
             
             if asset_id:
                 query = query.eq("asset_id", asset_id)
             
-            query = query.order("created_at", desc=True).limit(limit)
+            query = apply_keyset(query, "created_at", True, cursor, limit, ("created_at",), condition)
             
-            result = query.execute()
+            result = await execute_query(query)
+            page = page_result(result.data, "created_at", limit)
             
             return {
                 "success": True,
-                "trades": result.data
+                "trades": page["rows"],
+                "total": result.count if include_total else None,
+                "next_cursor": page["next_cursor"],
+                "has_more": page["has_more"]
             }
             
+        except HTTPException:
+            raise
         except Exception as e:
             # Return mock trading history
             mock_trades = self._get_mock_trading_history(user_id, asset_id)
@@ -360,82 +725,278 @@ class MarketplaceService:
                 "mock": True
             }
 
-    async def _match_order(self, order: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Match order with existing orders in order book"""
-        
-        # Simple matching logic for demo
-        matches = []
-        
-        # For market orders, try to find immediate matches
-        if order["order_type"] == "market":
-            # Mock matching for demonstration
-            if order["side"] == "buy":
-                # Find best sell orders
-                matches.append({
-                    "matched_quantity": min(order["quantity"], 50),
-                    "matched_price": order["price"],
-                    "trade_id": str(uuid.uuid4())
-                })
-        
-        return matches
-
-    async def _get_current_market_price(self, asset_id: str) -> float:
-        """Get current market price for an asset"""
-        
-        # Mock pricing logic
-        base_prices = {
-            "asset_1": 250.0,
-            "asset_2": 100.0,
-            "asset_3": 150.0
-        }
+    async def load_order_books(self, page_size: int = 1000, shard: Optional[int] = None) -> int:
+        """Rebuild the in-memory order books from open orders in the database
         
-        base_price = base_prices.get(asset_id, 200.0)
+        With ``shard`` only the books of that matching shard are rebuilt.
+        """
         
-        # Add some random variation (-5% to +5%)
-        import random
-        variation = random.uniform(-0.05, 0.05)
+        supabase = get_supabase_client()
+        loaded = 0
+        offset = 0
         
-        return round(base_price * (1 + variation), 2)
+        try:
+            while True:
+                # Oldest first so time priority within each price level is preserved
+                result = await execute_query(
+                    supabase.table("orders").select("*")
+                    .in_("status", ["pending", "partial"])
+                    .order("created_at")
+                    .order("id")
+                    .range(offset, offset + page_size - 1)
+                )
+                
+                rows = result.data
+                if shard is not None:
+                    rows = [row for row in rows if self.engine.ring.shard_for(row["asset_id"]) == shard]
+                
+                await self.engine.restore_many([BookOrder.from_dict(row) for row in rows])
+                loaded += len(rows)
+                
+                if len(result.data) < page_size:
+                    break
+                offset += page_size
+            
+            stats = await self.engine.stats()
+            logger.info(f"Loaded {loaded} open orders into {stats['books']} order books "
+                        f"across {stats['shards']} matching shard(s)")
+            
+        except Exception as e:
+            logger.error(f"Error loading order books: {str(e)}")
+        
+        return loaded
 
-    async def _get_price_history(self, asset_id: str) -> List[Dict[str, Any]]:
-        """Get price history for an asset"""
+    def _publish(
+        self,
+        asset_id: str,
+        orders: List[Dict[str, Any]],
+        trades: List[Dict[str, Any]],
+        diff: Optional[Dict[str, Any]]
+    ):
+        """Push book, trade and order status events to streaming subscribers"""
         
-        # Mock price history
-        history = []
-        base_price = 250.0
+        channel = asset_channel(asset_id)
+        if diff is not None:
+            price_oracle.record_book(diff)
+            market_data_hub.publish(channel, {"type": "book_diff", "data": diff})
+        for trade in trades:
+            market_data_hub.publish(channel, {"type": "trade", "data": trade})
+        for order in orders:
+            market_data_hub.publish(user_channel(order["user_id"]), {"type": "order", "data": order})
+
+    async def _persist(self, orders: List[Dict[str, Any]], trades: List[Dict[str, Any]]):
+        """Write order rows and trades, through the batch writer when it is running"""
         
-        for i in range(30):  # 30 days of history
-            date = datetime.now() - timedelta(days=i)
-            # Simulate price movement
-            import random
-            price_change = random.uniform(-0.03, 0.03)
-            base_price *= (1 + price_change)
+        if self._writer_task is None:
+            await self._write_batch(orders, trades)
+            return
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._write_queue.put((orders, trades, future))
+        await future
+
+    async def _write_batch(self, orders: List[Dict[str, Any]], trades: List[Dict[str, Any]]):
+        """Store order rows and trades in one transaction (database/marketplace_order_batch.sql)"""
+        supabase = get_supabase_client()
+        await execute_query(supabase.rpc("apply_order_batch", {"orders": orders, "trades": trades}))
+
+    async def _run_writer(self):
+        stopping = False
+        while not stopping:
+            item = await self._write_queue.get()
+            if item is None:
+                return
             
-            history.append({
-                "date": date.isoformat(),
-                "price": round(base_price, 2),
-                "volume": random.randint(100, 1000)
-            })
+            batch: List[Tuple[List[Dict[str, Any]], List[Dict[str, Any]], asyncio.Future]] = [item]
+            while len(batch) < self.write_batch_size and not self._write_queue.empty():
+                item = self._write_queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            # Later snapshots of the same order replace earlier ones
+            orders: Dict[str, Dict[str, Any]] = {}
+            trades: List[Dict[str, Any]] = []
+            for order_rows, trade_rows, _ in batch:
+                for row in order_rows:
+                    orders[row["id"]] = row
+                trades.extend(trade_rows)
+            
+            try:
+                await self._write_batch(list(orders.values()), trades)
+                error = None
+            except Exception as e:
+                logger.error(f"Error writing {len(orders)} orders and {len(trades)} trades: {str(e)}")
+                error = e
+            
+            for _, _, future in batch:
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+    async def expire_orders(self) -> int:
+        """Expire open orders that are due, in one bulk write"""
         
-        return list(reversed(history))
+        expired = await self.engine.expire_due(time.time())
+        if not expired:
+            return 0
+        
+        rows = []
+        for group in expired:
+            self._publish(group["asset_id"], group["orders"], [], group["diff"])
+            rows.extend(group["orders"])
+        
+        try:
+            await self._persist(rows, [])
+        except Exception as e:
+            logger.error(f"Error persisting {len(rows)} expired orders: {str(e)}")
+        
+        return len(rows)
+
+    async def _run_expiry_sweeper(self):
+        while True:
+            next_expiry = self.engine.next_expiry()
+            delay = self.expiry_sweep_interval
+            if next_expiry is not None:
+                delay = min(delay, max(next_expiry - time.time(), 0))
+            await asyncio.sleep(delay)
+            try:
+                await self.expire_orders()
+            except Exception as e:
+                logger.error(f"Error expiring orders: {str(e)}")
+
+    def start_matching_engine(self):
+        self.engine.start()
+
+    async def stop_matching_engine(self):
+        await self.engine.stop()
+
+    def start_expiry_sweeper(self):
+        if self._expiry_task is None:
+            self._expiry_task = asyncio.create_task(self._run_expiry_sweeper())
+
+    async def stop_expiry_sweeper(self):
+        if self._expiry_task is not None:
+            self._expiry_task.cancel()
+            try:
+                await self._expiry_task
+            except asyncio.CancelledError:
+                pass
+            self._expiry_task = None
+
+    def start_order_writer(self):
+        if self._writer_task is None:
+            self._write_queue = asyncio.Queue()
+            self._writer_task = asyncio.create_task(self._run_writer())
+
+    async def stop_order_writer(self):
+        """Flush queued writes and stop the batch writer"""
+        if self._writer_task is None:
+            return
+        
+        await self._write_queue.put(None)
+        await self._writer_task
+        self._writer_task = None
+
+    def get_market_price(self, asset_id: str, source: Optional[str] = None) -> Dict[str, Any]:
+        """Reference prices of an asset as maintained by the price oracle"""
+        
+        if source is not None and source not in PRICE_SOURCES:
+            raise HTTPException(status_code=400, detail=f"Invalid price source: {source}")
+        
+        quote = price_oracle.get_quote(asset_id)
+        if source is not None:
+            quote["reference_price"] = price_oracle.get_price(asset_id, source)
+        return {"success": True, "price": quote}
+
+    async def _get_price_history(self, asset_id: str) -> List[Dict[str, Any]]:
+        """Get 30 days of daily price history for an asset"""
+        
+        try:
+            candles = await candle_service.get_candles(asset_id, "1d", limit=30)
+        except Exception as e:
+            logger.error(f"Error fetching price history for {asset_id}: {str(e)}")
+            return self._get_mock_price_history()
+        
+        return [
+            {
+                "date": candle["time"],
+                "price": candle["close"],
+                "volume": candle["volume"],
+                "open": candle["open"],
+                "high": candle["high"],
+                "low": candle["low"],
+                "close": candle["close"]
+            }
+            for candle in candles
+        ]
 
-    async def _get_order_book(self, asset_id: str) -> Dict[str, Any]:
-        """Get order book for an asset"""
+    async def get_price_candles(
+        self,
+        asset_id: str,
+        interval: str = "1h",
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        limit: int = 500
+    ) -> Dict[str, Any]:
+        """Get OHLCV candles for an asset"""
+        
+        if interval not in INTERVALS:
+            raise HTTPException(status_code=400, detail=f"Invalid interval: {interval}")
+        
+        candles = await candle_service.get_candles(asset_id, interval, start, end, limit)
         
-        # Mock order book
         return {
-            "bids": [  # Buy orders
-                {"price": 248.50, "quantity": 150, "orders": 3},
-                {"price": 248.00, "quantity": 200, "orders": 2},
-                {"price": 247.50, "quantity": 100, "orders": 1}
-            ],
-            "asks": [  # Sell orders
-                {"price": 251.50, "quantity": 100, "orders": 1},
-                {"price": 252.00, "quantity": 180, "orders": 2},
-                {"price": 252.50, "quantity": 220, "orders": 4}
-            ],
-            "spread": 3.0,
-            "last_price": 250.0
+            "success": True,
+            "asset_id": asset_id,
+            "interval": interval,
+            "candles": candles
+        }
+
+    async def _get_order_book(self, asset_id: str, depth: Optional[int] = None) -> Dict[str, Any]:
+        """Get aggregated order book levels for an asset"""
+        
+        return await self.book_snapshot(asset_id, depth)
+
+    async def book_snapshot(self, asset_id: str, depth: Optional[int] = None) -> Dict[str, Any]:
+        """Current depth snapshot; its sequence lines up with the diff feed"""
+        
+        return await self.engine.snapshot(asset_id, depth or self.book_depth)
+
+    async def get_order_book(self, asset_id: str, depth: Optional[int] = None) -> Dict[str, Any]:
+        """Get an aggregated depth snapshot; its sequence is the base for diffs"""
+        
+        return {
+            "success": True,
+            "order_book": await self._get_order_book(asset_id, depth)
+        }
+
+    async def get_order_book_diffs(self, asset_id: str, since: int, epoch: Optional[str] = None) -> Dict[str, Any]:
+        """Get book diffs after a sequence number of the snapshot's epoch"""
+        
+        result = await self.engine.diffs_since(asset_id, since, epoch)
+        
+        if result["diffs"] is None:
+            # Too far behind, ahead of the book or from another epoch:
+            # the client has to reload the snapshot
+            return {
+                "success": True,
+                "resync": True,
+                "epoch": result["epoch"],
+                "sequence": result["sequence"],
+                "diffs": []
+            }
+        
+        return {
+            "success": True,
+            "resync": False,
+            "epoch": result["epoch"],
+            "sequence": result["sequence"],
+            "diffs": result["diffs"]
         }
 
     def _get_mock_marketplace_assets(self) -> List[Dict[str, Any]]:
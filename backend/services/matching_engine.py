@@ -0,0 +1,580 @@
+"""
+Solcraft Nexus - Matching Engine
+In-memory price-time priority order books for marketplace assets
+"""
+
+import uuid
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Deque, Set, Tuple
+
+OPEN_STATUSES = ("pending", "partial")
+
+# GTC rests any remainder, IOC cancels it, FOK fills completely or not at all
+TIME_IN_FORCE = ("GTC", "IOC", "FOK")
+
+
+def timestamp(value: str) -> float:
+    """Epoch seconds of an ISO timestamp (naive values are taken as UTC)"""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class BookOrder:
+    """An order as held by the matching engine"""
+
+    __slots__ = (
+        "id", "asset_id", "user_id", "wallet_address", "order_type", "side",
+        "quantity", "price", "stop_price", "filled_quantity", "status",
+        "created_at", "expires_at", "time_in_force"
+    )
+
+    def __init__(self, id: str, asset_id: str, user_id: str, wallet_address: str,
+                 order_type: str, side: str, quantity: int, price: Optional[float] = None,
+                 stop_price: Optional[float] = None, filled_quantity: int = 0,
+                 status: str = "pending", created_at: Optional[str] = None,
+                 expires_at: Optional[str] = None, time_in_force: str = "GTC"):
+        self.id = id
+        self.asset_id = asset_id
+        self.user_id = user_id
+        self.wallet_address = wallet_address
+        self.order_type = order_type
+        self.side = side
+        self.quantity = quantity
+        self.price = price
+        self.stop_price = stop_price
+        self.filled_quantity = filled_quantity
+        self.status = status
+        self.created_at = created_at or datetime.now(timezone.utc).isoformat()
+        self.expires_at = expires_at
+        self.time_in_force = time_in_force
+
+    @property
+    def remaining_quantity(self) -> int:
+        return self.quantity - self.filled_quantity
+
+    @property
+    def is_open(self) -> bool:
+        return self.status in OPEN_STATUSES
+
+    def fill(self, quantity: int):
+        self.filled_quantity += quantity
+        self.status = "filled" if self.remaining_quantity == 0 else "partial"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "asset_id": self.asset_id,
+            "user_id": self.user_id,
+            "wallet_address": self.wallet_address,
+            "order_type": self.order_type,
+            "side": self.side,
+            "quantity": self.quantity,
+            "price": self.price,
+            "stop_price": self.stop_price,
+            "filled_quantity": self.filled_quantity,
+            "remaining_quantity": self.remaining_quantity,
+            "status": self.status,
+            "created_at": self.created_at,
+            "expires_at": self.expires_at,
+            "time_in_force": self.time_in_force
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "BookOrder":
+        return cls(
+            id=data["id"],
+            asset_id=data["asset_id"],
+            user_id=data.get("user_id"),
+            wallet_address=data.get("wallet_address", ""),
+            order_type=data["order_type"],
+            side=data["side"],
+            quantity=int(data["quantity"]),
+            price=float(data["price"]) if data.get("price") is not None else None,
+            stop_price=float(data["stop_price"]) if data.get("stop_price") is not None else None,
+            filled_quantity=int(data.get("filled_quantity") or 0),
+            status=data.get("status", "pending"),
+            created_at=data.get("created_at"),
+            expires_at=data.get("expires_at"),
+            time_in_force=data.get("time_in_force") or "GTC"
+        )
+
+
+class PriceLevel:
+    """FIFO queue of resting orders at one price"""
+
+    __slots__ = ("price", "orders", "quantity", "count")
+
+    def __init__(self, price: float):
+        self.price = price
+        self.orders: Deque[BookOrder] = deque()
+        # Aggregates over live orders; cancelled orders are dropped lazily from the queue
+        self.quantity = 0
+        self.count = 0
+
+
+class BookSide:
+    """Price levels for one side of a book, kept sorted ascending by price"""
+
+    def __init__(self, is_bid: bool):
+        self.is_bid = is_bid
+        self.prices: List[float] = []
+        self.levels: Dict[float, PriceLevel] = {}
+        # Prices whose aggregates changed since the last diff was taken
+        self.changed: Set[float] = set()
+
+    def best_level(self) -> Optional[PriceLevel]:
+        if not self.prices:
+            return None
+        return self.levels[self.prices[-1] if self.is_bid else self.prices[0]]
+
+    def best_price(self) -> Optional[float]:
+        level = self.best_level()
+        return level.price if level else None
+
+    def add(self, order: BookOrder):
+        level = self.levels.get(order.price)
+        if level is None:
+            level = PriceLevel(order.price)
+            self.levels[order.price] = level
+            insort(self.prices, order.price)
+        level.orders.append(order)
+        level.quantity += order.remaining_quantity
+        level.count += 1
+        self.changed.add(order.price)
+
+    def remove(self, order: BookOrder):
+        """Take an order's remaining quantity off its level (the queue entry is skipped later)"""
+        level = self.levels.get(order.price)
+        if level is None:
+            return
+        level.quantity -= order.remaining_quantity
+        level.count -= 1
+        self.changed.add(order.price)
+        if level.count == 0:
+            self._drop_level(level)
+
+    def _drop_level(self, level: PriceLevel):
+        del self.levels[level.price]
+        i = bisect_left(self.prices, level.price)
+        if i < len(self.prices) and self.prices[i] == level.price:
+            del self.prices[i]
+
+    def depth(self, levels: int) -> List[Dict[str, Any]]:
+        """Best ``levels`` price levels, best first"""
+        prices = self.prices[::-1][:levels] if self.is_bid else self.prices[:levels]
+        return [
+            {"price": price, "quantity": self.levels[price].quantity, "orders": self.levels[price].count}
+            for price in prices
+        ]
+
+    def take_changes(self) -> List[Dict[str, Any]]:
+        """Current aggregates of every changed level (quantity 0 means the level is gone)"""
+        changes = []
+        for price in sorted(self.changed, reverse=self.is_bid):
+            level = self.levels.get(price)
+            changes.append({
+                "price": price,
+                "quantity": level.quantity if level else 0,
+                "orders": level.count if level else 0
+            })
+        self.changed.clear()
+        return changes
+
+
+class StopIndex:
+    """Untriggered stop orders of one book, sorted by stop price on each side
+
+    Buy stops trigger when the last trade is at or above their stop price and
+    sell stops when it is at or below, so the triggered orders on each side
+    are a prefix (buys) or a suffix (sells) found with one bisect per print.
+    """
+
+    def __init__(self):
+        # (stop_price, arrival sequence, order id), ascending
+        self.buys: List[Tuple[float, int, str]] = []
+        self.sells: List[Tuple[float, int, str]] = []
+        self.orders: Dict[str, BookOrder] = {}
+        self._keys: Dict[str, Tuple[float, int, str]] = {}
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def get(self, order_id: str) -> Optional[BookOrder]:
+        return self.orders.get(order_id)
+
+    def add(self, order: BookOrder):
+        self._sequence += 1
+        key = (order.stop_price, self._sequence, order.id)
+        insort(self.buys if order.side == "buy" else self.sells, key)
+        self.orders[order.id] = order
+        self._keys[order.id] = key
+
+    def remove(self, order_id: str) -> Optional[BookOrder]:
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return None
+        key = self._keys.pop(order_id)
+        keys = self.buys if order.side == "buy" else self.sells
+        del keys[bisect_left(keys, key)]
+        return order
+
+    def pop_triggered(self, last_price: float) -> List[BookOrder]:
+        """Remove and return the stops crossed by ``last_price``, oldest first"""
+        i = bisect_right(self.buys, (last_price, float("inf"), ""))
+        j = bisect_left(self.sells, (last_price, -1, ""))
+        keys = self.buys[:i] + self.sells[j:]
+        if not keys:
+            return []
+
+        del self.buys[:i]
+        del self.sells[j:]
+        keys.sort(key=lambda key: key[1])
+        for key in keys:
+            del self._keys[key[2]]
+        return [self.orders.pop(key[2]) for key in keys]
+
+
+class OrderBook:
+    """Price-time priority book for a single asset
+
+    Level aggregates are maintained as orders rest, fill and cancel. Every
+    operation that changes them produces a diff carrying the next sequence
+    number; a client that holds a snapshot at sequence N stays current by
+    applying diffs N+1, N+2, ... and resyncs from a snapshot on a gap.
+    Sequences restart with every book instance (e.g. after a restart), so
+    snapshots and diffs also carry the book's epoch; a client holding another
+    epoch has to resync.
+    """
+
+    def __init__(self, asset_id: str, diff_history: int = 1000):
+        self.asset_id = asset_id
+        self.epoch = str(uuid.uuid4())
+        self.sequence = 0
+        self.diffs: Deque[Dict[str, Any]] = deque(maxlen=diff_history)
+        self.bids = BookSide(is_bid=True)
+        self.asks = BookSide(is_bid=False)
+        # Resting limit orders and untriggered stop orders by id
+        self.orders: Dict[str, BookOrder] = {}
+        self.stops = StopIndex()
+        self.last_price: Optional[float] = None
+
+    def _side(self, side: str) -> BookSide:
+        return self.bids if side == "buy" else self.asks
+
+    def submit(self, order: BookOrder) -> Dict[str, Any]:
+        """Match an incoming order; returns the trades and every order whose state changed"""
+        trades: List[Dict[str, Any]] = []
+        touched: Dict[str, BookOrder] = {order.id: order}
+
+        if order.order_type == "stop" and order.status == "pending" and order.filled_quantity == 0:
+            self.stops.add(order)
+        else:
+            self._execute(order, trades, touched)
+
+        self._trigger_stops(trades, touched)
+        return {"trades": trades, "orders": list(touched.values()), "diff": self.take_diff()}
+
+    def _execute(self, order: BookOrder, trades: List[Dict[str, Any]], touched: Dict[str, BookOrder]):
+        opposite = self.asks if order.side == "buy" else self.bids
+        limit_price = order.price if order.order_type == "limit" else None
+
+        if order.time_in_force == "FOK" and not self._can_fill(order, opposite, limit_price):
+            order.status = "cancelled"
+            return
+
+        filled, notional = 0, 0.0
+        while order.remaining_quantity > 0:
+            level = opposite.best_level()
+            if level is None:
+                break
+            if limit_price is not None:
+                if order.side == "buy" and level.price > limit_price:
+                    break
+                if order.side == "sell" and level.price < limit_price:
+                    break
+
+            maker = level.orders[0]
+            if not maker.is_open or maker.id not in self.orders:
+                # Cancelled or expired while queued
+                level.orders.popleft()
+                continue
+
+            quantity = min(order.remaining_quantity, maker.remaining_quantity)
+            maker.fill(quantity)
+            order.fill(quantity)
+            level.quantity -= quantity
+            opposite.changed.add(level.price)
+            touched[maker.id] = maker
+
+            if maker.remaining_quantity == 0:
+                level.orders.popleft()
+                level.count -= 1
+                del self.orders[maker.id]
+                if level.count == 0:
+                    opposite._drop_level(level)
+
+            trades.append(self._trade(order, maker, level.price, quantity))
+            self.last_price = level.price
+            filled += quantity
+            notional += level.price * quantity
+
+        if order.order_type == "market" and filled:
+            # A market order has no price of its own: it records what it executed at
+            order.price = round(notional / filled, 8)
+
+        if order.remaining_quantity > 0:
+            if order.order_type == "limit" and order.time_in_force == "GTC":
+                # Rest the remainder on the book
+                self.orders[order.id] = order
+                self._side(order.side).add(order)
+            else:
+                # Market and IOC orders never rest: the unfilled remainder is cancelled
+                order.status = "cancelled"
+
+    def _can_fill(self, order: BookOrder, opposite: BookSide, limit_price: Optional[float]) -> bool:
+        """Whether the opposite side holds enough quantity within the limit price"""
+        needed = order.remaining_quantity
+        prices = reversed(opposite.prices) if opposite.is_bid else opposite.prices
+        for price in prices:
+            if limit_price is not None:
+                if order.side == "buy" and price > limit_price:
+                    break
+                if order.side == "sell" and price < limit_price:
+                    break
+            needed -= opposite.levels[price].quantity
+            if needed <= 0:
+                return True
+        return False
+
+    def _trade(self, taker: BookOrder, maker: BookOrder, price: float, quantity: int) -> Dict[str, Any]:
+        buy, sell = (taker, maker) if taker.side == "buy" else (maker, taker)
+        return {
+            "id": str(uuid.uuid4()),
+            "asset_id": self.asset_id,
+            "buy_order_id": buy.id,
+            "sell_order_id": sell.id,
+            "buyer_id": buy.user_id,
+            "seller_id": sell.user_id,
+            "quantity": quantity,
+            "price": price,
+            "total_value": round(price * quantity, 8),
+            "trade_type": taker.order_type,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+
+    def _trigger_stops(self, trades: List[Dict[str, Any]], touched: Dict[str, BookOrder]):
+        """Convert stop orders whose stop price was crossed by the last trade"""
+        while self.last_price is not None and len(self.stops):
+            triggered = self.stops.pop_triggered(self.last_price)
+            if not triggered:
+                return
+
+            for stop in triggered:
+                # Stop-limit when a limit price was given, stop-market otherwise
+                stop.order_type = "limit" if stop.price is not None else "market"
+                touched[stop.id] = stop
+                self._execute(stop, trades, touched)
+
+    def cancel(self, order_id: str, status: str = "cancelled") -> Optional[BookOrder]:
+        """Remove an open order from the book"""
+        order = self.orders.pop(order_id, None)
+        if order is not None:
+            self._side(order.side).remove(order)
+        else:
+            order = self.stops.remove(order_id)
+            if order is None:
+                return None
+
+        order.status = status
+        return order
+
+    def take_diff(self) -> Optional[Dict[str, Any]]:
+        bids = self.bids.take_changes()
+        asks = self.asks.take_changes()
+        if not bids and not asks:
+            return None
+
+        self.sequence += 1
+        diff = {
+            "asset_id": self.asset_id,
+            "epoch": self.epoch,
+            "sequence": self.sequence,
+            "bids": bids,
+            "asks": asks,
+            "best_bid": self.bids.best_price(),
+            "best_ask": self.asks.best_price(),
+            "last_price": self.last_price
+        }
+        self.diffs.append(diff)
+        return diff
+
+    def diffs_since(self, sequence: int, epoch: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """Diffs after ``sequence``, or None when the client has to resync
+
+        That is when the diffs are no longer retained, when ``sequence`` is
+        ahead of the book (it was issued by an earlier instance, or is bogus)
+        or when ``epoch`` names another book instance.
+        """
+        if epoch is not None and epoch != self.epoch:
+            return None
+        if sequence > self.sequence:
+            return None
+        if sequence == self.sequence:
+            return []
+        if not self.diffs or self.diffs[0]["sequence"] > sequence + 1:
+            return None
+        return [diff for diff in self.diffs if diff["sequence"] > sequence]
+
+    def restore(self, order: BookOrder):
+        """Put a persisted open order back on the book without matching it"""
+        if order.order_type == "stop" and order.stop_price is not None:
+            self.stops.add(order)
+        elif order.order_type == "limit" and order.remaining_quantity > 0:
+            self.orders[order.id] = order
+            self._side(order.side).add(order)
+        # Restored state is part of the initial snapshot, not a diff
+        self.bids.changed.clear()
+        self.asks.changed.clear()
+
+    def snapshot(self, depth: int = 10) -> Dict[str, Any]:
+        best_bid = self.bids.best_price()
+        best_ask = self.asks.best_price()
+        return {
+            "asset_id": self.asset_id,
+            "epoch": self.epoch,
+            "sequence": self.sequence,
+            "bids": self.bids.depth(depth),
+            "asks": self.asks.depth(depth),
+            "spread": round(best_ask - best_bid, 8) if best_bid is not None and best_ask is not None else None,
+            "last_price": self.last_price
+        }
+
+
+class MatchingEngine:
+    """Order books for all marketplace assets, created on first use"""
+
+    def __init__(self, diff_history: int = 1000):
+        self.diff_history = diff_history
+        self.books: Dict[str, OrderBook] = {}
+        # order id -> asset id for every open order, so cancels need no asset id
+        self.order_assets: Dict[str, str] = {}
+        # (expiry timestamp, order id) min-heap. Closing an order leaves its
+        # entry behind; stale entries are skipped at the top and the heap is
+        # rebuilt once they make up most of it, so it stays O(open orders)
+        self.expiries: List[Tuple[float, str]] = []
+        # Ids of the open orders that have an entry in the heap
+        self.scheduled: Set[str] = set()
+
+    def book(self, asset_id: str) -> OrderBook:
+        """The asset's book, created on first use; only for orders entering it"""
+        book = self.books.get(asset_id)
+        if book is None:
+            book = OrderBook(asset_id, self.diff_history)
+            self.books[asset_id] = book
+        return book
+
+    # Read paths take any asset id from the outside, so they never create a
+    # book: an asset without orders reads as an empty book at sequence 0
+    def snapshot(self, asset_id: str, depth: int = 10) -> Dict[str, Any]:
+        book = self.books.get(asset_id)
+        if book is None:
+            return {
+                "asset_id": asset_id,
+                "epoch": None,
+                "sequence": 0,
+                "bids": [],
+                "asks": [],
+                "spread": None,
+                "last_price": None
+            }
+        return book.snapshot(depth)
+
+    def diffs_since(self, asset_id: str, sequence: int, epoch: Optional[str] = None) -> Dict[str, Any]:
+        book = self.books.get(asset_id)
+        if book is None:
+            # Nothing happened since an empty snapshot; anything else needs a resync
+            diffs = [] if sequence == 0 and epoch is None else None
+            return {"epoch": None, "sequence": 0, "diffs": diffs}
+        return {"epoch": book.epoch, "sequence": book.sequence, "diffs": book.diffs_since(sequence, epoch)}
+
+    def submit(self, order: BookOrder) -> Dict[str, Any]:
+        result = self.book(order.asset_id).submit(order)
+        self._track(result["orders"])
+        self._schedule(order)
+        return result
+
+    def cancel(self, order_id: str, status: str = "cancelled") -> Optional[Dict[str, Any]]:
+        """Cancel an open order; returns the order and the resulting book diff"""
+        asset_id = self.order_assets.pop(order_id, None)
+        if asset_id is None:
+            return None
+        book = self.books[asset_id]
+        order = book.cancel(order_id, status)
+        if order is None:
+            return None
+        self._unschedule(order_id)
+        return {"order": order, "diff": book.take_diff()}
+
+    def get_order(self, order_id: str) -> Optional[BookOrder]:
+        asset_id = self.order_assets.get(order_id)
+        if asset_id is None:
+            return None
+        book = self.books[asset_id]
+        return book.orders.get(order_id) or book.stops.get(order_id)
+
+    def restore(self, order: BookOrder):
+        self.book(order.asset_id).restore(order)
+        self._track([order])
+        self._schedule(order)
+
+    def _schedule(self, order: BookOrder):
+        if order.is_open and order.expires_at:
+            heapq.heappush(self.expiries, (timestamp(order.expires_at), order.id))
+            self.scheduled.add(order.id)
+
+    def _unschedule(self, order_id: str):
+        if order_id not in self.scheduled:
+            return
+        self.scheduled.discard(order_id)
+        # Rebuild when more than half of the entries are stale
+        if len(self.expiries) > 64 and len(self.expiries) > 2 * len(self.scheduled):
+            self.expiries = [entry for entry in self.expiries if entry[1] in self.scheduled]
+            heapq.heapify(self.expiries)
+
+    def next_expiry(self) -> Optional[float]:
+        while self.expiries and self.expiries[0][1] not in self.scheduled:
+            heapq.heappop(self.expiries)
+        return self.expiries[0][0] if self.expiries else None
+
+    def expire_due(self, now: float) -> List[Dict[str, Any]]:
+        """Expire every open order due at ``now``; returns the orders and one diff per book"""
+        expired: Dict[str, List[BookOrder]] = {}
+
+        while self.expiries and self.expiries[0][0] <= now:
+            _, order_id = heapq.heappop(self.expiries)
+            self.scheduled.discard(order_id)
+            asset_id = self.order_assets.pop(order_id, None)
+            if asset_id is None:
+                continue
+            order = self.books[asset_id].cancel(order_id, status="expired")
+            if order is not None:
+                expired.setdefault(asset_id, []).append(order)
+
+        return [
+            {"asset_id": asset_id, "orders": orders, "diff": self.books[asset_id].take_diff()}
+            for asset_id, orders in expired.items()
+        ]
+
+    def _track(self, orders: List[BookOrder]):
+        for order in orders:
+            if order.is_open:
+                self.order_assets[order.id] = order.asset_id
+            else:
+                self.order_assets.pop(order.id, None)
+                self._unschedule(order.id)
@@ -0,0 +1,458 @@
+"""
+Solcraft Nexus - Matching Shards
+Runs order books in-process or partitioned by asset across worker processes
+"""
+
+import time
+import queue
+import asyncio
+import hashlib
+import itertools
+import threading
+import multiprocessing
+from abc import ABC, abstractmethod
+from bisect import bisect_right
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable
+import logging
+
+from .matching_engine import MatchingEngine, BookOrder
+
+logger = logging.getLogger(__name__)
+
+
+def dispatch(engine: MatchingEngine, op: str, args: Any) -> Any:
+    """Run one engine command; arguments and results are plain data so they can cross processes"""
+
+    if op == "submit":
+        result = engine.submit(BookOrder.from_dict(args))
+        return {
+            "trades": result["trades"],
+            "orders": [order.to_dict() for order in result["orders"]],
+            "diff": result["diff"]
+        }
+
+    if op == "submit_many":
+        return [dispatch(engine, "submit", order) for order in args]
+
+    if op == "cancel":
+        order_id, status, user_id = args
+        order = engine.get_order(order_id)
+        if order is None or (user_id is not None and order.user_id != user_id):
+            return None
+        result = engine.cancel(order_id, status)
+        if result is None:
+            return None
+        return {"order": result["order"].to_dict(), "diff": result["diff"]}
+
+    if op == "get_order":
+        order = engine.get_order(args)
+        return order.to_dict() if order else None
+
+    if op == "restore_many":
+        for order in args:
+            engine.restore(BookOrder.from_dict(order))
+        return len(args)
+
+    if op == "snapshot":
+        asset_id, depth = args
+        return engine.snapshot(asset_id, depth)
+
+    if op == "diffs_since":
+        asset_id, sequence, epoch = args
+        return engine.diffs_since(asset_id, sequence, epoch)
+
+    if op == "expire_due":
+        return [
+            {
+                "asset_id": group["asset_id"],
+                "orders": [order.to_dict() for order in group["orders"]],
+                "diff": group["diff"]
+            }
+            for group in engine.expire_due(args)
+        ]
+
+    if op == "stats":
+        return {"books": len(engine.books), "open_orders": len(engine.order_assets)}
+
+    raise ValueError(f"Unknown engine command: {op}")
+
+
+class HashRing:
+    """Consistent hashing of keys onto shards (virtual nodes smooth the spread)"""
+
+    def __init__(self, shards: int, replicas: int = 100):
+        points = sorted(
+            (self._hash(f"{shard}:{replica}"), shard)
+            for shard in range(shards)
+            for replica in range(replicas)
+        )
+        self.hashes = [point for point, _ in points]
+        self.shards = [shard for _, shard in points]
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+    def shard_for(self, key: str) -> int:
+        i = bisect_right(self.hashes, self._hash(key)) % len(self.hashes)
+        return self.shards[i]
+
+
+class EngineClient(ABC):
+    """Async front of the matching engine used by MarketplaceService
+
+    All results are plain dicts (order rows as in the orders table). Commands
+    for one asset always reach the same engine in submission order.
+    ``on_restart`` is awaited with the shard number whenever an engine had to
+    be restarted with empty books, so the caller can reload its open orders.
+    ``on_late_result`` is awaited with (op, result) for a command that was
+    applied after its caller stopped waiting, so its orders and trades can
+    still be persisted and published.
+    """
+
+    on_restart: Optional[Callable[[int], Awaitable[Any]]] = None
+    on_late_result: Optional[Callable[[str, Any], Awaitable[Any]]] = None
+
+    @abstractmethod
+    async def _call(self, asset_id: str, op: str, args: Any) -> Any:
+        """Run one command on the engine that owns ``asset_id``"""
+
+    @abstractmethod
+    async def _broadcast(self, op: str, args: Any) -> List[Any]:
+        """Run one command on every engine; one result per engine"""
+
+    @abstractmethod
+    def _asset_of(self, order_id: str) -> Optional[str]:
+        """Asset of an open order, or None when no book holds it"""
+
+    @abstractmethod
+    def next_expiry(self) -> Optional[float]:
+        """Earliest expiry (epoch seconds) of any open order"""
+
+    async def submit(self, order: BookOrder) -> Dict[str, Any]:
+        return await self._call(order.asset_id, "submit", order.to_dict())
+
+    async def submit_many(self, orders: List[BookOrder]) -> List[Dict[str, Any]]:
+        """Submit orders in list order; returns one result per order"""
+        results = []
+        # Consecutive orders for the same asset travel as one command
+        for asset_id, group in itertools.groupby(orders, key=lambda order: order.asset_id):
+            group = list(group)
+            results.extend(await self._call(asset_id, "submit_many", [order.to_dict() for order in group]))
+        return results
+
+    async def cancel(self, order_id: str, status: str = "cancelled",
+                     user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Cancel an open order (only if owned by ``user_id`` when given)"""
+        asset_id = self._asset_of(order_id)
+        if asset_id is None:
+            return None
+        return await self._call(asset_id, "cancel", (order_id, status, user_id))
+
+    async def get_order(self, order_id: str) -> Optional[Dict[str, Any]]:
+        """An open order's row, or None when no book holds it"""
+        asset_id = self._asset_of(order_id)
+        if asset_id is None:
+            return None
+        return await self._call(asset_id, "get_order", order_id)
+
+    async def restore_many(self, orders: List[BookOrder]) -> int:
+        by_asset: Dict[str, List[Dict[str, Any]]] = {}
+        for order in orders:
+            by_asset.setdefault(order.asset_id, []).append(order.to_dict())
+        counts = await asyncio.gather(*(
+            self._call(asset_id, "restore_many", rows) for asset_id, rows in by_asset.items()
+        ))
+        return sum(counts)
+
+    async def snapshot(self, asset_id: str, depth: int) -> Dict[str, Any]:
+        return await self._call(asset_id, "snapshot", (asset_id, depth))
+
+    async def diffs_since(self, asset_id: str, sequence: int, epoch: Optional[str] = None) -> Dict[str, Any]:
+        return await self._call(asset_id, "diffs_since", (asset_id, sequence, epoch))
+
+    async def expire_due(self, now: float) -> List[Dict[str, Any]]:
+        return [group for groups in await self._broadcast("expire_due", now) for group in groups]
+
+    async def stats(self) -> Dict[str, Any]:
+        shards = await self._broadcast("stats", None)
+        return {
+            "shards": len(shards),
+            "books": sum(shard["books"] for shard in shards),
+            "open_orders": sum(shard["open_orders"] for shard in shards)
+        }
+
+    def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class LocalEngineClient(EngineClient):
+    """Engine in the API process (no IPC; the default)"""
+
+    def __init__(self, diff_history: int = 1000):
+        self.engine = MatchingEngine(diff_history=diff_history)
+
+    async def _call(self, asset_id: str, op: str, args: Any) -> Any:
+        return dispatch(self.engine, op, args)
+
+    async def _broadcast(self, op: str, args: Any) -> List[Any]:
+        return [dispatch(self.engine, op, args)]
+
+    def _asset_of(self, order_id: str) -> Optional[str]:
+        return self.engine.order_assets.get(order_id)
+
+    def next_expiry(self) -> Optional[float]:
+        return self.engine.next_expiry()
+
+
+def _run_shard(requests, responses, diff_history: int):
+    """Worker process: apply command batches to this shard's books in arrival order"""
+    engine = MatchingEngine(diff_history=diff_history)
+
+    while True:
+        batch = requests.get()
+        if batch is None:
+            break
+
+        replies = []
+        for request_id, op, args, deadline in batch:
+            if time.time() > deadline:
+                # The caller has given up on this command: never apply it late
+                replies.append((request_id, False, "TimeoutError: expired before the shard reached it"))
+                continue
+            try:
+                replies.append((request_id, True, dispatch(engine, op, args)))
+            except Exception as e:
+                replies.append((request_id, False, f"{type(e).__name__}: {e}"))
+        responses.put((replies, engine.next_expiry()))
+
+    responses.put(None)
+
+
+class ShardedEngineClient(EngineClient):
+    """Books partitioned over worker processes by consistent hash of asset id
+
+    Each shard has its own process and an in-process outbox: commands issued
+    during one event loop iteration are sent to the shard as a single message,
+    which amortises the IPC cost under load. Matching for different assets
+    runs on different cores while every asset keeps a single ordered command
+    stream. A reader thread per shard resolves the awaiting futures as
+    acknowledgements come back and watches the process: when a shard dies its
+    waiting commands fail and it is restarted. No command waits longer than
+    ``timeout`` seconds; a shard skips commands that reach it after their
+    deadline, and one it applied just before the deadline but answered after
+    it is handed to ``on_late_result`` instead of being lost.
+    """
+
+    def __init__(self, shards: int, diff_history: int = 1000, timeout: float = 10.0):
+        self.shard_count = shards
+        self.diff_history = diff_history
+        self.timeout = timeout
+        self.ring = HashRing(shards)
+
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: List[Optional[multiprocessing.Process]] = []
+        self._requests: List[Any] = []
+        self._readers: List[Optional[threading.Thread]] = []
+        self._outboxes: List[List[Tuple[int, str, Any, float]]] = [[] for _ in range(shards)]
+        # request id -> (shard, loop, future, op) of every command awaiting its reply
+        self._pending: Dict[int, Tuple[int, asyncio.AbstractEventLoop, asyncio.Future, str]] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+
+        # Open order id -> asset id, to route cancels; kept from returned rows
+        self.order_assets: Dict[str, str] = {}
+        self._next_expiry: List[Optional[float]] = [None] * shards
+
+    def start(self):
+        if self._processes:
+            return
+
+        self._stopping = False
+        self._processes = [None] * self.shard_count
+        self._requests = [None] * self.shard_count
+        self._readers = [None] * self.shard_count
+        for shard in range(self.shard_count):
+            self._start_shard(shard)
+
+        logger.info(f"Started {self.shard_count} matching shard processes")
+
+    def _start_shard(self, shard: int):
+        requests = self._context.Queue()
+        responses = self._context.Queue()
+        process = self._context.Process(
+            target=_run_shard,
+            args=(requests, responses, self.diff_history),
+            name=f"matching-shard-{shard}",
+            daemon=True
+        )
+        process.start()
+
+        reader = threading.Thread(
+            target=self._read_responses, args=(shard, process, responses),
+            name=f"matching-shard-{shard}-reader", daemon=True
+        )
+
+        self._processes[shard] = process
+        self._requests[shard] = requests
+        self._readers[shard] = reader
+        reader.start()
+
+    async def stop(self):
+        self._stopping = True
+        for requests in self._requests:
+            requests.put(None)
+
+        loop = asyncio.get_running_loop()
+        for process, reader in zip(self._processes, self._readers):
+            await loop.run_in_executor(None, process.join, 10)
+            await loop.run_in_executor(None, reader.join, 10)
+
+        self._processes, self._requests, self._readers = [], [], []
+
+    def _read_responses(self, shard: int, process, responses):
+        while True:
+            try:
+                message = responses.get(timeout=1.0)
+            except queue.Empty:
+                if process.is_alive():
+                    continue
+                if not self._stopping:
+                    self._restart_shard(shard, process)
+                return
+            if message is None:
+                return
+
+            replies, next_expiry = message
+            self._next_expiry[shard] = next_expiry
+            self._deliver(replies)
+
+    def _deliver(self, replies: List[Tuple[int, bool, Any]]):
+        """Hand shard replies to the loop that awaits them"""
+        with self._lock:
+            waiters = [(self._pending.pop(request_id, None), ok, result) for request_id, ok, result in replies]
+        waiters = [(waiter, ok, result) for waiter, ok, result in waiters if waiter is not None]
+        if not waiters:
+            return
+        loop = waiters[0][0][1]
+        loop.call_soon_threadsafe(self._resolve, [
+            (future, op, ok, result) for (_, _, future, op), ok, result in waiters
+        ])
+
+    def _restart_shard(self, shard: int, process):
+        """Fail the commands a dead shard still owed and start a fresh process for it"""
+        logger.error(f"Matching shard {shard} exited with code {process.exitcode}; restarting it")
+
+        with self._lock:
+            lost = [request_id for request_id, (owner, _, _, _) in self._pending.items() if owner == shard]
+            waiters = [self._pending.pop(request_id) for request_id in lost]
+        error = RuntimeError(f"Matching shard {shard} exited before replying")
+        for _, loop, future, op in waiters:
+            loop.call_soon_threadsafe(self._resolve, [(future, op, False, str(error))])
+
+        self._next_expiry[shard] = None
+        self._start_shard(shard)
+
+        # The new process starts with empty books
+        if self.on_restart is not None and self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self.on_restart(shard), self._loop)
+
+    def _resolve(self, replies: List[Tuple[asyncio.Future, str, bool, Any]]):
+        for future, op, ok, result in replies:
+            if future.cancelled():
+                # The caller timed out or went away, but the shard applied the command
+                if ok:
+                    self._late_result(op, result)
+                continue
+            if future.done():
+                continue
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(RuntimeError(result))
+
+    def _late_result(self, op: str, result: Any):
+        logger.warning(f"Matching command {op} was applied after its caller stopped waiting")
+        self._track(op, result)
+        if self.on_late_result is not None:
+            asyncio.ensure_future(self.on_late_result(op, result))
+
+    async def _send(self, shard: int, op: str, args: Any) -> Any:
+        loop = self._loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        request_id = next(self._ids)
+        with self._lock:
+            self._pending[request_id] = (shard, loop, future, op)
+
+        outbox = self._outboxes[shard]
+        if not outbox:
+            loop.call_soon(self._flush, shard)
+        outbox.append((request_id, op, args, time.time() + self.timeout))
+
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            # Stays pending: the shard either skips it as expired or its late reply is reconciled
+            state = "running" if self._processes[shard].is_alive() else "exited"
+            raise TimeoutError(f"Matching shard {shard} ({state}) did not answer {op} within {self.timeout}s")
+
+    def _flush(self, shard: int):
+        batch, self._outboxes[shard] = self._outboxes[shard], []
+        if batch:
+            self._requests[shard].put(batch)
+
+    async def _call(self, asset_id: str, op: str, args: Any) -> Any:
+        result = await self._send(self.ring.shard_for(asset_id), op, args)
+        self._track(op, result)
+        return result
+
+    async def _broadcast(self, op: str, args: Any) -> List[Any]:
+        results = await asyncio.gather(*(self._send(shard, op, args) for shard in range(self.shard_count)))
+        for result in results:
+            self._track(op, result)
+        return results
+
+    def _track(self, op: str, result: Any):
+        """Keep the order routing table in step with every order row that comes back"""
+        if op == "submit":
+            rows = result["orders"]
+        elif op == "submit_many":
+            rows = [row for item in result for row in item["orders"]]
+        elif op == "cancel":
+            rows = [result["order"]] if result else []
+        elif op == "expire_due":
+            rows = [row for group in result for row in group["orders"]]
+        else:
+            return
+
+        for row in rows:
+            if row["status"] in ("pending", "partial"):
+                self.order_assets[row["id"]] = row["asset_id"]
+            else:
+                self.order_assets.pop(row["id"], None)
+
+    async def restore_many(self, orders: List[BookOrder]) -> int:
+        count = await super().restore_many(orders)
+        for order in orders:
+            if order.is_open:
+                self.order_assets[order.id] = order.asset_id
+        return count
+
+    def _asset_of(self, order_id: str) -> Optional[str]:
+        return self.order_assets.get(order_id)
+
+    def next_expiry(self) -> Optional[float]:
+        due = [expiry for expiry in self._next_expiry if expiry is not None]
+        return min(due) if due else None
+
+
+def create_engine_client(shards: int, diff_history: int = 1000, timeout: float = 10.0) -> EngineClient:
+    """In-process engine for shards <= 1, worker processes otherwise"""
+    if shards > 1:
+        return ShardedEngineClient(shards, diff_history, timeout)
+    return LocalEngineClient(diff_history)
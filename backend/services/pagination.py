@@ -0,0 +1,97 @@
+"""
+Solcraft Nexus - Keyset Pagination
+Opaque cursors over (sort column, id) for Supabase list queries
+"""
+
+import json
+import base64
+from typing import Dict, Any, List, Optional, Tuple, Collection
+from fastapi import HTTPException
+
+
+def encode_cursor(sort_by: str, row: Dict[str, Any]) -> str:
+    # A NULL sort value is kept as JSON null, never as a string
+    payload = json.dumps({"s": sort_by, "v": row.get(sort_by), "id": row["id"]}, default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str) -> Tuple[Any, Any]:
+    """Sort value (None for NULL) and id of the last row of the previous page"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, row_id = payload["v"], payload["id"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if payload.get("s") != sort_by:
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort order")
+    return value, row_id
+
+
+def quote(value: Any) -> str:
+    """A value for a PostgREST filter string, double-quoted so reserved characters stay literal"""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _after(sort_by: str, desc: bool, value: Any, row_id: Any) -> str:
+    """PostgREST condition for the rows after (value, row_id) in (sort_by, id) order
+
+    NULL sort values order as in PostgreSQL: after every value ascending
+    (NULLS LAST) and before every value descending (NULLS FIRST).
+    """
+    op = "lt" if desc else "gt"
+    id_after = f"id.{op}.{quote(row_id)}"
+    if sort_by == "id":
+        return id_after
+
+    if value is None:
+        if desc:
+            return f"or({sort_by}.not.is.null,and({sort_by}.is.null,{id_after}))"
+        return f"and({sort_by}.is.null,{id_after})"
+
+    value_after = f"{sort_by}.{op}.{quote(value)}"
+    tie = f"and({sort_by}.eq.{quote(value)},{id_after})"
+    if desc:
+        return f"or({value_after},{tie})"
+    return f"or({value_after},{sort_by}.is.null,{tie})"
+
+
+def apply_keyset(query, sort_by: str, desc: bool, cursor: Optional[str], limit: int,
+                 sortable: Collection[str] = ("id",), condition: Optional[str] = None):
+    """Order by (sort_by, id) and continue after ``cursor``
+
+    ``sort_by`` must be one of the endpoint's ``sortable`` columns, since it is
+    interpolated into the filter. ``condition`` is a PostgREST logic term the
+    rows must also satisfy (such as ``or(a.eq.1,b.eq.1)``); it is joined to the
+    cursor condition with an explicit ``and(...)``.
+
+    Fetches one extra row so ``page_result`` can tell whether a next page exists.
+    The filter is an index range condition, so every page costs the same
+    instead of scanning and discarding the rows before an offset.
+    """
+    if sort_by != "id" and sort_by not in sortable:
+        raise HTTPException(status_code=400, detail=f"Invalid sort: {sort_by}")
+
+    terms = [condition] if condition else []
+    if cursor:
+        value, row_id = decode_cursor(cursor, sort_by)
+        terms.append(_after(sort_by, desc, value, row_id))
+    if terms:
+        query = query.or_(f"and({','.join(terms)})")
+
+    query = query.order(sort_by, desc=desc)
+    if sort_by != "id":
+        query = query.order("id", desc=desc)
+    return query.limit(limit + 1)
+
+
+def page_result(rows: List[Dict[str, Any]], sort_by: str, limit: int) -> Dict[str, Any]:
+    """Trim the look-ahead row and build the next cursor"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "rows": rows,
+        "has_more": has_more,
+        "next_cursor": encode_cursor(sort_by, rows[-1]) if has_more and rows else None
+    }
@@ -8,7 +8,7 @@ import asyncio
 from typing import Dict, Any, Optional
 from fastapi import HTTPException
 from emergentintegrations.payments.stripe.checkout import StripeCheckout, CheckoutSessionResponse, CheckoutStatusResponse, CheckoutSessionRequest
-from .supabase_service import get_supabase_client
+from .supabase_service import get_supabase_client, execute_query
 
 class PaymentService:
     def __init__(self):
@@ -247,7 +247,7 @@ class PaymentService:
         }
         
         try:
-            result = supabase.table("payment_transactions").insert(transaction_data).execute()
+            result = await execute_query(supabase.table("payment_transactions").insert(transaction_data))
             
             if not result.data:
                 raise HTTPException(status_code=500, detail="Failed to store payment transaction")
@@ -274,7 +274,7 @@ class PaymentService:
         
         try:
             # Check if already processed to prevent duplicate processing
-            existing = supabase.table("payment_transactions").select("*").eq("session_id", session_id).execute()
+            existing = await execute_query(supabase.table("payment_transactions").select("*").eq("session_id", session_id))
             
             if existing.data and existing.data[0]["payment_status"] == "paid":
                 # Already processed, don't update again
@@ -286,7 +286,7 @@ class PaymentService:
                 "updated_at": "now()"
             }
             
-            result = supabase.table("payment_transactions").update(update_data).eq("session_id", session_id).execute()
+            result = await execute_query(supabase.table("payment_transactions").update(update_data).eq("session_id", session_id))
             
             return result.data[0] if result.data else None
         except Exception as e:
@@ -301,7 +301,7 @@ class PaymentService:
         supabase = get_supabase_client()
         
         try:
-            result = supabase.table("payment_transactions").select("*").eq("session_id", session_id).execute()
+            result = await execute_query(supabase.table("payment_transactions").select("*").eq("session_id", session_id))
             
             return result.data[0] if result.data else None
         except Exception as e:
@@ -337,7 +337,7 @@ class PaymentService:
                 "created_at": "now()"
             }
             
-            result = supabase.table("tokenization_credits").insert(tokenization_data).execute()
+            result = await execute_query(supabase.table("tokenization_credits").insert(tokenization_data))
             
             return result.data[0] if result.data else None
         except Exception as e:
@@ -365,7 +365,7 @@ class PaymentService:
                 "created_at": "now()"
             }
             
-            result = supabase.table("crypto_purchases").insert(crypto_purchase_data).execute()
+            result = await execute_query(supabase.table("crypto_purchases").insert(crypto_purchase_data))
             
             return result.data[0] if result.data else None
         except Exception as e:
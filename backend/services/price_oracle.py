@@ -0,0 +1,195 @@
+"""
+Solcraft Nexus - Price Oracle
+Per-asset reference prices (last trade, mid, VWAP) maintained from matching output
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Deque, Tuple, Set
+import logging
+
+from .supabase_service import get_supabase_client, execute_query
+
+logger = logging.getLogger(__name__)
+
+PRICE_SOURCES = ("mid", "last", "vwap")
+
+
+class AssetPrice:
+    """Reference prices of one asset, each readable in O(1)"""
+
+    __slots__ = ("last_price", "best_bid", "best_ask", "trades", "notional", "volume", "updated_at")
+
+    def __init__(self):
+        self.last_price: Optional[float] = None
+        self.best_bid: Optional[float] = None
+        self.best_ask: Optional[float] = None
+        # (timestamp, price * quantity, quantity) inside the VWAP window, with running sums
+        self.trades: Deque[Tuple[float, float, float]] = deque()
+        self.notional = 0.0
+        self.volume = 0.0
+        self.updated_at: Optional[float] = None
+
+    @property
+    def mid_price(self) -> Optional[float]:
+        if self.best_bid is None or self.best_ask is None:
+            return None
+        return (self.best_bid + self.best_ask) / 2
+
+    def vwap(self, window: float, now: float) -> Optional[float]:
+        self._evict(now - window)
+        return self.notional / self.volume if self.volume > 0 else None
+
+    def add_trade(self, price: float, quantity: float, window: float, now: float):
+        self.last_price = price
+        self.trades.append((now, price * quantity, quantity))
+        self.notional += price * quantity
+        self.volume += quantity
+        self._evict(now - window)
+        self.updated_at = now
+
+    def _evict(self, cutoff: float):
+        while self.trades and self.trades[0][0] < cutoff:
+            _, notional, quantity = self.trades.popleft()
+            self.notional -= notional
+            self.volume -= quantity
+        if not self.trades:
+            # Reset accumulated float error whenever the window empties
+            self.notional = self.volume = 0.0
+
+
+class PriceOracle:
+    """Reference prices for every traded asset
+
+    Updated from each trade and book diff the matching engine produces, so the
+    order path reads a price from memory instead of querying the database.
+    Prices are written to market_prices periodically and reloaded at startup.
+    """
+
+    def __init__(self):
+        self.source = os.getenv("MARKET_PRICE_SOURCE", "mid")
+        self.vwap_window = float(os.getenv("MARKET_PRICE_VWAP_WINDOW", "3600"))
+        self.flush_interval = float(os.getenv("MARKET_PRICE_FLUSH_INTERVAL", "5"))
+        self.prices: Dict[str, AssetPrice] = {}
+        self._dirty: Set[str] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    def _asset(self, asset_id: str) -> AssetPrice:
+        price = self.prices.get(asset_id)
+        if price is None:
+            price = AssetPrice()
+            self.prices[asset_id] = price
+        return price
+
+    def record_trade(self, trade: Dict[str, Any]):
+        self._asset(trade["asset_id"]).add_trade(
+            float(trade["price"]), float(trade["quantity"]), self.vwap_window, time.time()
+        )
+        self._dirty.add(trade["asset_id"])
+
+    def record_book(self, diff: Dict[str, Any]):
+        price = self._asset(diff["asset_id"])
+        price.best_bid = diff.get("best_bid")
+        price.best_ask = diff.get("best_ask")
+        price.updated_at = time.time()
+        self._dirty.add(diff["asset_id"])
+
+    def get_price(self, asset_id: str, source: Optional[str] = None) -> Optional[float]:
+        """Reference price from ``source``, falling back to the other sources in order"""
+        price = self.prices.get(asset_id)
+        if price is None:
+            return None
+
+        preferred = source or self.source
+        now = time.time()
+        for name in (preferred,) + tuple(s for s in PRICE_SOURCES if s != preferred):
+            if name == "mid":
+                value = price.mid_price
+            elif name == "last":
+                value = price.last_price
+            else:
+                value = price.vwap(self.vwap_window, now)
+            if value is not None:
+                return round(value, 8)
+        return None
+
+    def get_quote(self, asset_id: str) -> Dict[str, Any]:
+        price = self.prices.get(asset_id) or AssetPrice()
+        return {
+            "asset_id": asset_id,
+            "last_price": price.last_price,
+            "best_bid": price.best_bid,
+            "best_ask": price.best_ask,
+            "mid_price": price.mid_price,
+            "vwap": price.vwap(self.vwap_window, time.time()),
+            "vwap_window": self.vwap_window,
+            "reference_price": self.get_price(asset_id),
+            "updated_at": datetime.fromtimestamp(price.updated_at, tz=timezone.utc).isoformat() if price.updated_at else None
+        }
+
+    async def load(self):
+        """Seed prices from market_prices (the VWAP window restarts empty)"""
+        try:
+            supabase = get_supabase_client()
+            result = await execute_query(supabase.table("market_prices").select(
+                "asset_id, last_price, best_bid, best_ask"
+            ))
+            for row in result.data:
+                price = self._asset(row["asset_id"])
+                price.last_price = row.get("last_price")
+                price.best_bid = row.get("best_bid")
+                price.best_ask = row.get("best_ask")
+            logger.info(f"Loaded reference prices for {len(result.data)} assets")
+        except Exception as e:
+            logger.error(f"Error loading market prices: {str(e)}")
+
+    async def flush(self):
+        if not self._dirty:
+            return
+
+        dirty, self._dirty = self._dirty, set()
+        rows = []
+        for asset_id in dirty:
+            quote = self.get_quote(asset_id)
+            rows.append({
+                "asset_id": asset_id,
+                "last_price": quote["last_price"],
+                "best_bid": quote["best_bid"],
+                "best_ask": quote["best_ask"],
+                "mid_price": quote["mid_price"],
+                "vwap": quote["vwap"],
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            })
+
+        try:
+            supabase = get_supabase_client()
+            await execute_query(supabase.table("market_prices").upsert(rows))
+        except Exception as e:
+            logger.error(f"Error writing {len(rows)} market prices: {str(e)}")
+            self._dirty |= dirty
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# Global oracle instance
+price_oracle = PriceOracle()
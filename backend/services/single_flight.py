@@ -0,0 +1,51 @@
+"""
+Solcraft Nexus - Request Coalescing
+Single-flight execution: concurrent callers with the same key share one in-flight call
+"""
+
+import asyncio
+from typing import Dict, Any, Awaitable, Callable, Hashable
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesce identical concurrent async calls into a single execution
+
+    The first caller for a key starts the call as a task; callers arriving while it
+    is in flight await the same task. The key is released as soon as the call
+    finishes, so this never serves stale results (that is the cache's job).
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is not None:
+            self.shared += 1
+        else:
+            self.executed += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, key=key: self._release(key, t))
+
+        # Shield so one cancelled caller does not cancel the call for everyone else
+        return await asyncio.shield(task)
+
+    def _release(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Mark the exception retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "executed": self.executed,
+            "shared": self.shared
+        }
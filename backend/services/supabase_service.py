@@ -4,8 +4,10 @@ PostgreSQL database service for XRPL tokenization platform
 """
 
 import os
+import time
 import asyncio
-from typing import Dict, Any, Optional, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, timedelta
 from supabase import create_client, Client
 import asyncpg
@@ -38,6 +40,29 @@ class SupabaseService:
             self.supabase: Client = create_client(self.url, self.anon_key)
             self.admin_access = False
             logger.warning("Supabase initialized with anon key only - limited functionality")
+        
+        # The supabase client is synchronous; queries run on a bounded thread pool
+        # so a slow round trip never blocks the event loop
+        self.max_workers = int(os.getenv("SUPABASE_MAX_WORKERS", "16"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="supabase"
+        )
+        
+        # Platform statistics: in-memory TTL cache over the platform_stats aggregates
+        self.platform_stats_ttl = float(os.getenv("PLATFORM_STATS_CACHE_TTL", "60"))
+        self.platform_stats_refresh_interval = float(os.getenv("PLATFORM_STATS_REFRESH_INTERVAL", "300"))
+        self._platform_stats_cache = None
+        self._platform_stats_task: Optional[asyncio.Task] = None
+    
+    async def execute(self, query):
+        """Execute a PostgREST query builder without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, query.execute)
+    
+    def shutdown(self):
+        """Wait for running queries and release the worker threads"""
+        self._executor.shutdown(wait=True)
     
     async def initialize_tables(self):
         """Initialize database tables for Solcraft Nexus"""
@@ -52,15 +77,15 @@ class SupabaseService:
             # We just need to verify they exist
             try:
                 # Test if tables exist by querying them
-                await self.supabase.table("wallets").select("id").limit(1).execute()
-                await self.supabase.table("tokenizations").select("id").limit(1).execute()
-                await self.supabase.table("token_transactions").select("id").limit(1).execute()
-                await self.supabase.table("platform_stats").select("id").limit(1).execute()
+                await self.execute(self.supabase.table("wallets").select("id").limit(1))
+                await self.execute(self.supabase.table("tokenizations").select("id").limit(1))
+                await self.execute(self.supabase.table("token_transactions").select("id").limit(1))
+                await self.execute(self.supabase.table("platform_stats").select("id").limit(1))
                 
                 # Test payment-related tables
-                await self.supabase.table("payment_transactions").select("session_id").limit(1).execute()
-                await self.supabase.table("tokenization_credits").select("id").limit(1).execute()
-                await self.supabase.table("crypto_purchases").select("id").limit(1).execute()
+                await self.execute(self.supabase.table("payment_transactions").select("session_id").limit(1))
+                await self.execute(self.supabase.table("tokenization_credits").select("id").limit(1))
+                await self.execute(self.supabase.table("crypto_purchases").select("id").limit(1))
                 
                 logger.info("All required tables exist and are accessible")
                 return True
@@ -107,8 +132,8 @@ class SupabaseService:
             }
             
             try:
-                self.supabase.table("payment_transactions").insert(dummy_payment).execute()
-                self.supabase.table("payment_transactions").delete().eq("session_id", "dummy_session_init").execute()
+                await self.execute(self.supabase.table("payment_transactions").insert(dummy_payment))
+                await self.execute(self.supabase.table("payment_transactions").delete().eq("session_id", "dummy_session_init"))
                 logger.info("payment_transactions table created")
             except Exception as e:
                 logger.info(f"payment_transactions table might already exist: {str(e)}")
@@ -124,8 +149,8 @@ class SupabaseService:
             }
             
             try:
-                self.supabase.table("tokenization_credits").insert(dummy_credit).execute()
-                self.supabase.table("tokenization_credits").delete().eq("session_id", "dummy_session_init").execute()
+                await self.execute(self.supabase.table("tokenization_credits").insert(dummy_credit))
+                await self.execute(self.supabase.table("tokenization_credits").delete().eq("session_id", "dummy_session_init"))
                 logger.info("tokenization_credits table created")
             except Exception as e:
                 logger.info(f"tokenization_credits table might already exist: {str(e)}")
@@ -143,8 +168,8 @@ class SupabaseService:
             }
             
             try:
-                self.supabase.table("crypto_purchases").insert(dummy_crypto).execute()
-                self.supabase.table("crypto_purchases").delete().eq("session_id", "dummy_session_init").execute()
+                await self.execute(self.supabase.table("crypto_purchases").insert(dummy_crypto))
+                await self.execute(self.supabase.table("crypto_purchases").delete().eq("session_id", "dummy_session_init"))
                 logger.info("crypto_purchases table created")
             except Exception as e:
                 logger.info(f"crypto_purchases table might already exist: {str(e)}")
@@ -157,10 +182,10 @@ class SupabaseService:
     async def create_wallet(self, wallet_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create or update wallet record"""
         try:
-            response = self.supabase.table("wallets").upsert(
+            response = await self.execute(self.supabase.table("wallets").upsert(
                 wallet_data,
                 on_conflict="address"
-            ).execute()
+            ))
             
             return {
                 "success": True,
@@ -173,7 +198,7 @@ class SupabaseService:
     async def get_wallet(self, address: str) -> Dict[str, Any]:
         """Get wallet by address"""
         try:
-            response = self.supabase.table("wallets").select("*").eq("address", address).execute()
+            response = await self.execute(self.supabase.table("wallets").select("*").eq("address", address))
             
             return {
                 "success": True,
@@ -186,10 +211,10 @@ class SupabaseService:
     async def update_wallet_activity(self, address: str) -> Dict[str, Any]:
         """Update wallet last activity"""
         try:
-            response = self.supabase.table("wallets").update({
+            response = await self.execute(self.supabase.table("wallets").update({
                 "last_active": datetime.utcnow().isoformat(),
                 "updated_at": datetime.utcnow().isoformat()
-            }).eq("address", address).execute()
+            }).eq("address", address))
             
             return {"success": True, "data": response.data}
         except Exception as e:
@@ -200,7 +225,7 @@ class SupabaseService:
     async def create_tokenization(self, tokenization_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create new tokenization record"""
         try:
-            response = self.supabase.table("tokenizations").insert(tokenization_data).execute()
+            response = await self.execute(self.supabase.table("tokenizations").insert(tokenization_data))
             
             return {
                 "success": True,
@@ -213,7 +238,7 @@ class SupabaseService:
     async def get_tokenization(self, tokenization_id: str) -> Dict[str, Any]:
         """Get tokenization by ID"""
         try:
-            response = self.supabase.table("tokenizations").select("*").eq("id", tokenization_id).execute()
+            response = await self.execute(self.supabase.table("tokenizations").select("*").eq("id", tokenization_id))
             
             return {
                 "success": True,
@@ -226,10 +251,10 @@ class SupabaseService:
     async def update_tokenization_status(self, tokenization_id: str, status: str) -> Dict[str, Any]:
         """Update tokenization status"""
         try:
-            response = self.supabase.table("tokenizations").update({
+            response = await self.execute(self.supabase.table("tokenizations").update({
                 "status": status,
                 "updated_at": datetime.utcnow().isoformat()
-            }).eq("id", tokenization_id).execute()
+            }).eq("id", tokenization_id))
             
             return {"success": True, "data": response.data}
         except Exception as e:
@@ -239,7 +264,7 @@ class SupabaseService:
     async def get_user_tokenizations(self, owner_address: str) -> Dict[str, Any]:
         """Get all tokenizations for a user"""
         try:
-            response = self.supabase.table("tokenizations").select("*").eq("owner_address", owner_address).execute()
+            response = await self.execute(self.supabase.table("tokenizations").select("*").eq("owner_address", owner_address))
             
             return {
                 "success": True,
@@ -249,11 +274,42 @@ class SupabaseService:
             logger.error(f"Error getting user tokenizations: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    async def get_tokenizations_by_tokens(self, tokens: List[Tuple[str, str]],
+                                          chunk_size: int = 100) -> Dict[str, Any]:
+        """Get tokenizations for many (token_symbol, issuer_address) pairs in bulk"""
+        try:
+            pairs = list(dict.fromkeys(tokens))
+            records = []
+            
+            # One query per chunk of pairs; in_ on both columns may over-match
+            # (symbol from one pair, issuer from another) so filter exact pairs after
+            for i in range(0, len(pairs), chunk_size):
+                chunk = pairs[i:i + chunk_size]
+                wanted = set(chunk)
+                response = await self.execute(self.supabase.table("tokenizations").select("*").in_(
+                    "token_symbol", list({symbol for symbol, _ in chunk})
+                ).in_(
+                    "issuer_address", list({issuer for _, issuer in chunk})
+                ))
+                
+                records.extend(
+                    record for record in response.data
+                    if (record["token_symbol"], record["issuer_address"]) in wanted
+                )
+            
+            return {
+                "success": True,
+                "data": records
+            }
+        except Exception as e:
+            logger.error(f"Error getting tokenizations by tokens: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
     # Transaction operations
     async def create_transaction(self, transaction_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create new transaction record"""
         try:
-            response = self.supabase.table("token_transactions").insert(transaction_data).execute()
+            response = await self.execute(self.supabase.table("token_transactions").insert(transaction_data))
             
             return {
                 "success": True,
@@ -266,7 +322,7 @@ class SupabaseService:
     async def get_transaction(self, transaction_id: str) -> Dict[str, Any]:
         """Get transaction by ID"""
         try:
-            response = self.supabase.table("token_transactions").select("*").eq("id", transaction_id).execute()
+            response = await self.execute(self.supabase.table("token_transactions").select("*").eq("id", transaction_id))
             
             return {
                 "success": True,
@@ -286,7 +342,7 @@ class SupabaseService:
             if txn_hash:
                 update_data["txn_hash"] = txn_hash
             
-            response = self.supabase.table("token_transactions").update(update_data).eq("id", transaction_id).execute()
+            response = await self.execute(self.supabase.table("token_transactions").update(update_data).eq("id", transaction_id))
             
             return {"success": True, "data": response.data}
         except Exception as e:
@@ -296,9 +352,9 @@ class SupabaseService:
     async def get_user_transactions(self, address: str, limit: int = 20) -> Dict[str, Any]:
         """Get user transactions"""
         try:
-            response = self.supabase.table("token_transactions").select("*").or_(
+            response = await self.execute(self.supabase.table("token_transactions").select("*").or_(
                 f"from_address.eq.{address},to_address.eq.{address}"
-            ).order("created_at", desc=True).limit(limit).execute()
+            ).order("created_at", desc=True).limit(limit))
             
             return {
                 "success": True,
@@ -309,55 +365,127 @@ class SupabaseService:
             return {"success": False, "error": str(e)}
     
     # Analytics operations
+    PLATFORM_METRICS = [
+        "total_users",
+        "active_users",
+        "total_tokenizations",
+        "active_tokenizations",
+        "total_transactions",
+        "successful_transactions"
+    ]
+    
     async def get_platform_stats(self) -> Dict[str, Any]:
-        """Get platform statistics"""
+        """Get platform statistics from the precomputed platform_stats aggregates"""
         try:
-            # Get current stats or create defaults
-            stats = {}
-            
-            # Count total wallets
-            wallets_response = self.supabase.table("wallets").select("id", count="exact").execute()
-            stats["total_users"] = wallets_response.count or 0
-            
-            # Count active wallets (last 30 days)
-            thirty_days_ago = (datetime.utcnow() - timedelta(days=30)).isoformat()
-            active_wallets_response = self.supabase.table("wallets").select("id", count="exact").gte("last_active", thirty_days_ago).execute()
-            stats["active_users"] = active_wallets_response.count or 0
-            
-            # Count tokenizations
-            tokenizations_response = self.supabase.table("tokenizations").select("id", count="exact").execute()
-            stats["total_tokenizations"] = tokenizations_response.count or 0
+            now = time.monotonic()
+            if self._platform_stats_cache and self._platform_stats_cache[0] > now:
+                return {"success": True, "data": dict(self._platform_stats_cache[1])}
             
-            # Count active tokenizations
-            active_tokenizations_response = self.supabase.table("tokenizations").select("id", count="exact").eq("status", "active").execute()
-            stats["active_tokenizations"] = active_tokenizations_response.count or 0
+            # Latest value of every metric in one query
+            response = await self.execute(self.supabase.table("platform_stats").select(
+                "metric_name, metric_value, date_recorded"
+            ).in_("metric_name", self.PLATFORM_METRICS).order(
+                "date_recorded", desc=True
+            ).limit(len(self.PLATFORM_METRICS) * 2))
             
-            # Count transactions
-            transactions_response = self.supabase.table("token_transactions").select("id", count="exact").execute()
-            stats["total_transactions"] = transactions_response.count or 0
+            stats = {}
+            for row in response.data:
+                stats.setdefault(row["metric_name"], int(float(row["metric_value"] or 0)))
             
-            # Count successful transactions
-            successful_transactions_response = self.supabase.table("token_transactions").select("id", count="exact").eq("status", "validated").execute()
-            stats["successful_transactions"] = successful_transactions_response.count or 0
+            # Never refreshed yet: compute once now
+            if len(stats) < len(self.PLATFORM_METRICS):
+                refreshed = await self.refresh_platform_stats()
+                if not refreshed["success"]:
+                    return refreshed
+                stats = refreshed["data"]
             
             # Calculate TVL (mock for now)
             stats["total_value_locked"] = 245200000  # This should be calculated from real asset values
             
-            return {"success": True, "data": stats}
+            self._platform_stats_cache = (now + self.platform_stats_ttl, stats)
+            return {"success": True, "data": dict(stats)}
         except Exception as e:
             logger.error(f"Error getting platform stats: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    async def refresh_platform_stats(self) -> Dict[str, Any]:
+        """Recompute the platform_stats aggregates
+        
+        Uses the refresh_platform_stats() database function when it is installed
+        (database/platform_stats_aggregates.sql), otherwise counts concurrently
+        here and upserts all metrics in one request.
+        """
+        try:
+            try:
+                await self.execute(self.supabase.rpc("refresh_platform_stats", {}))
+                response = await self.execute(self.supabase.table("platform_stats").select(
+                    "metric_name, metric_value"
+                ).in_("metric_name", self.PLATFORM_METRICS).eq(
+                    "date_recorded", datetime.utcnow().date().isoformat()
+                ))
+                stats = {row["metric_name"]: int(float(row["metric_value"] or 0)) for row in response.data}
+            except Exception as e:
+                logger.info(f"refresh_platform_stats() unavailable, counting directly: {str(e)}")
+                stats = await self._count_platform_metrics()
+                today = datetime.utcnow().date().isoformat()
+                await self.execute(self.supabase.table("platform_stats").upsert([
+                    {"metric_name": name, "metric_value": value, "date_recorded": today}
+                    for name, value in stats.items()
+                ], on_conflict="metric_name,date_recorded"))
+            
+            # Next read picks up the fresh values
+            self._platform_stats_cache = None
+            return {"success": True, "data": stats}
+        except Exception as e:
+            logger.error(f"Error refreshing platform stats: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
+    async def _count_platform_metrics(self) -> Dict[str, int]:
+        """Exact counts for every platform metric, issued concurrently"""
+        thirty_days_ago = (datetime.utcnow() - timedelta(days=30)).isoformat()
+        queries = {
+            "total_users": self.supabase.table("wallets").select("id", count="exact"),
+            "active_users": self.supabase.table("wallets").select("id", count="exact").gte("last_active", thirty_days_ago),
+            "total_tokenizations": self.supabase.table("tokenizations").select("id", count="exact"),
+            "active_tokenizations": self.supabase.table("tokenizations").select("id", count="exact").eq("status", "active"),
+            "total_transactions": self.supabase.table("token_transactions").select("id", count="exact"),
+            "successful_transactions": self.supabase.table("token_transactions").select("id", count="exact").eq("status", "validated")
+        }
+        
+        # Only the count is needed, not the rows
+        responses = await asyncio.gather(*(self.execute(query.limit(1)) for query in queries.values()))
+        return {name: response.count or 0 for name, response in zip(queries, responses)}
+    
+    async def _refresh_platform_stats_periodically(self):
+        # First refresh at startup, so the counters never wait a full interval
+        while True:
+            await self.refresh_platform_stats()
+            await asyncio.sleep(self.platform_stats_refresh_interval)
+    
+    def start_platform_stats_refresh(self):
+        """Keep platform_stats fresh from the API process (skipped when interval is 0)"""
+        if self.platform_stats_refresh_interval > 0 and self._platform_stats_task is None:
+            self._platform_stats_task = asyncio.create_task(self._refresh_platform_stats_periodically())
+    
+    async def stop_platform_stats_refresh(self):
+        if self._platform_stats_task is not None:
+            self._platform_stats_task.cancel()
+            try:
+                await self._platform_stats_task
+            except asyncio.CancelledError:
+                pass
+            self._platform_stats_task = None
+    
     async def update_platform_metric(self, metric_name: str, value: float) -> Dict[str, Any]:
         """Update or insert platform metric"""
         try:
             today = datetime.utcnow().date().isoformat()
             
-            response = self.supabase.table("platform_stats").upsert({
+            response = await self.execute(self.supabase.table("platform_stats").upsert({
                 "metric_name": metric_name,
                 "metric_value": value,
                 "date_recorded": today
-            }, on_conflict="metric_name,date_recorded").execute()
+            }, on_conflict="metric_name,date_recorded"))
             
             return {"success": True, "data": response.data}
         except Exception as e:
@@ -368,7 +496,7 @@ class SupabaseService:
     async def health_check(self) -> Dict[str, Any]:
         """Check database connection health"""
         try:
-            response = self.supabase.table("wallets").select("id").limit(1).execute()
+            response = await self.execute(self.supabase.table("wallets").select("id").limit(1))
             return {
                 "success": True,
                 "status": "connected",
@@ -388,4 +516,8 @@ supabase_service = SupabaseService()
 
 def get_supabase_client():
     """Get the Supabase client instance"""
-    return supabase_service.supabase
\ No newline at end of file
+    return supabase_service.supabase
+
+async def execute_query(query):
+    """Execute a query built on get_supabase_client() off the event loop"""
+    return await supabase_service.execute(query)
@@ -5,8 +5,10 @@ Real asset tokenization on XRPL with Supabase PostgreSQL
 
 import os
 import json
+import time
 import uuid
-from typing import Dict, Any, Optional, List
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
 from datetime import datetime, timedelta
 from pydantic import BaseModel, Field
 from services.xrpl_service import xrpl_service
@@ -61,6 +63,50 @@ class TokenizationService:
     def __init__(self):
         self.db = supabase_service
         
+        # In-process LRU cache of tokenization records by (token_symbol, issuer_address).
+        # Only found records are cached: a token created by another worker must show up
+        # on the next call, and records updated elsewhere are at most metadata_ttl stale
+        self.metadata_ttl = float(os.getenv("TOKENIZATION_METADATA_TTL", "300"))
+        self.metadata_max_entries = int(os.getenv("TOKENIZATION_METADATA_MAX_ENTRIES", "10000"))
+        self._metadata_cache: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+    
+    async def _get_tokenization_metadata(self, tokens: List[Tuple[str, str]]) -> Dict[Tuple[str, str], Optional[Dict[str, Any]]]:
+        """Look up tokenization records for many tokens, one bulk query for cache misses"""
+        now = time.monotonic()
+        found = {}
+        missing = []
+        
+        for token in dict.fromkeys(tokens):
+            entry = self._metadata_cache.get(token)
+            if entry is not None and entry[0] > now:
+                self._metadata_cache.move_to_end(token)
+                found[token] = entry[1]
+            else:
+                missing.append(token)
+        
+        if missing:
+            result = await self.db.get_tokenizations_by_tokens(missing)
+            if not result["success"]:
+                raise Exception(result["error"])
+            
+            fetched = {token: None for token in missing}
+            expires_at = now + self.metadata_ttl
+            for record in result["data"]:
+                token = (record["token_symbol"], record["issuer_address"])
+                fetched[token] = record
+                self._metadata_cache[token] = (expires_at, record)
+                self._metadata_cache.move_to_end(token)
+            
+            # Least recently used entries go first
+            while len(self._metadata_cache) > self.metadata_max_entries:
+                self._metadata_cache.popitem(last=False)
+            found.update(fetched)
+        
+        return found
+    
+    def _invalidate_tokenization_metadata(self, token_symbol: str, issuer_address: str):
+        self._metadata_cache.pop((token_symbol, issuer_address), None)
+        
     async def create_asset_tokenization(self, asset_data: Dict[str, Any], 
                                        owner_address: str) -> Dict[str, Any]:
         """Create new asset tokenization"""
@@ -111,6 +157,7 @@ class TokenizationService:
             result = await self.db.create_tokenization(tokenization_data)
             if not result["success"]:
                 return result
+            self._invalidate_tokenization_metadata(token_symbol, owner_address)
             
             return {
                 "success": True,
@@ -340,15 +387,13 @@ class TokenizationService:
             if not tokens_result["success"]:
                 return tokens_result
             
-            # Enrich with tokenization data
+            # Enrich with tokenization data, fetched in bulk for all trustlines
+            metadata = await self._get_tokenization_metadata(
+                [(token["currency"], token["issuer"]) for token in tokens_result["tokens"]]
+            )
+            
             enriched_tokens = []
             for token in tokens_result["tokens"]:
-                # Look up tokenization info
-                # Note: We need to modify this query for Supabase
-                tokenization_result = await self.db.supabase.table("tokenizations").select("*").eq(
-                    "token_symbol", token["currency"]
-                ).eq("issuer_address", token["issuer"]).execute()
-                
                 token_info = {
                     "currency": token["currency"],
                     "issuer": token["issuer"],
@@ -356,8 +401,8 @@ class TokenizationService:
                     "limit": token["limit"]
                 }
                 
-                if tokenization_result.data:
-                    tokenization = tokenization_result.data[0]
+                tokenization = metadata.get((token["currency"], token["issuer"]))
+                if tokenization:
                     token_info.update({
                         "asset_name": tokenization["asset_name"],
                         "asset_type": tokenization["asset_type"],
@@ -377,6 +422,16 @@ class TokenizationService:
             logger.error(f"Error getting user tokens: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    async def get_platform_statistics(self) -> Dict[str, Any]:
+        """Get platform statistics from the precomputed aggregates"""
+        stats_result = await self.db.get_platform_stats()
+        if not stats_result["success"]:
+            raise Exception(stats_result["error"])
+        
+        stats = stats_result["data"]
+        stats["success_rate"] = (stats.get("successful_transactions", 0) / max(stats.get("total_transactions", 1), 1)) * 100
+        return stats
+    
     async def get_tokenization_details(self, tokenization_id: str) -> Dict[str, Any]:
         """Get detailed tokenization information"""
         try:
@@ -393,11 +448,11 @@ class TokenizationService:
             )
             
             # Get related transactions
-            transactions_result = await self.db.supabase.table("token_transactions").select("*").eq(
+            transactions_result = await self.db.execute(self.db.supabase.table("token_transactions").select("*").eq(
                 "token_symbol", tokenization["token_symbol"]
             ).eq("issuer_address", tokenization["issuer_address"]).order(
                 "created_at", desc=True
-            ).limit(10).execute()
+            ).limit(10))
             
             result = tokenization.copy()
             if metrics["success"]:
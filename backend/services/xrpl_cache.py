@@ -0,0 +1,101 @@
+"""
+Solcraft Nexus - XRPL Response Cache
+LRU + TTL cache for validated-ledger reads, invalidated when the ledger advances
+"""
+
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ValidatedLedgerCache:
+    """Cache of rippled results keyed by (method, params, validated ledger index)
+
+    Reads pinned to ``ledger_index="validated"`` cannot change until a new ledger
+    validates, so every entry is tagged with the ledger it was read from and the
+    whole cache is dropped as soon as a newer validated ledger is observed. The TTL
+    bounds staleness if ledger advances stop being observed.
+    """
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 4.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.ledger_index: Optional[int] = None
+
+        self._entries: "OrderedDict[Tuple[str, str, Optional[int]], Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(method: str, params: Dict[str, Any]) -> Tuple[str, str]:
+        """Build a stable key from a request method and its parameters"""
+        return method, json.dumps(params, sort_keys=True, default=str)
+
+    def get(self, key: Tuple[str, str]) -> Optional[Any]:
+        """Return a cached result for the current validated ledger, if fresh"""
+        full_key = key + (self.ledger_index,)
+        entry = self._entries.get(full_key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._entries[full_key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(full_key)
+        self.hits += 1
+        return result
+
+    def set(self, key: Tuple[str, str], result: Any, ledger_index: Optional[int] = None):
+        """Store a result read from the given validated ledger"""
+        if ledger_index is not None:
+            self.advance(ledger_index)
+            # A slower response for an older ledger must not be cached as current
+            if ledger_index < self.ledger_index:
+                return
+
+        full_key = key + (self.ledger_index,)
+        self._entries[full_key] = (time.monotonic() + self.ttl, result)
+        self._entries.move_to_end(full_key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def advance(self, ledger_index: int):
+        """Record the latest validated ledger, dropping entries from older ledgers"""
+        if self.ledger_index is not None and ledger_index <= self.ledger_index:
+            return
+
+        if self._entries:
+            self._entries.clear()
+            self.invalidations += 1
+        self.ledger_index = ledger_index
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "ledger_index": self.ledger_index,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations
+        }
@@ -0,0 +1,238 @@
+"""
+Solcraft Nexus - XRPL Client Transports
+Long-lived connections to rippled shared by the XRPL service
+"""
+
+import asyncio
+from typing import Dict, Any, Optional
+import httpx
+from websockets.exceptions import ConnectionClosed
+from xrpl.asyncio.clients import AsyncWebsocketClient
+from xrpl.asyncio.clients.exceptions import XRPLWebsocketException
+from xrpl.asyncio.clients.utils import json_to_response, request_to_json_rpc
+from xrpl.models.requests.request import Request
+from xrpl.models.response import Response
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class XRPLRequestError(Exception):
+    """Raised when rippled answers a request with an error response"""
+
+    def __init__(self, result: Dict[str, Any]):
+        self.result = result
+        self.error = result.get("error", "unknown_error")
+        super().__init__(result.get("error_message") or self.error)
+
+
+class PooledJsonRpcClient:
+    """JSON-RPC client backed by a shared keep-alive HTTP connection pool"""
+
+    def __init__(self, url: str, max_connections: int = 20,
+                 max_keepalive_connections: int = 10, timeout: float = 10.0,
+                 keepalive_expiry: float = 30.0, drain_timeout: float = 5.0):
+        self.url = url
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.timeout = timeout
+        self.keepalive_expiry = keepalive_expiry
+        self.drain_timeout = drain_timeout
+
+        self._http: Optional[httpx.AsyncClient] = None
+        self._inflight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def is_open(self) -> bool:
+        return self._http is not None and not self._http.is_closed
+
+    async def open(self):
+        """Create the underlying connection pool (idempotent)"""
+        if self.is_open:
+            return
+
+        self._http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry
+            ),
+            timeout=httpx.Timeout(self.timeout),
+            headers={"Content-Type": "application/json"}
+        )
+        logger.info(f"XRPL JSON-RPC pool opened for {self.url} "
+                    f"(max_connections={self.max_connections})")
+
+    async def request(self, request: Request, timeout: Optional[float] = None) -> Response:
+        """Send a request over a pooled connection and parse the rippled response"""
+        if not self.is_open:
+            await self.open()
+
+        kwargs = {}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+
+        self._inflight += 1
+        self._idle.clear()
+        try:
+            http_response = await self._http.post(
+                self.url, json=request_to_json_rpc(request), **kwargs
+            )
+            http_response.raise_for_status()
+            return json_to_response(http_response.json())
+        finally:
+            self._inflight -= 1
+            if self._inflight == 0:
+                self._idle.set()
+
+    async def close(self):
+        """Wait for in-flight requests to drain, then close all pooled connections"""
+        if self._http is None:
+            return
+
+        if self._inflight:
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Closing XRPL JSON-RPC pool with {self._inflight} requests in flight")
+
+        await self._http.aclose()
+        self._http = None
+        logger.info(f"XRPL JSON-RPC pool closed for {self.url}")
+
+
+class _DiscardQueue(asyncio.Queue):
+    """Message queue that keeps nothing"""
+
+    def put_nowait(self, item):
+        pass
+
+
+class _RequestWebsocketClient(AsyncWebsocketClient):
+    """AsyncWebsocketClient used for request/response only
+
+    Responses reach their callers through the per-request futures, so the
+    client's copy of every message is not queued (nothing would ever read
+    it). When the socket drops, requests still waiting fail at once instead
+    of at their timeout, so the caller can retry on a new connection.
+    """
+
+    async def _do_open(self):
+        await super()._do_open()
+        self._messages = _DiscardQueue()
+        self._handler_task.add_done_callback(self._fail_open_requests)
+
+    def _fail_open_requests(self, _task):
+        for future in self._open_requests.values():
+            if not future.done():
+                future.set_exception(XRPLWebsocketException("Websocket connection dropped"))
+
+
+class MultiplexedWebsocketClient:
+    """Persistent websocket client pipelining many in-flight requests over one socket
+
+    Responses are matched to requests by ``id`` (handled by ``AsyncWebsocketClient``);
+    a dropped socket is re-established with exponential backoff and the requests
+    it was carrying are sent again once over the new one.
+    """
+
+    def __init__(self, url: str, timeout: float = 10.0, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0, max_reconnect_attempts: int = 5,
+                 drain_timeout: float = 5.0):
+        self.url = url
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_reconnect_attempts = max_reconnect_attempts
+        self.drain_timeout = drain_timeout
+
+        self._ws: Optional[AsyncWebsocketClient] = None
+        self._connect_lock = asyncio.Lock()
+        self._closed = False
+        self._inflight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @property
+    def is_open(self) -> bool:
+        return self._ws is not None and self._ws.is_open()
+
+    async def open(self):
+        """Connect the websocket, retrying with backoff (idempotent)"""
+        self._closed = False
+        await self._ensure_connected()
+
+    async def _ensure_connected(self):
+        if self.is_open:
+            return
+
+        async with self._connect_lock:
+            # Another request may have reconnected while we waited
+            if self.is_open:
+                return
+
+            delay = self.backoff_base
+            for attempt in range(1, self.max_reconnect_attempts + 1):
+                if self._closed:
+                    raise XRPLWebsocketException("Websocket client is closed")
+
+                ws = _RequestWebsocketClient(self.url)
+                try:
+                    await ws.open()
+                    self._ws = ws
+                    logger.info(f"XRPL websocket connected to {self.url}")
+                    return
+                except (OSError, ConnectionClosed, XRPLWebsocketException, asyncio.TimeoutError) as e:
+                    logger.warning(f"XRPL websocket connect attempt {attempt} failed: {str(e)}")
+                    if attempt == self.max_reconnect_attempts:
+                        raise
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, self.backoff_max)
+
+    async def _drop(self, ws: AsyncWebsocketClient):
+        """Discard a broken socket so the next request reconnects"""
+        if self._ws is ws:
+            self._ws = None
+        try:
+            await ws.close()
+        except Exception:
+            pass
+
+    async def request(self, request: Request, timeout: Optional[float] = None) -> Response:
+        """Send a request over the shared socket, reconnecting once if it was dropped"""
+        self._inflight += 1
+        self._idle.clear()
+        try:
+            for retry in (False, True):
+                await self._ensure_connected()
+                ws = self._ws
+                try:
+                    return await asyncio.wait_for(ws.request(request), timeout or self.timeout)
+                except asyncio.TimeoutError:
+                    # Only this request is late (TimeoutError is an OSError): keep the socket
+                    raise
+                except (ConnectionClosed, XRPLWebsocketException, OSError) as e:
+                    logger.warning(f"XRPL websocket request failed, reconnecting: {str(e)}")
+                    await self._drop(ws)
+                    if retry:
+                        raise
+        finally:
+            self._inflight -= 1
+            if self._inflight == 0:
+                self._idle.set()
+
+    async def close(self):
+        """Wait for in-flight requests to drain, then close the socket"""
+        self._closed = True
+        if self._inflight:
+            try:
+                await asyncio.wait_for(self._idle.wait(), timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Closing XRPL websocket with {self._inflight} requests in flight")
+
+        if self._ws is not None:
+            ws, self._ws = self._ws, None
+            await ws.close()
+            logger.info(f"XRPL websocket closed for {self.url}")
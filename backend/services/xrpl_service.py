@@ -6,13 +6,18 @@ Advanced Web3 tokenization platform service for XRPL mainnet
 import os
 import json
 import asyncio
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, AsyncIterator, Union
 from datetime import datetime, timedelta
 import xrpl
 from xrpl.models import Payment, TrustSet, OfferCreate, AccountSet
-from xrpl.clients import JsonRpcClient, WebsocketClient
+from xrpl.clients import WebsocketClient
 from xrpl.wallet import Wallet
 from xrpl.transaction import autofill_and_sign, reliable_submission
+from xrpl.models.response import Response
+from .xrpl_client import PooledJsonRpcClient, MultiplexedWebsocketClient, XRPLRequestError
+from .xrpl_cache import ValidatedLedgerCache
+from .single_flight import SingleFlight
+from .holder_index import HolderIndexRegistry
 from dotenv import load_dotenv
 import logging
 
@@ -34,23 +39,192 @@ class XRPLService:
             self.websocket_url = os.getenv("XRPL_WEBSOCKET_URL", "wss://xrplcluster.com/")
             self.json_rpc_url = os.getenv("XRPL_JSON_RPC_URL", "https://xrplcluster.com/")
             
-        self.client = JsonRpcClient(self.json_rpc_url)
+        # Long-lived transport: "jsonrpc" (pooled HTTP) or "websocket" (multiplexed socket)
+        self.transport = os.getenv("XRPL_TRANSPORT", "jsonrpc").lower()
+        request_timeout = float(os.getenv("XRPL_REQUEST_TIMEOUT", "10"))
+        
+        if self.transport == "websocket":
+            self.client = MultiplexedWebsocketClient(
+                self.websocket_url,
+                timeout=request_timeout,
+                backoff_max=float(os.getenv("XRPL_RECONNECT_BACKOFF_MAX", "30")),
+                max_reconnect_attempts=int(os.getenv("XRPL_RECONNECT_ATTEMPTS", "5"))
+            )
+        else:
+            self.transport = "jsonrpc"
+            self.client = PooledJsonRpcClient(
+                self.json_rpc_url,
+                max_connections=int(os.getenv("XRPL_MAX_CONNECTIONS", "20")),
+                max_keepalive_connections=int(os.getenv("XRPL_MAX_KEEPALIVE_CONNECTIONS", "10")),
+                timeout=request_timeout,
+                keepalive_expiry=float(os.getenv("XRPL_KEEPALIVE_EXPIRY", "30"))
+            )
+        
+        # Cache for reads pinned to the validated ledger
+        self.cache = ValidatedLedgerCache(
+            max_entries=int(os.getenv("XRPL_CACHE_MAX_ENTRIES", "2048")),
+            ttl=float(os.getenv("XRPL_CACHE_TTL", "4"))
+        )
+        self.ledger_poll_interval = float(os.getenv("XRPL_LEDGER_POLL_INTERVAL", "1"))
+        # Identical concurrent reads share one in-flight request
+        self.single_flight = SingleFlight()
+        # Incrementally maintained holder balances per issued token
+        self.holder_index = HolderIndexRegistry(self)
+        self._ledger_tracker: Optional[asyncio.Task] = None
+        
         self.solcraft_symbol = os.getenv("SOLCRAFT_TOKEN_SYMBOL", "SOLCRAFT")
         self.solcraft_issuer = os.getenv("SOLCRAFT_ISSUER_ADDRESS", "rpxv28rM4ttpGmTnVGyKbiYRSpLGTjUZiu")
+    
+    async def startup(self):
+        """Open long-lived XRPL connections and start tracking validated ledgers"""
+        await self.client.open()
+        if self._ledger_tracker is None:
+            self._ledger_tracker = asyncio.create_task(self._track_validated_ledger())
+        self.holder_index.start()
+    
+    async def shutdown(self):
+        """Gracefully close XRPL connections"""
+        await self.holder_index.stop()
+        if self._ledger_tracker is not None:
+            self._ledger_tracker.cancel()
+            try:
+                await self._ledger_tracker
+            except asyncio.CancelledError:
+                pass
+            self._ledger_tracker = None
+        await self.client.close()
+    
+    async def _track_validated_ledger(self):
+        """Poll the latest validated ledger so cached reads are invalidated when it advances"""
+        while True:
+            try:
+                await self.get_validated_ledger_index()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Error tracking validated ledger: {str(e)}")
+            await asyncio.sleep(self.ledger_poll_interval)
+    
+    async def get_validated_ledger_index(self) -> int:
+        """Get the index of the latest validated ledger"""
+        response = await self._request(xrpl.models.requests.Ledger(ledger_index="validated"))
+        ledger_index = int(response.result["ledger_index"])
+        self.cache.advance(ledger_index)
+        return ledger_index
+    
+    async def _request(self, request, timeout: Optional[float] = None) -> Response:
+        """Send a request to rippled over the shared client"""
+        response = await self.client.request(request, timeout=timeout)
+        if not response.is_successful():
+            raise XRPLRequestError(response.result)
+        return response
+    
+    async def _cached_request(self, request) -> Response:
+        """Send a validated-ledger read, serving repeats from the ledger cache
+        and coalescing concurrent misses for the same read into one request"""
+        params = request.to_dict()
+        params.pop("id", None)
+        method = params.pop("method")
+        key = self.cache.make_key(method, params)
+        
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        
+        async def fetch() -> Response:
+            response = await self._request(request)
+            ledger_index = response.result.get("ledger_index")
+            self.cache.set(key, response, int(ledger_index) if ledger_index is not None else None)
+            return response
+        
+        return await self.single_flight.do(key, fetch)
+    
+    async def iter_account_lines(self, account: str, peer: Optional[str] = None,
+                                 page_size: int = 400,
+                                 max_items: Optional[int] = None,
+                                 ledger_index: Union[str, int] = "validated") -> AsyncIterator[Dict[str, Any]]:
+        """Stream all trustlines of an account page by page, following the marker.
+        
+        Only one page is held in memory at a time and every page is read from the
+        same ledger. Stop early with ``max_items`` or by breaking out.
+        """
+        marker = None
+        yielded = 0
+        
+        while True:
+            request = xrpl.models.requests.AccountLines(
+                account=account,
+                peer=peer,
+                ledger_index=ledger_index,
+                limit=page_size,
+                marker=marker
+            )
+            # The first page is a plain validated read and may come from the ledger cache
+            if marker is None and ledger_index == "validated":
+                response = await self._cached_request(request)
+            else:
+                response = await self._request(request)
+            
+            for line in response.result.get("lines", []):
+                yield line
+                yielded += 1
+                if max_items is not None and yielded >= max_items:
+                    return
+            
+            marker = response.result.get("marker")
+            if marker is None:
+                return
+            # Markers are only valid against the ledger they were issued for
+            ledger_index = response.result.get("ledger_index", ledger_index)
+    
+    async def iter_account_transactions(self, account: str, page_size: int = 200,
+                                        max_items: Optional[int] = None,
+                                        forward: bool = False,
+                                        ledger_index_min: int = -1) -> AsyncIterator[Dict[str, Any]]:
+        """Stream an account's transaction history page by page, following the marker.
+        
+        Newest first unless ``forward`` is set; ``ledger_index_min`` skips older
+        ledgers. Stop early with ``max_items`` or by breaking out of the loop.
+        """
+        marker = None
+        yielded = 0
+        
+        while True:
+            limit = page_size
+            if max_items is not None:
+                limit = min(page_size, max_items - yielded)
+            
+            response = await self._request(xrpl.models.requests.AccountTx(
+                account=account,
+                ledger_index_min=ledger_index_min,
+                ledger_index_max=-1,
+                limit=limit,
+                forward=forward,
+                marker=marker
+            ))
+            
+            for tx in response.result.get("transactions", []):
+                yield tx
+                yielded += 1
+                if max_items is not None and yielded >= max_items:
+                    return
+            
+            marker = response.result.get("marker")
+            if marker is None:
+                return
         
     async def get_account_info(self, account_address: str) -> Dict[str, Any]:
         """Get account information from XRPL"""
         try:
-            async with JsonRpcClient(self.json_rpc_url) as client:
-                account_info = await client.request(xrpl.models.requests.AccountInfo(
-                    account=account_address,
-                    ledger_index="validated"
-                ))
-                return {
-                    "success": True,
-                    "account": account_info.result["account_data"],
-                    "balance_xrp": float(account_info.result["account_data"]["Balance"]) / 1000000
-                }
+            account_info = await self._cached_request(xrpl.models.requests.AccountInfo(
+                account=account_address,
+                ledger_index="validated"
+            ))
+            return {
+                "success": True,
+                "account": account_info.result["account_data"],
+                "balance_xrp": float(account_info.result["account_data"]["Balance"]) / 1000000
+            }
         except Exception as e:
             logger.error(f"Error getting account info: {str(e)}")
             return {"success": False, "error": str(e)}
@@ -58,26 +232,20 @@ class XRPLService:
     async def get_account_tokens(self, account_address: str) -> Dict[str, Any]:
         """Get account token balances (trustlines)"""
         try:
-            async with JsonRpcClient(self.json_rpc_url) as client:
-                account_lines = await client.request(xrpl.models.requests.AccountLines(
-                    account=account_address,
-                    ledger_index="validated"
-                ))
-                
-                tokens = []
-                for line in account_lines.result.get("lines", []):
-                    tokens.append({
-                        "currency": line["currency"],
-                        "issuer": line["account"],
-                        "balance": float(line["balance"]),
-                        "limit": float(line["limit"]) if line["limit"] != "0" else None
-                    })
-                
-                return {
-                    "success": True,
-                    "tokens": tokens,
-                    "count": len(tokens)
-                }
+            tokens = []
+            async for line in self.iter_account_lines(account_address):
+                tokens.append({
+                    "currency": line["currency"],
+                    "issuer": line["account"],
+                    "balance": float(line["balance"]),
+                    "limit": float(line["limit"]) if line["limit"] != "0" else None
+                })
+            
+            return {
+                "success": True,
+                "tokens": tokens,
+                "count": len(tokens)
+            }
         except Exception as e:
             logger.error(f"Error getting account tokens: {str(e)}")
             return {"success": False, "error": str(e)}
@@ -195,29 +363,28 @@ class XRPLService:
     async def get_orderbook(self, taker_gets: Dict, taker_pays: Dict) -> Dict[str, Any]:
         """Get orderbook for token pair"""
         try:
-            async with JsonRpcClient(self.json_rpc_url) as client:
-                book_offers = await client.request(xrpl.models.requests.BookOffers(
-                    taker_gets=taker_gets,
-                    taker_pays=taker_pays,
-                    ledger_index="validated",
-                    limit=20
-                ))
-                
-                offers = []
-                for offer in book_offers.result.get("offers", []):
-                    offers.append({
-                        "account": offer["Account"],
-                        "sequence": offer["Sequence"],
-                        "taker_gets": offer["TakerGets"],
-                        "taker_pays": offer["TakerPays"],
-                        "quality": offer.get("quality")
-                    })
-                
-                return {
-                    "success": True,
-                    "offers": offers,
-                    "count": len(offers)
-                }
+            book_offers = await self._cached_request(xrpl.models.requests.BookOffers(
+                taker_gets=taker_gets,
+                taker_pays=taker_pays,
+                ledger_index="validated",
+                limit=20
+            ))
+            
+            offers = []
+            for offer in book_offers.result.get("offers", []):
+                offers.append({
+                    "account": offer["Account"],
+                    "sequence": offer["Sequence"],
+                    "taker_gets": offer["TakerGets"],
+                    "taker_pays": offer["TakerPays"],
+                    "quality": offer.get("quality")
+                })
+            
+            return {
+                "success": True,
+                "offers": offers,
+                "count": len(offers)
+            }
         except Exception as e:
             logger.error(f"Error getting orderbook: {str(e)}")
             return {"success": False, "error": str(e)}
@@ -225,37 +392,29 @@ class XRPLService:
     async def get_transaction_history(self, account: str, limit: int = 20) -> Dict[str, Any]:
         """Get account transaction history"""
         try:
-            async with JsonRpcClient(self.json_rpc_url) as client:
-                account_tx = await client.request(xrpl.models.requests.AccountTx(
-                    account=account,
-                    ledger_index_min=-1,
-                    ledger_index_max=-1,
-                    limit=limit
-                ))
-                
-                transactions = []
-                for tx in account_tx.result.get("transactions", []):
-                    tx_data = tx["tx"]
-                    meta_data = tx["meta"]
-                    
-                    transactions.append({
-                        "hash": tx_data["hash"],
-                        "transaction_type": tx_data["TransactionType"],
-                        "account": tx_data["Account"],
-                        "destination": tx_data.get("Destination"),
-                        "amount": tx_data.get("Amount"),
-                        "fee": tx_data["Fee"],
-                        "date": tx_data.get("date"),
-                        "ledger_index": tx["ledger_index"],
-                        "validated": tx["validated"],
-                        "meta": meta_data
-                    })
+            transactions = []
+            async for tx in self.iter_account_transactions(account, max_items=limit):
+                tx_data = tx["tx"]
+                meta_data = tx["meta"]
                 
-                return {
-                    "success": True,
-                    "transactions": transactions,
-                    "count": len(transactions)
-                }
+                transactions.append({
+                    "hash": tx_data["hash"],
+                    "transaction_type": tx_data["TransactionType"],
+                    "account": tx_data["Account"],
+                    "destination": tx_data.get("Destination"),
+                    "amount": tx_data.get("Amount"),
+                    "fee": tx_data["Fee"],
+                    "date": tx_data.get("date"),
+                    "ledger_index": tx["ledger_index"],
+                    "validated": tx["validated"],
+                    "meta": meta_data
+                })
+            
+            return {
+                "success": True,
+                "transactions": transactions,
+                "count": len(transactions)
+            }
         except Exception as e:
             logger.error(f"Error getting transaction history: {str(e)}")
             return {"success": False, "error": str(e)}
@@ -263,44 +422,40 @@ class XRPLService:
     async def get_token_metrics(self, currency: str, issuer: str) -> Dict[str, Any]:
         """Get token metrics and statistics"""
         try:
-            async with JsonRpcClient(self.json_rpc_url) as client:
-                # Get gateway balances (total issued tokens)
-                gateway_balances = await client.request(xrpl.models.requests.GatewayBalances(
-                    account=issuer,
-                    ledger_index="validated"
-                ))
-                
-                # Get account lines to count holders
-                account_lines = await client.request(xrpl.models.requests.AccountLines(
-                    account=issuer,
-                    ledger_index="validated"
-                ))
-                
-                total_supply = 0
-                holder_count = 0
-                
-                # Calculate metrics from gateway balances
-                obligations = gateway_balances.result.get("obligations", {})
-                if currency in obligations:
-                    total_supply = float(obligations[currency])
-                
-                # Count token holders from account lines
-                for line in account_lines.result.get("lines", []):
-                    if line["currency"] == currency and float(line["balance"]) > 0:
-                        holder_count += 1
-                
-                return {
-                    "success": True,
-                    "currency": currency,
-                    "issuer": issuer,
-                    "total_supply": total_supply,
-                    "holder_count": holder_count,
-                    "circulating_supply": total_supply  # For tokens, this is typically the same
-                }
+            # Holder count and supply are maintained incrementally by the holder index
+            index = await self.holder_index.get_index(currency, issuer)
+            total_supply = float(index.supply)
+            
+            return {
+                "success": True,
+                "currency": currency,
+                "issuer": issuer,
+                "total_supply": total_supply,
+                "holder_count": index.holder_count,
+                "circulating_supply": total_supply,  # For tokens, this is typically the same
+                "ledger_index": index.ledger_index
+            }
         except Exception as e:
             logger.error(f"Error getting token metrics: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    async def get_top_holders(self, currency: str, issuer: str, limit: int = 10) -> Dict[str, Any]:
+        """Get the largest holders of an issued token"""
+        try:
+            index = await self.holder_index.get_index(currency, issuer)
+            
+            return {
+                "success": True,
+                "currency": currency,
+                "issuer": issuer,
+                "holders": index.top_holders(limit),
+                "holder_count": index.holder_count,
+                "ledger_index": index.ledger_index
+            }
+        except Exception as e:
+            logger.error(f"Error getting top holders: {str(e)}")
+            return {"success": False, "error": str(e)}
+    
     async def validate_address(self, address: str) -> Dict[str, Any]:
         """Validate XRPL address format"""
         try:
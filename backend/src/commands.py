@@ -0,0 +1,19 @@
+import click
+from flask import Flask
+from src.services.reconciliation_service import reconciliation_service
+from src.services.snapshot_service import snapshot_service
+
+def register_commands(app: Flask):
+    """One-off maintenance commands, run with ``flask --app src.main <command>``"""
+    
+    @app.cli.command('reconcile-portfolios')
+    def reconcile_portfolios():
+        """Recompute every portfolio's stored totals from its holdings"""
+        run = reconciliation_service.reconcile()
+        click.echo(f"Reconciled {run['portfolios']} portfolios in {run['seconds']}s")
+    
+    @app.cli.command('seed-holding-changes')
+    def seed_holding_changes():
+        """Baseline holding_changes entries for holdings that predate the change log"""
+        seeded = snapshot_service.seed_change_log()
+        click.echo(f"Seeded {seeded} holding change entries")
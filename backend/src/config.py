@@ -54,6 +54,16 @@ class Config:
     # Pagination
     DEFAULT_PAGE_SIZE = 20
     MAX_PAGE_SIZE = 100
+    
+    # Holdings fetched and serialized per chunk when streaming portfolio tokens
+    HOLDINGS_STREAM_BATCH_SIZE = int(os.environ.get('HOLDINGS_STREAM_BATCH_SIZE', 500))
+    
+    # Seconds between full portfolio total reconciliations (0 disables; the first runs at startup)
+    PORTFOLIO_RECONCILE_INTERVAL = int(os.environ.get('PORTFOLIO_RECONCILE_INTERVAL', 3600))
+    # Run the periodic reconciliation inside the app. Every worker and every CLI
+    # invocation creates the app, so enable this in exactly one process; otherwise
+    # schedule `flask reconcile-portfolios` (e.g. from cron)
+    PORTFOLIO_RECONCILE_IN_APP = os.environ.get('PORTFOLIO_RECONCILE_IN_APP', 'false').lower() == 'true'
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -74,6 +84,7 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=5)
+    PORTFOLIO_RECONCILE_INTERVAL = 0
 
 # Configuration mapping
 config = {
@@ -22,6 +22,11 @@ from src.routes.security import security_bp
 
 # Import services
 from src.services.oauth_service import oauth_service
+from src.services.revaluation_service import revaluation_service
+from src.services.reconciliation_service import reconciliation_service
+
+# Import CLI commands
+from src.commands import register_commands
 
 def create_app():
     app = Flask(__name__)
@@ -42,6 +47,9 @@ def create_app():
     app.register_blueprint(tokenization_bp, url_prefix='/api/v1')
     app.register_blueprint(security_bp, url_prefix='/api/v1/security')
     
+    # Register CLI commands
+    register_commands(app)
+    
     # Create database tables
     with app.app_context():
         db.create_all()
@@ -63,13 +71,20 @@ def create_app():
             db.session.commit()
             print("Created default admin user: admin@solcraft-nexus.com / admin123")
     
+    # Correct stored portfolio totals now and periodically from then on, only in
+    # the one process designated for it
+    if app.config['PORTFOLIO_RECONCILE_IN_APP']:
+        reconciliation_service.start(app, app.config['PORTFOLIO_RECONCILE_INTERVAL'])
+    
     # Health check endpoint
     @app.route('/api/health')
     def health_check():
         return jsonify({
             'status': 'healthy',
             'service': 'SolCraft Nexus Backend',
-            'version': '1.0.0'
+            'version': '1.0.0',
+            'revaluation': revaluation_service.get_metrics(),
+            'reconciliation': reconciliation_service.last_run
         })
     
     # API info endpoint
@@ -2,6 +2,7 @@ from src.models.user import db
 from datetime import datetime
 import uuid
 from decimal import Decimal
+from sqlalchemy import event, select
 
 class Asset(db.Model):
     """Asset model for tokenized assets"""
@@ -92,12 +93,37 @@ class Asset(db.Model):
         total_held = db.session.query(db.func.sum(TokenHolding.amount)).filter_by(asset_id=self.id).scalar()
         return total_held or Decimal('0')
     
+    @staticmethod
+    def get_holder_stats(asset_ids):
+        """Get holder count and circulating supply for many assets in one grouped query"""
+        stats = {asset_id: (0, Decimal('0')) for asset_id in asset_ids}
+        if not stats:
+            return stats
+        
+        rows = db.session.query(
+            TokenHolding.asset_id,
+            db.func.sum(db.case((TokenHolding.amount > 0, 1), else_=0)),
+            db.func.sum(TokenHolding.amount)
+        ).filter(TokenHolding.asset_id.in_(list(stats))).group_by(TokenHolding.asset_id).all()
+        
+        for asset_id, holders, total_held in rows:
+            stats[asset_id] = (int(holders or 0), total_held or Decimal('0'))
+        return stats
+    
     def is_tradeable(self):
         """Check if asset tokens can be traded"""
         return self.status == 'active' and self.tokenization_status == 'completed'
     
-    def to_dict(self, include_sensitive=False):
-        """Convert asset to dictionary"""
+    def to_dict(self, include_sensitive=False, holder_stats=None):
+        """Convert asset to dictionary
+        
+        holder_stats is this asset's (total_holders, circulating_supply) when the
+        caller already has it, e.g. from to_dict_many; otherwise it is queried.
+        """
+        if holder_stats is None:
+            holder_stats = Asset.get_holder_stats([self.id])[self.id]
+        total_holders, circulating_supply = holder_stats
+        
         data = {
             'id': self.id,
             'name': self.name,
@@ -121,8 +147,8 @@ class Asset(db.Model):
             'location': self.location,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'tokenized_at': self.tokenized_at.isoformat() if self.tokenized_at else None,
-            'total_holders': self.get_total_holders(),
-            'circulating_supply': str(self.get_circulating_supply())
+            'total_holders': total_holders,
+            'circulating_supply': str(circulating_supply)
         }
         
         if include_sensitive:
@@ -136,6 +162,12 @@ class Asset(db.Model):
             })
         
         return data
+    
+    @staticmethod
+    def to_dict_many(assets, include_sensitive=False):
+        """Convert a page of assets to dictionaries with one holder stats query for the page"""
+        stats = Asset.get_holder_stats([asset.id for asset in assets])
+        return [asset.to_dict(include_sensitive, holder_stats=stats[asset.id]) for asset in assets]
 
 class TokenHolding(db.Model):
     """Token holding model for user portfolios"""
@@ -176,9 +208,14 @@ class TokenHolding(db.Model):
         return Decimal('0')
     
     def update_pnl(self):
-        """Update unrealized P&L"""
-        current_value = self.calculate_current_value()
-        self.unrealized_pnl = current_value - self.total_invested
+        """Update unrealized P&L
+        
+        Goes through the revaluation service, which owns unrealized P&L and the
+        matching portfolio P&L deltas, so a price change and an explicit
+        revaluation in the same flush are never counted twice.
+        """
+        from src.services.revaluation_service import revaluation_service
+        revaluation_service.revalue_holding(self)
     
     def __repr__(self):
         return f'<TokenHolding {self.user_id} holds {self.amount} of {self.asset.symbol}>'
@@ -226,24 +263,79 @@ class Portfolio(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def calculate_metrics(self):
-        """Calculate portfolio metrics from holdings"""
-        holdings = TokenHolding.query.filter_by(user_id=self.user_id).all()
+        """Recalculate portfolio metrics from holdings
         
-        self.total_value = sum(holding.calculate_current_value() for holding in holdings)
-        self.total_invested = sum(holding.total_invested for holding in holdings)
-        self.total_pnl = sum(holding.unrealized_pnl + holding.realized_pnl for holding in holdings)
-        self.total_dividends = sum(holding.total_dividends_received for holding in holdings)
+        Totals are kept current by delta updates on holding and price changes
+        (see the listeners below), so this is only needed to seed a new
+        portfolio or to reconcile one.
+        """
+        totals = db.session.query(
+            db.func.sum(TokenHolding.amount * _holding_price()),
+            db.func.sum(TokenHolding.total_invested),
+            db.func.sum(db.func.coalesce(TokenHolding.unrealized_pnl, 0) + db.func.coalesce(TokenHolding.realized_pnl, 0)),
+            db.func.sum(TokenHolding.total_dividends_received)
+        ).join(Asset, TokenHolding.asset_id == Asset.id).filter(TokenHolding.user_id == self.user_id).one()
+        
+        self.total_value, self.total_invested, self.total_pnl, self.total_dividends = (
+            total or Decimal('0') for total in totals
+        )
         
         db.session.commit()
     
+    @staticmethod
+    def reconcile_all():
+        """Recompute the stored totals of every portfolio from holdings in one UPDATE
+        
+        Corrects totals written before delta maintenance existed and any drift
+        since; run once after deploy and then periodically.
+        
+        Delta writers change holdings or prices and add the delta to the
+        portfolio row in one transaction. The portfolio rows are locked first
+        (FOR UPDATE), which waits for writers already holding them; the UPDATE
+        that follows reads holdings as of after their commit, and writers that
+        come later add their deltas on top of the recomputed totals. Without the
+        lock, a delta committed while the UPDATE ran could be overwritten by
+        totals computed from older holdings.
+        """
+        holdings = TokenHolding.__table__
+        assets = Asset.__table__
+        portfolios = Portfolio.__table__
+        price = db.func.coalesce(db.func.nullif(assets.c.current_price, 0), assets.c.initial_price)
+        
+        def total(expression):
+            return db.func.coalesce(
+                select(db.func.sum(expression))
+                .select_from(holdings.join(assets, assets.c.id == holdings.c.asset_id))
+                .where(holdings.c.user_id == portfolios.c.user_id)
+                .scalar_subquery(),
+                0
+            )
+        
+        try:
+            db.session.execute(select(portfolios.c.id).order_by(portfolios.c.id).with_for_update())
+            result = db.session.execute(portfolios.update().values(
+                total_value=total(holdings.c.amount * price),
+                total_invested=total(holdings.c.total_invested),
+                total_pnl=total(db.func.coalesce(holdings.c.unrealized_pnl, 0) + db.func.coalesce(holdings.c.realized_pnl, 0)),
+                total_dividends=total(holdings.c.total_dividends_received)
+            ))
+            db.session.commit()
+            return result.rowcount
+        except Exception:
+            db.session.rollback()
+            raise
+    
     def get_asset_allocation(self):
-        """Get asset allocation breakdown"""
-        holdings = TokenHolding.query.filter_by(user_id=self.user_id).filter(TokenHolding.amount > 0).all()
+        """Get asset allocation breakdown (holdings and their assets in one query)"""
+        rows = db.session.query(
+            Asset.asset_type, Asset.symbol, Asset.name, TokenHolding.amount, _holding_price()
+        ).join(Asset, TokenHolding.asset_id == Asset.id).filter(
+            TokenHolding.user_id == self.user_id, TokenHolding.amount > 0
+        ).all()
         
         allocation = {}
-        for holding in holdings:
-            asset_type = holding.asset.asset_type
-            current_value = holding.calculate_current_value()
+        for asset_type, symbol, name, amount, price in rows:
+            current_value = amount * price
             
             if asset_type not in allocation:
                 allocation[asset_type] = {
@@ -254,10 +346,10 @@ class Portfolio(db.Model):
             
             allocation[asset_type]['value'] += current_value
             allocation[asset_type]['assets'].append({
-                'symbol': holding.asset.symbol,
-                'name': holding.asset.name,
+                'symbol': symbol,
+                'name': name,
                 'value': str(current_value),
-                'amount': str(holding.amount)
+                'amount': str(amount)
             })
         
         # Calculate percentages
@@ -289,3 +381,226 @@ class Portfolio(db.Model):
             'asset_allocation': self.get_asset_allocation()
         }
 
+
+class HoldingChange(db.Model):
+    """Append-only log of holding amounts, written on every holding change"""
+    __tablename__ = 'holding_changes'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    asset_id = db.Column(db.String(36), nullable=False)
+    user_id = db.Column(db.String(36), nullable=False)
+    delta = db.Column(db.Numeric(20, 8), nullable=False)
+    amount_after = db.Column(db.Numeric(20, 8), nullable=False)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (db.Index('holding_changes_asset_changed_at_idx', 'asset_id', 'changed_at'),)
+    
+    def __repr__(self):
+        return f'<HoldingChange {self.user_id} {self.delta} of {self.asset_id} at {self.changed_at}>'
+
+class HoldingsSnapshot(db.Model):
+    """Point-in-time holders of an asset, stored column-wise
+    
+    user_ids is the zlib-compressed, newline-separated list of holder ids in
+    sorted order; amounts is the matching column, packed as little-endian int64
+    fixed-point (amount_encoding 'i64') or as compressed decimal text ('text')
+    when an amount does not fit.
+    """
+    __tablename__ = 'holdings_snapshots'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    asset_id = db.Column(db.String(36), db.ForeignKey('assets.id'), nullable=False)
+    record_date = db.Column(db.DateTime, nullable=False)
+    
+    holder_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Numeric(20, 8), nullable=False, default=0)
+    
+    amount_encoding = db.Column(db.String(10), nullable=False)
+    user_ids = db.Column(db.LargeBinary, nullable=False)
+    amounts = db.Column(db.LargeBinary, nullable=False)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('asset_id', 'record_date', name='unique_asset_record_date_snapshot'),)
+    
+    def __repr__(self):
+        return f'<HoldingsSnapshot {self.asset_id} at {self.record_date}: {self.holder_count} holders>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'asset_id': self.asset_id,
+            'record_date': self.record_date.isoformat(),
+            'holder_count': self.holder_count,
+            'total_amount': str(self.total_amount),
+            'size_bytes': len(self.user_ids) + len(self.amounts),
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+# Portfolio totals are maintained by deltas: every holding write and asset price
+# change adjusts the holder's portfolios in the same flush, so reads never have
+# to walk the holdings.
+
+HOLDING_METRIC_FIELDS = ('asset_id', 'amount', 'total_invested', 'unrealized_pnl',
+                         'realized_pnl', 'total_dividends_received')
+
+def _holding_price():
+    """Valuation price of a holding's asset (current price, else the initial price)"""
+    return db.func.coalesce(db.func.nullif(Asset.current_price, 0), Asset.initial_price)
+
+def _asset_price(connection, asset_id):
+    assets = Asset.__table__
+    row = connection.execute(
+        select(assets.c.current_price, assets.c.initial_price).where(assets.c.id == asset_id)
+    ).first()
+    if row is None:
+        return Decimal('0')
+    return row.current_price or row.initial_price or Decimal('0')
+
+def _holding_values(target, previous=False):
+    """Metric fields of a holding, as last flushed when previous is True"""
+    state = db.inspect(target)
+    values = {}
+    for field in HOLDING_METRIC_FIELDS:
+        history = state.attrs[field].history
+        if previous and history.has_changes():
+            values[field] = history.deleted[0] if history.deleted else None
+        else:
+            values[field] = getattr(target, field)
+    return values
+
+def _holding_metrics(connection, values, prices):
+    """(value, invested, pnl, dividends) contributed by one holding"""
+    if values['asset_id'] is None:
+        return (Decimal('0'),) * 4
+    
+    asset_id = values['asset_id']
+    if asset_id not in prices:
+        prices[asset_id] = _asset_price(connection, asset_id)
+    
+    amount = values['amount'] or Decimal('0')
+    return (
+        amount * prices[asset_id],
+        values['total_invested'] or Decimal('0'),
+        (values['unrealized_pnl'] or Decimal('0')) + (values['realized_pnl'] or Decimal('0')),
+        values['total_dividends_received'] or Decimal('0')
+    )
+
+def _apply_portfolio_delta(connection, user_id, old, new):
+    delta = [n - o for o, n in zip(old, new)]
+    if not any(delta):
+        return
+    
+    portfolios = Portfolio.__table__
+    connection.execute(portfolios.update().where(portfolios.c.user_id == user_id).values(
+        total_value=db.func.coalesce(portfolios.c.total_value, 0) + delta[0],
+        total_invested=db.func.coalesce(portfolios.c.total_invested, 0) + delta[1],
+        total_pnl=db.func.coalesce(portfolios.c.total_pnl, 0) + delta[2],
+        total_dividends=db.func.coalesce(portfolios.c.total_dividends, 0) + delta[3]
+    ))
+
+def _keep_previous_value(target, value, oldvalue, initiator):
+    pass
+
+# active_history loads the flushed value before these attributes are overwritten
+# on an expired instance (e.g. after a commit), so the deltas below see it
+for _attribute in [getattr(TokenHolding, field) for field in HOLDING_METRIC_FIELDS + ('user_id',)] + [
+        Asset.current_price, Asset.initial_price]:
+    event.listen(_attribute, 'set', _keep_previous_value, active_history=True)
+
+@event.listens_for(TokenHolding, 'after_insert')
+def _holding_inserted(mapper, connection, target):
+    new = _holding_metrics(connection, _holding_values(target), {})
+    _apply_portfolio_delta(connection, target.user_id, (Decimal('0'),) * 4, new)
+
+@event.listens_for(TokenHolding, 'after_update')
+def _holding_updated(mapper, connection, target):
+    state = db.inspect(target)
+    if not any(state.attrs[field].history.has_changes() for field in HOLDING_METRIC_FIELDS + ('user_id',)):
+        return
+    
+    prices = {}
+    old = _holding_metrics(connection, _holding_values(target, previous=True), prices)
+    new = _holding_metrics(connection, _holding_values(target), prices)
+    
+    user_history = state.attrs.user_id.history
+    if user_history.deleted:
+        # Holding moved to another user: take it out of the old owner's totals
+        _apply_portfolio_delta(connection, user_history.deleted[0], old, (Decimal('0'),) * 4)
+        old = (Decimal('0'),) * 4
+    _apply_portfolio_delta(connection, target.user_id, old, new)
+
+@event.listens_for(TokenHolding, 'after_delete')
+def _holding_deleted(mapper, connection, target):
+    old = _holding_metrics(connection, _holding_values(target, previous=True), {})
+    _apply_portfolio_delta(connection, target.user_id, old, (Decimal('0'),) * 4)
+
+@event.listens_for(Asset, 'after_update')
+def _asset_repriced(mapper, connection, target):
+    state = db.inspect(target)
+    current, initial = state.attrs.current_price.history, state.attrs.initial_price.history
+    if not (current.has_changes() or initial.has_changes()):
+        return
+    
+    old_current = current.deleted[0] if current.deleted else target.current_price
+    old_initial = initial.deleted[0] if initial.deleted else target.initial_price
+    delta = ((target.current_price or target.initial_price or Decimal('0'))
+             - (old_current or old_initial or Decimal('0')))
+    if not delta:
+        return
+    
+    # One set-based update for every holder of the asset
+    holdings = TokenHolding.__table__
+    portfolios = Portfolio.__table__
+    held = select(
+        holdings.c.user_id, db.func.sum(holdings.c.amount).label('amount')
+    ).where(holdings.c.asset_id == target.id).group_by(holdings.c.user_id).subquery()
+    
+    connection.execute(portfolios.update().where(portfolios.c.user_id == held.c.user_id).values(
+        total_value=db.func.coalesce(portfolios.c.total_value, 0) + held.c.amount * delta
+    ))
+
+# Every change of a holding's amount (or owner) is appended to holding_changes,
+# so holdings at any past record date can be reconstructed
+
+def _log_holding_change(connection, asset_id, user_id, previous_amount, amount):
+    previous_amount = previous_amount or Decimal('0')
+    amount = amount or Decimal('0')
+    if asset_id is None or user_id is None or amount == previous_amount:
+        return
+    
+    connection.execute(HoldingChange.__table__.insert().values(
+        asset_id=asset_id,
+        user_id=user_id,
+        delta=amount - previous_amount,
+        amount_after=amount,
+        changed_at=datetime.utcnow()
+    ))
+
+@event.listens_for(TokenHolding, 'after_insert')
+def _log_holding_inserted(mapper, connection, target):
+    _log_holding_change(connection, target.asset_id, target.user_id, None, target.amount)
+
+@event.listens_for(TokenHolding, 'after_update')
+def _log_holding_updated(mapper, connection, target):
+    state = db.inspect(target)
+    changed = {field: state.attrs[field].history for field in ('asset_id', 'user_id', 'amount')}
+    if not any(history.has_changes() for history in changed.values()):
+        return
+    
+    previous = {
+        field: history.deleted[0] if history.deleted else getattr(target, field)
+        for field, history in changed.items()
+    }
+    if (previous['asset_id'], previous['user_id']) != (target.asset_id, target.user_id):
+        # Moved to another asset or owner: the old position closes, the new one opens
+        _log_holding_change(connection, previous['asset_id'], previous['user_id'], previous['amount'], None)
+        _log_holding_change(connection, target.asset_id, target.user_id, None, target.amount)
+    else:
+        _log_holding_change(connection, target.asset_id, target.user_id, previous['amount'], target.amount)
+
+@event.listens_for(TokenHolding, 'after_delete')
+def _log_holding_deleted(mapper, connection, target):
+    history = db.inspect(target).attrs.amount.history
+    previous_amount = history.deleted[0] if history.deleted else target.amount
+    _log_holding_change(connection, target.asset_id, target.user_id, previous_amount, None)
@@ -119,11 +119,13 @@ class DividendDistribution(db.Model):
         return Decimal('0')
     
     def get_eligible_holders(self):
-        """Get list of eligible token holders at record date"""
-        # In a real implementation, this would query historical holdings at record_date
-        # For now, we'll use current holdings
-        from src.models.asset import TokenHolding
-        return TokenHolding.query.filter_by(asset_id=self.asset_id).filter(TokenHolding.amount > 0).all()
+        """Get eligible token holders at record date as (user_id, amount) pairs
+        
+        Served from the holdings snapshot for the record date, which is
+        reconstructed from the holding change log when the date has passed.
+        """
+        from src.services.snapshot_service import snapshot_service
+        return snapshot_service.get_snapshot(self.asset_id, self.record_date)
     
     def calculate_payment_amount(self, holding_amount):
         """Calculate dividend payment for a specific holding amount"""
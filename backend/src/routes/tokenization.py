@@ -1,11 +1,14 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.user import db, User
-from src.models.asset import Asset, TokenHolding, Portfolio
+from src.models.asset import Asset, Portfolio
 from src.models.transaction import Transaction
 from src.services.tokenization_service import tokenization_service
+from src.services.holdings_service import holdings_service
+from src.services.revaluation_service import revaluation_service
 from decimal import Decimal
 from datetime import datetime
+from itertools import chain
 import logging
 
 logger = logging.getLogger(__name__)
@@ -92,7 +95,7 @@ def list_assets():
         )
         
         return jsonify({
-            'assets': [asset.to_dict() for asset in assets.items],
+            'assets': Asset.to_dict_many(assets.items),
             'pagination': {
                 'page': assets.page,
                 'pages': assets.pages,
@@ -135,6 +138,36 @@ def get_asset(asset_id):
         logger.error(f"Error getting asset: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@tokenization_bp.route('/assets/<asset_id>/revalue', methods=['POST'])
+@jwt_required()
+def revalue_asset_holdings(asset_id):
+    """Recalculate unrealized P&L of every holding of an asset
+    
+    Price changes made through the ORM already revalue holdings in the same
+    flush. This is the repair path for prices written around it (SQL, bulk
+    imports, another service), which leave unrealized P&L at the old price.
+    """
+    try:
+        current_user_id = get_jwt_identity()
+        
+        asset = Asset.query.get(asset_id)
+        if not asset:
+            return jsonify({'error': 'Asset not found'}), 404
+        
+        if asset.issuer_id != current_user_id:
+            return jsonify({'error': 'Access denied'}), 403
+        
+        run = revaluation_service.revalue_asset(asset_id)
+        
+        return jsonify({
+            'message': 'Holdings revalued successfully',
+            'revaluation': run
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error revaluing asset holdings: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 @tokenization_bp.route('/assets/<asset_id>/tokenize', methods=['POST'])
 @jwt_required()
 def tokenize_asset(asset_id):
@@ -355,31 +388,19 @@ def get_portfolio_tokens():
         if not portfolio:
             return jsonify({'error': 'Portfolio not found'}), 404
         
-        # Get token holdings
-        holdings = TokenHolding.query.filter_by(portfolio_id=portfolio.id).all()
+        # Holdings and their assets come from one JOIN and are streamed in
+        # batches, so large portfolios are never materialised in memory
+        chunks = holdings_service.stream_portfolio_tokens(
+            current_user_id, portfolio.id, current_app.config['HOLDINGS_STREAM_BATCH_SIZE']
+        )
         
-        holdings_data = []
-        for holding in holdings:
-            asset = holding.asset
-            holdings_data.append({
-                'asset_id': asset.id,
-                'mpt_id': asset.xrpl_token_id,
-                'name': asset.name,
-                'symbol': asset.symbol,
-                'asset_type': asset.asset_type,
-                'balance': str(holding.balance),
-                'average_cost': str(holding.average_cost),
-                'total_cost': str(holding.total_cost),
-                'current_value': str(holding.current_value),
-                'unrealized_pnl': str(holding.unrealized_pnl),
-                'last_updated': holding.last_updated.isoformat()
-            })
+        # Run the query and the first batch now, while an error can still be a 500
+        first = next(chunks)
         
-        return jsonify({
-            'portfolio_id': portfolio.id,
-            'holdings': holdings_data,
-            'total_holdings': len(holdings_data)
-        }), 200
+        return Response(
+            stream_with_context(chain([first], chunks)),
+            mimetype='application/json'
+        )
         
     except Exception as e:
         logger.error(f"Error getting portfolio tokens: {str(e)}")
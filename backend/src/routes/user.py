@@ -260,9 +260,10 @@ def get_portfolio():
             )
             db.session.add(portfolio)
             db.session.commit()
-        
-        # Calculate current metrics
-        portfolio.calculate_metrics()
+            
+            # Seed totals from existing holdings; writes keep them current and
+            # reconciliation_service corrects any drift
+            portfolio.calculate_metrics()
         
         return jsonify({
             'portfolio': portfolio.to_dict()
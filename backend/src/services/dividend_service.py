@@ -6,6 +6,7 @@ from src.models.user import db, User
 from src.models.asset import Asset, Portfolio
 from src.models.transaction import Transaction, DividendDistribution
 from src.services.wallet_service import xrpl_service
+from src.services.snapshot_service import snapshot_service
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,6 +27,9 @@ class DividendService:
         # Schedule annual distributions
         schedule.every().year.do(self.distribute_annual_dividends)
         
+        # Snapshot holders once a distribution's record date has passed
+        schedule.every().hour.do(snapshot_service.capture_due)
+        
         logger.info("Dividend scheduler initialized")
     
     def calculate_dividend_per_token(self, asset_id, total_revenue, distribution_percentage=80):
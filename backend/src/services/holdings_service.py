@@ -0,0 +1,110 @@
+import json
+import logging
+from itertools import islice
+from decimal import Decimal
+from typing import Dict, Any, Iterator, Optional
+from sqlalchemy import select
+from src.models.user import db
+from src.models.asset import Asset, TokenHolding
+
+logger = logging.getLogger(__name__)
+
+class HoldingsService:
+    """Read model for token holdings
+    
+    Holdings are read together with their assets in a single JOIN and returned
+    as plain rows, so listing a portfolio never loads ORM instances or lazy-loads
+    one asset per holding.
+    """
+    
+    def holdings_query(self, user_id: str, min_amount: Optional[Decimal] = None):
+        """SELECT of a user's holdings joined with their assets"""
+        holdings = TokenHolding.__table__
+        assets = Asset.__table__
+        
+        query = select(
+            holdings.c.id,
+            holdings.c.asset_id,
+            assets.c.xrpl_token_id,
+            assets.c.name,
+            assets.c.symbol,
+            assets.c.asset_type,
+            assets.c.current_price,
+            assets.c.initial_price,
+            assets.c.current_supply,
+            holdings.c.amount,
+            holdings.c.average_cost,
+            holdings.c.total_invested,
+            holdings.c.unrealized_pnl,
+            holdings.c.realized_pnl,
+            holdings.c.total_dividends_received,
+            holdings.c.first_purchase_date,
+            holdings.c.last_transaction_date,
+            holdings.c.updated_at
+        ).join(assets, assets.c.id == holdings.c.asset_id).where(holdings.c.user_id == user_id)
+        
+        if min_amount is not None:
+            query = query.where(holdings.c.amount > min_amount)
+        
+        return query.order_by(assets.c.symbol, holdings.c.id)
+    
+    def iter_holdings(self, user_id: str, batch_size: int = 500) -> Iterator[Any]:
+        """Yield holding rows, fetching from the cursor in batches"""
+        result = db.session.execute(
+            self.holdings_query(user_id).execution_options(yield_per=batch_size)
+        )
+        for partition in result.partitions():
+            yield from partition
+    
+    def serialize(self, row) -> Dict[str, Any]:
+        """Portfolio token entry for one holding row"""
+        price = row.current_price or row.initial_price or Decimal('0')
+        last_updated = row.last_transaction_date or row.updated_at
+        
+        return {
+            'asset_id': row.asset_id,
+            'mpt_id': row.xrpl_token_id,
+            'name': row.name,
+            'symbol': row.symbol,
+            'asset_type': row.asset_type,
+            'balance': str(row.amount),
+            'average_cost': str(row.average_cost) if row.average_cost is not None else None,
+            'total_cost': str(row.total_invested),
+            'current_value': str(row.amount * price),
+            'unrealized_pnl': str(row.unrealized_pnl),
+            'last_updated': last_updated.isoformat() if last_updated else None
+        }
+    
+    def stream_portfolio_tokens(self, user_id: str, portfolio_id: str, batch_size: int = 500) -> Iterator[str]:
+        """Portfolio tokens response as JSON text chunks, one batch of holdings at a time
+        
+        The query runs and the first batch is serialized before the first chunk
+        is yielded, so a caller that pulls it eagerly still sees those errors
+        before sending a status. Later errors are logged here and end the
+        document with an "error" field instead of truncating it.
+        """
+        rows = self.iter_holdings(user_id, batch_size)
+        first = [json.dumps(self.serialize(row)) for row in islice(rows, batch_size)]
+        yield '{"portfolio_id": ' + json.dumps(portfolio_id) + ', "holdings": [' + ','.join(first)
+        
+        count = len(first)
+        chunk = []
+        try:
+            for row in rows:
+                chunk.append(json.dumps(self.serialize(row)))
+                count += 1
+                if len(chunk) >= batch_size:
+                    yield (',' if count > len(chunk) else '') + ','.join(chunk)
+                    chunk = []
+        except Exception as e:
+            logger.error(f"Error streaming portfolio tokens for {user_id} after {count} holdings: {str(e)}")
+            yield '], "total_holdings": ' + str(count - len(chunk)) + ', "error": "Holdings stream interrupted"}'
+            return
+        
+        if chunk:
+            yield (',' if count > len(chunk) else '') + ','.join(chunk)
+        
+        yield '], "total_holdings": ' + str(count) + '}'
+
+# Global service instance
+holdings_service = HoldingsService()
@@ -0,0 +1,60 @@
+import time
+import logging
+from datetime import datetime
+from threading import Thread
+from typing import Dict, Any, Optional
+from src.models.user import db
+from src.models.asset import Portfolio
+
+logger = logging.getLogger(__name__)
+
+class ReconciliationService:
+    """Periodic reconciliation of stored portfolio totals
+    
+    Portfolio totals are maintained incrementally on holding and price writes.
+    Totals stored before that existed, and any drift since (writes that bypass
+    the ORM, failed deltas), are corrected by recomputing every portfolio from
+    its holdings: with ``flask reconcile-portfolios`` (e.g. from cron), or in
+    the one process started with PORTFOLIO_RECONCILE_IN_APP, once at startup
+    and then every ``interval`` seconds.
+    """
+    
+    def __init__(self):
+        self._thread: Optional[Thread] = None
+        self.last_run: Optional[Dict[str, Any]] = None
+    
+    def reconcile(self) -> Dict[str, Any]:
+        """Recompute the totals of every portfolio now"""
+        started = time.perf_counter()
+        portfolios = Portfolio.reconcile_all()
+        elapsed = time.perf_counter() - started
+        
+        self.last_run = {
+            'portfolios': portfolios,
+            'seconds': round(elapsed, 6),
+            'finished_at': datetime.utcnow().isoformat()
+        }
+        logger.info(f"Reconciled {portfolios} portfolio totals in {elapsed:.3f}s")
+        return self.last_run
+    
+    def start(self, app, interval: int):
+        """Reconcile in a background thread, first immediately and then every ``interval`` seconds"""
+        if interval <= 0 or self._thread is not None:
+            return
+        
+        def run():
+            while True:
+                with app.app_context():
+                    try:
+                        self.reconcile()
+                    except Exception as e:
+                        logger.error(f"Error reconciling portfolio totals: {str(e)}")
+                    finally:
+                        db.session.remove()
+                time.sleep(interval)
+        
+        self._thread = Thread(target=run, name='portfolio-reconciliation', daemon=True)
+        self._thread.start()
+
+# Global service instance
+reconciliation_service = ReconciliationService()
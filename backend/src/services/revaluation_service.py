@@ -0,0 +1,140 @@
+import time
+import logging
+from typing import Dict, Any, Optional
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from src.models.user import db
+from src.models.asset import Asset, TokenHolding, Portfolio
+
+logger = logging.getLogger(__name__)
+
+class RevaluationService:
+    """Set-based revaluation of unrealized P&L when asset prices change
+    
+    Every holding of an asset is revalued by a single UPDATE ... FROM assets,
+    and the holders' portfolio P&L totals move by the same deltas, whatever the
+    number of holders. This is the only writer of unrealized P&L:
+    TokenHolding.update_pnl revalues its one holding through the same statements.
+    """
+    
+    def __init__(self):
+        self.metrics = {
+            'runs': 0,
+            'holdings_revalued': 0,
+            'total_seconds': 0.0,
+            'last_run': None
+        }
+    
+    @staticmethod
+    def _price():
+        assets = Asset.__table__
+        return db.func.coalesce(db.func.nullif(assets.c.current_price, 0), assets.c.initial_price)
+    
+    def revalue(self, connection, asset_id: Optional[str] = None, holding_id: Optional[str] = None) -> Dict[str, Any]:
+        """Revalue the holdings of one asset (all assets when asset_id is None) on ``connection``
+        
+        ``holding_id`` narrows the revaluation to a single holding.
+        """
+        holdings = TokenHolding.__table__
+        assets = Asset.__table__
+        portfolios = Portfolio.__table__
+        revalued_pnl = holdings.c.amount * self._price() - db.func.coalesce(holdings.c.total_invested, 0)
+        
+        started = time.perf_counter()
+        
+        # Portfolio totals first, while the holdings still carry their previous P&L
+        delta = select(
+            holdings.c.user_id,
+            db.func.sum(revalued_pnl - db.func.coalesce(holdings.c.unrealized_pnl, 0)).label('pnl')
+        ).select_from(holdings.join(assets, assets.c.id == holdings.c.asset_id))
+        if asset_id is not None:
+            delta = delta.where(holdings.c.asset_id == asset_id)
+        if holding_id is not None:
+            delta = delta.where(holdings.c.id == holding_id)
+        delta = delta.group_by(holdings.c.user_id).subquery()
+        
+        connection.execute(portfolios.update().where(portfolios.c.user_id == delta.c.user_id).values(
+            total_pnl=db.func.coalesce(portfolios.c.total_pnl, 0) + delta.c.pnl
+        ))
+        
+        update = holdings.update().where(holdings.c.asset_id == assets.c.id)
+        if asset_id is not None:
+            update = update.where(assets.c.id == asset_id)
+        if holding_id is not None:
+            update = update.where(holdings.c.id == holding_id)
+        result = connection.execute(update.values(unrealized_pnl=revalued_pnl))
+        
+        elapsed = time.perf_counter() - started
+        run = {
+            'asset_id': asset_id,
+            'holdings': result.rowcount,
+            'seconds': round(elapsed, 6),
+            'holdings_per_second': round(result.rowcount / elapsed, 1) if elapsed > 0 else None
+        }
+        
+        self.metrics['runs'] += 1
+        self.metrics['holdings_revalued'] += result.rowcount
+        self.metrics['total_seconds'] += elapsed
+        self.metrics['last_run'] = run
+        logger.info(f"Revalued {result.rowcount} holdings of {asset_id or 'all assets'} in {elapsed:.3f}s")
+        
+        return run
+    
+    def revalue_holding(self, holding: TokenHolding) -> Dict[str, Any]:
+        """Revalue one holding in the current transaction (flushing pending changes first)"""
+        db.session.flush()
+        run = self.revalue(db.session.connection(), holding.asset_id, holding.id)
+        db.session.expire(holding, ['unrealized_pnl'])
+        return run
+    
+    def revalue_asset(self, asset_id: str) -> Dict[str, Any]:
+        """Revalue one asset's holdings and commit (after a price written outside the ORM)"""
+        try:
+            run = self.revalue(db.session.connection(), asset_id)
+            db.session.commit()
+            return run
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error revaluing holdings of {asset_id}: {str(e)}")
+            raise
+    
+    def revalue_all(self) -> Dict[str, Any]:
+        """Revalue every holding in one statement (e.g. a periodic reconciliation)"""
+        try:
+            run = self.revalue(db.session.connection())
+            db.session.commit()
+            return run
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error revaluing holdings: {str(e)}")
+            raise
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        metrics = dict(self.metrics)
+        metrics['holdings_per_second'] = (
+            round(metrics['holdings_revalued'] / metrics['total_seconds'], 1)
+            if metrics['total_seconds'] > 0 else None
+        )
+        metrics['total_seconds'] = round(metrics['total_seconds'], 6)
+        return metrics
+
+# Global service instance
+revaluation_service = RevaluationService()
+
+@event.listens_for(Asset, 'after_update')
+def _revalue_on_price_change(mapper, connection, target):
+    """Revalue an asset's holdings in the same flush that changes its price"""
+    state = db.inspect(target)
+    if state.attrs.current_price.history.has_changes() or state.attrs.initial_price.history.has_changes():
+        revaluation_service.revalue(connection, target.id)
+        state.session.info.setdefault('revalued_assets', set()).add(target.id)
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _expire_revalued_holdings(session, flush_context):
+    """Reload unrealized P&L of loaded holdings that a bulk revaluation rewrote"""
+    asset_ids = session.info.pop('revalued_assets', None)
+    if not asset_ids:
+        return
+    for instance in list(session.identity_map.values()):
+        if isinstance(instance, TokenHolding) and instance.asset_id in asset_ids:
+            session.expire(instance, ['unrealized_pnl'])
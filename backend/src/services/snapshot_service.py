@@ -0,0 +1,235 @@
+import sys
+import zlib
+import logging
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional, Tuple, Iterator
+from sqlalchemy import select, exists
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+from src.models.asset import TokenHolding, HoldingChange, HoldingsSnapshot
+from src.models.transaction import DividendDistribution
+
+logger = logging.getLogger(__name__)
+
+# Amounts are Numeric(20, 8): stored as integers in units of 1e-8
+AMOUNT_SCALE = 10 ** 8
+
+class SnapshotColumns:
+    """Decoded holders snapshot: sorted user ids and the matching amounts"""
+    
+    def __init__(self, asset_id: str, record_date: datetime, user_ids: List[str], amounts):
+        self.asset_id = asset_id
+        self.record_date = record_date
+        self.user_ids = user_ids
+        self.amounts = amounts
+    
+    def __len__(self) -> int:
+        return len(self.user_ids)
+    
+    def _amount(self, i: int) -> Decimal:
+        amount = self.amounts[i]
+        return Decimal(amount).scaleb(-8) if isinstance(amount, int) else amount
+    
+    def __iter__(self) -> Iterator[Tuple[str, Decimal]]:
+        for i, user_id in enumerate(self.user_ids):
+            yield user_id, self._amount(i)
+    
+    def amount_of(self, user_id: str) -> Decimal:
+        """Amount held by ``user_id`` at the record date (binary search)"""
+        i = bisect_left(self.user_ids, user_id)
+        if i < len(self.user_ids) and self.user_ids[i] == user_id:
+            return self._amount(i)
+        return Decimal('0')
+    
+    def total_amount(self) -> Decimal:
+        if isinstance(self.amounts, array):
+            return Decimal(sum(self.amounts)).scaleb(-8)
+        return sum(self.amounts, Decimal('0'))
+
+class SnapshotService:
+    """Point-in-time holdings snapshots for dividend record dates
+    
+    Snapshots are reconstructed from the holding_changes log once the record
+    date has passed, stored once per (asset, record date) in columnar form and
+    kept decoded in a small cache.
+    """
+    
+    def __init__(self, cache_size: int = 32):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, datetime], SnapshotColumns]" = OrderedDict()
+    
+    @staticmethod
+    def _encode(user_ids: List[str], amounts: List[Decimal]) -> Tuple[str, bytes, bytes]:
+        packed_ids = zlib.compress('\n'.join(user_ids).encode())
+        try:
+            column = array('q', (int(amount * AMOUNT_SCALE) for amount in amounts))
+            if sys.byteorder == 'big':
+                column.byteswap()
+            return 'i64', packed_ids, column.tobytes()
+        except OverflowError:
+            return 'text', packed_ids, zlib.compress('\n'.join(str(amount) for amount in amounts).encode())
+    
+    @staticmethod
+    def _decode(snapshot: HoldingsSnapshot) -> SnapshotColumns:
+        text = zlib.decompress(snapshot.user_ids).decode()
+        user_ids = text.split('\n') if text else []
+        
+        if snapshot.amount_encoding == 'i64':
+            amounts = array('q')
+            amounts.frombytes(snapshot.amounts)
+            if sys.byteorder == 'big':
+                amounts.byteswap()
+        else:
+            text = zlib.decompress(snapshot.amounts).decode()
+            amounts = [Decimal(amount) for amount in text.split('\n')] if text else []
+        
+        return SnapshotColumns(snapshot.asset_id, snapshot.record_date, user_ids, amounts)
+    
+    def _current_holdings(self, asset_id: str) -> List[Tuple[str, Decimal]]:
+        holdings = TokenHolding.__table__
+        return db.session.execute(
+            select(holdings.c.user_id, holdings.c.amount)
+            .where(holdings.c.asset_id == asset_id, holdings.c.amount > 0)
+            .order_by(holdings.c.user_id)
+        ).all()
+    
+    def _holdings_at(self, asset_id: str, record_date: datetime) -> List[Tuple[str, Decimal]]:
+        """Each holder's amount after their last change at or before ``record_date``"""
+        changes = HoldingChange.__table__
+        last = select(
+            db.func.max(changes.c.id).label('id')
+        ).where(
+            changes.c.asset_id == asset_id, changes.c.changed_at <= record_date
+        ).group_by(changes.c.user_id).subquery()
+        
+        return db.session.execute(
+            select(changes.c.user_id, changes.c.amount_after)
+            .join(last, last.c.id == changes.c.id)
+            .where(changes.c.amount_after > 0)
+            .order_by(changes.c.user_id)
+        ).all()
+    
+    def capture(self, asset_id: str, record_date: datetime) -> HoldingsSnapshot:
+        """Store the holders of an asset at ``record_date`` (once per asset and date)"""
+        snapshot = HoldingsSnapshot.query.filter_by(asset_id=asset_id, record_date=record_date).first()
+        if snapshot:
+            return snapshot
+        
+        if record_date > datetime.utcnow():
+            raise ValueError(f"Record date {record_date.isoformat()} has not passed yet")
+        
+        rows = self._holdings_at(asset_id, record_date)
+        user_ids = [user_id for user_id, _ in rows]
+        amounts = [amount for _, amount in rows]
+        encoding, packed_ids, packed_amounts = self._encode(user_ids, amounts)
+        
+        snapshot = HoldingsSnapshot(
+            asset_id=asset_id,
+            record_date=record_date,
+            holder_count=len(user_ids),
+            total_amount=sum(amounts, Decimal('0')),
+            amount_encoding=encoding,
+            user_ids=packed_ids,
+            amounts=packed_amounts
+        )
+        
+        try:
+            db.session.add(snapshot)
+            db.session.commit()
+        except IntegrityError:
+            # Another worker stored the same snapshot first: use theirs
+            db.session.rollback()
+            existing = HoldingsSnapshot.query.filter_by(asset_id=asset_id, record_date=record_date).first()
+            if existing is None:
+                raise
+            return existing
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error storing holdings snapshot for {asset_id}: {str(e)}")
+            raise
+        
+        logger.info(f"Captured {len(user_ids)} holders of {asset_id} at {record_date.isoformat()}")
+        return snapshot
+    
+    def get_snapshot(self, asset_id: str, record_date: datetime) -> SnapshotColumns:
+        """Decoded holders at ``record_date``, capturing the snapshot on first use
+        
+        Before the record date has passed the live holdings are returned (and
+        not stored), since they may still change.
+        """
+        if record_date > datetime.utcnow():
+            rows = self._current_holdings(asset_id)
+            return SnapshotColumns(
+                asset_id, record_date, [user_id for user_id, _ in rows], [amount for _, amount in rows]
+            )
+        
+        key = (asset_id, record_date)
+        columns = self._cache.get(key)
+        if columns is not None:
+            self._cache.move_to_end(key)
+            return columns
+        
+        columns = self._decode(self.capture(asset_id, record_date))
+        self._cache[key] = columns
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return columns
+    
+    def capture_due(self, now: Optional[datetime] = None) -> int:
+        """Capture snapshots for distributions whose record date has passed"""
+        now = now or datetime.utcnow()
+        distributions = DividendDistribution.__table__
+        snapshots = HoldingsSnapshot.__table__
+        
+        due = db.session.execute(
+            select(distributions.c.asset_id, distributions.c.record_date).distinct().where(
+                distributions.c.record_date <= now,
+                ~exists().where(
+                    snapshots.c.asset_id == distributions.c.asset_id,
+                    snapshots.c.record_date == distributions.c.record_date
+                )
+            )
+        ).all()
+        
+        for asset_id, record_date in due:
+            self.capture(asset_id, record_date)
+        return len(due)
+    
+    def seed_change_log(self) -> int:
+        """Give every holding without history a baseline entry in holding_changes
+        
+        Holdings that predate the change log are assumed to have held their
+        current amount since their first purchase. A one-off step after the
+        change log is deployed: ``flask seed-holding-changes``.
+        """
+        holdings = TokenHolding.__table__
+        changes = HoldingChange.__table__
+        
+        baseline = select(
+            holdings.c.asset_id,
+            holdings.c.user_id,
+            holdings.c.amount,
+            holdings.c.amount,
+            db.func.coalesce(holdings.c.first_purchase_date, holdings.c.updated_at, datetime.utcnow())
+        ).where(
+            holdings.c.amount > 0,
+            ~exists().where(changes.c.asset_id == holdings.c.asset_id, changes.c.user_id == holdings.c.user_id)
+        )
+        
+        try:
+            result = db.session.execute(changes.insert().from_select(
+                ['asset_id', 'user_id', 'delta', 'amount_after', 'changed_at'], baseline
+            ))
+            db.session.commit()
+            return result.rowcount
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error seeding holding change log: {str(e)}")
+            return 0
+
+# Global service instance
+snapshot_service = SnapshotService()
@@ -8,7 +8,7 @@ from xrpl.constants import CryptoAlgorithm
 import asyncio
 import logging
 from decimal import Decimal
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Iterator
 from src.config import Config
 
 logger = logging.getLogger(__name__)
@@ -68,35 +68,56 @@ class XRPLService:
             logger.error(f"Error getting account info for {address}: {str(e)}")
             raise Exception(f"Failed to get account info: {str(e)}")
     
+    def iter_account_transactions(self, address: str, page_size: int = 200,
+                                  max_items: int = None) -> Iterator[Dict[str, Any]]:
+        """Stream account transactions page by page, following the marker.
+        
+        Only one page is held in memory at a time; stop early with ``max_items``
+        or by breaking out of the loop.
+        """
+        marker = None
+        yielded = 0
+        
+        while True:
+            limit = page_size if max_items is None else min(page_size, max_items - yielded)
+            response = self.client.request(AccountTx(account=address, limit=limit, marker=marker))
+            
+            if not response.is_successful():
+                raise Exception(f"Failed to get transactions: {response.result}")
+            
+            for tx in response.result.get('transactions', []):
+                yield tx
+                yielded += 1
+                if max_items is not None and yielded >= max_items:
+                    return
+            
+            marker = response.result.get('marker')
+            if marker is None:
+                return
+    
     def get_account_transactions(self, address: str, limit: int = 20) -> List[Dict[str, Any]]:
         """Get account transaction history"""
         try:
-            request = AccountTx(account=address, limit=limit)
-            response = self.client.request(request)
-            
-            if response.is_successful():
-                transactions = []
-                for tx in response.result.get('transactions', []):
-                    tx_data = tx['tx']
-                    meta = tx.get('meta', {})
-                    
-                    transactions.append({
-                        'hash': tx_data['hash'],
-                        'transaction_type': tx_data['TransactionType'],
-                        'account': tx_data['Account'],
-                        'destination': tx_data.get('Destination'),
-                        'amount': self._parse_amount(tx_data.get('Amount')),
-                        'fee': drops_to_xrp(tx_data['Fee']),
-                        'sequence': tx_data['Sequence'],
-                        'date': tx_data.get('date'),
-                        'ledger_index': tx.get('ledger_index'),
-                        'validated': tx.get('validated', False),
-                        'result_code': meta.get('TransactionResult')
-                    })
+            transactions = []
+            for tx in self.iter_account_transactions(address, max_items=limit):
+                tx_data = tx['tx']
+                meta = tx.get('meta', {})
                 
-                return transactions
-            else:
-                raise Exception(f"Failed to get transactions: {response.result}")
+                transactions.append({
+                    'hash': tx_data['hash'],
+                    'transaction_type': tx_data['TransactionType'],
+                    'account': tx_data['Account'],
+                    'destination': tx_data.get('Destination'),
+                    'amount': self._parse_amount(tx_data.get('Amount')),
+                    'fee': drops_to_xrp(tx_data['Fee']),
+                    'sequence': tx_data['Sequence'],
+                    'date': tx_data.get('date'),
+                    'ledger_index': tx.get('ledger_index'),
+                    'validated': tx.get('validated', False),
+                    'result_code': meta.get('TransactionResult')
+                })
+            
+            return transactions
                 
         except Exception as e:
             logger.error(f"Error getting transactions for {address}: {str(e)}")
@@ -148,27 +169,51 @@ class XRPLService:
             logger.error(f"Error sending XRP: {str(e)}")
             raise Exception(f"Failed to send XRP: {str(e)}")
     
+    def iter_account_lines(self, address: str, page_size: int = 400,
+                           max_items: int = None) -> Iterator[Dict[str, Any]]:
+        """Stream an account's trustlines page by page, following the marker.
+        
+        All pages are read from the same validated ledger; stop early with
+        ``max_items`` or by breaking out of the loop.
+        """
+        marker = None
+        ledger_index = 'validated'
+        yielded = 0
+        
+        while True:
+            request = AccountLines(account=address, ledger_index=ledger_index,
+                                   limit=page_size, marker=marker)
+            response = self.client.request(request)
+            
+            if not response.is_successful():
+                raise Exception(f"Failed to get token balances: {response.result}")
+            
+            for line in response.result.get('lines', []):
+                yield line
+                yielded += 1
+                if max_items is not None and yielded >= max_items:
+                    return
+            
+            marker = response.result.get('marker')
+            if marker is None:
+                return
+            ledger_index = response.result.get('ledger_index', ledger_index)
+    
     def get_token_balances(self, address: str) -> List[Dict[str, Any]]:
         """Get token balances for an account"""
         try:
-            request = AccountLines(account=address)
-            response = self.client.request(request)
+            balances = []
+            for line in self.iter_account_lines(address):
+                balances.append({
+                    'currency': line['currency'],
+                    'issuer': line['account'],
+                    'balance': Decimal(line['balance']),
+                    'limit': Decimal(line['limit']) if line['limit'] != '0' else None,
+                    'quality_in': line.get('quality_in'),
+                    'quality_out': line.get('quality_out')
+                })
             
-            if response.is_successful():
-                balances = []
-                for line in response.result.get('lines', []):
-                    balances.append({
-                        'currency': line['currency'],
-                        'issuer': line['account'],
-                        'balance': Decimal(line['balance']),
-                        'limit': Decimal(line['limit']) if line['limit'] != '0' else None,
-                        'quality_in': line.get('quality_in'),
-                        'quality_out': line.get('quality_out')
-                    })
-                
-                return balances
-            else:
-                raise Exception(f"Failed to get token balances: {response.result}")
+            return balances
                 
         except Exception as e:
             logger.error(f"Error getting token balances for {address}: {str(e)}")
@@ -0,0 +1,39 @@
+-- SolCraft Nexus - OHLCV candles
+-- Bars rolled up from public.trades for the 1m/5m/1h/1d intervals. Coarser or
+-- intermediate intervals (15m, 4h) are downsampled from these by the API.
+
+CREATE TABLE IF NOT EXISTS public.candles (
+    asset_id TEXT NOT NULL,
+    interval TEXT NOT NULL CHECK (interval IN ('1m', '5m', '1h', '1d')),
+    bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    open DECIMAL(20,8) NOT NULL,
+    high DECIMAL(20,8) NOT NULL,
+    low DECIMAL(20,8) NOT NULL,
+    close DECIMAL(20,8) NOT NULL,
+    volume DECIMAL(24,8) NOT NULL DEFAULT 0,
+    trade_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (asset_id, interval, bucket_start)
+);
+
+-- Merge partial bars written by the API: the first write of a bucket sets its
+-- open, later writes extend high/low, move close and add volume
+CREATE OR REPLACE FUNCTION public.merge_candles(bars JSONB)
+RETURNS void
+LANGUAGE sql
+SECURITY DEFINER
+AS $$
+    INSERT INTO public.candles AS c
+        (asset_id, interval, bucket_start, open, high, low, close, volume, trade_count)
+    SELECT asset_id, interval, bucket_start, open, high, low, close, volume, trade_count
+    FROM jsonb_to_recordset(bars) AS b(
+        asset_id TEXT, interval TEXT, bucket_start TIMESTAMP WITH TIME ZONE,
+        open DECIMAL, high DECIMAL, low DECIMAL, close DECIMAL,
+        volume DECIMAL, trade_count INTEGER
+    )
+    ON CONFLICT (asset_id, interval, bucket_start) DO UPDATE SET
+        high = GREATEST(c.high, EXCLUDED.high),
+        low = LEAST(c.low, EXCLUDED.low),
+        close = EXCLUDED.close,
+        volume = c.volume + EXCLUDED.volume,
+        trade_count = c.trade_count + EXCLUDED.trade_count;
+$$;
@@ -0,0 +1,13 @@
+-- SolCraft Nexus - Market reference prices
+-- One row per asset, upserted periodically by the API's price oracle and read
+-- back at startup so prices survive restarts.
+
+CREATE TABLE IF NOT EXISTS public.market_prices (
+    asset_id TEXT PRIMARY KEY,
+    last_price NUMERIC,
+    best_bid NUMERIC,
+    best_ask NUMERIC,
+    mid_price NUMERIC,
+    vwap NUMERIC,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
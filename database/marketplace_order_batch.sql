@@ -0,0 +1,27 @@
+-- SolCraft Nexus - Atomic order/trade writes
+-- The API writes every order row and trade produced by one matching batch in a
+-- single call, so a batch is stored entirely or not at all.
+
+ALTER TABLE public.orders ADD COLUMN IF NOT EXISTS cancelled_at TIMESTAMP WITH TIME ZONE;
+
+-- Order rows are full engine snapshots: new orders are inserted, known ones
+-- take the engine's fill state. Both statements run in the caller's transaction.
+CREATE OR REPLACE FUNCTION public.apply_order_batch(orders JSONB, trades JSONB)
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    INSERT INTO public.orders AS o
+    SELECT * FROM jsonb_populate_recordset(NULL::public.orders, orders)
+    ON CONFLICT (id) DO UPDATE SET
+        price = EXCLUDED.price,
+        filled_quantity = EXCLUDED.filled_quantity,
+        remaining_quantity = EXCLUDED.remaining_quantity,
+        status = EXCLUDED.status,
+        cancelled_at = COALESCE(EXCLUDED.cancelled_at, o.cancelled_at);
+
+    INSERT INTO public.trades
+    SELECT * FROM jsonb_populate_recordset(NULL::public.trades, trades);
+END;
+$$;
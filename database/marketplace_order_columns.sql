@@ -0,0 +1,10 @@
+-- SolCraft Nexus - Order columns used by the matching engine
+
+ALTER TABLE public.orders ADD COLUMN IF NOT EXISTS stop_price DECIMAL(20,8);
+ALTER TABLE public.orders ADD COLUMN IF NOT EXISTS time_in_force TEXT NOT NULL DEFAULT 'GTC'
+    CHECK (time_in_force IN ('GTC', 'IOC', 'FOK'));
+
+-- Open orders are reloaded into the order books at startup, oldest first
+CREATE INDEX IF NOT EXISTS orders_open_created_at_idx
+    ON public.orders (created_at, id)
+    WHERE status IN ('pending', 'partial');
@@ -0,0 +1,22 @@
+-- SolCraft Nexus - Marketplace keyset pagination indexes
+-- Cursor pages filter on (sort column, id) and order by the same pair, so each
+-- page is an index range scan no matter how deep it is.
+
+CREATE INDEX IF NOT EXISTS marketplace_assets_created_at_id_idx
+    ON public.marketplace_assets (created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS orders_user_created_at_id_idx
+    ON public.orders (user_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS trades_created_at_id_idx
+    ON public.trades (created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS trades_asset_created_at_id_idx
+    ON public.trades (asset_id, created_at DESC, id DESC);
+
+-- Per-user history is buyer_id = $1 OR seller_id = $1
+CREATE INDEX IF NOT EXISTS trades_buyer_created_at_id_idx
+    ON public.trades (buyer_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS trades_seller_created_at_id_idx
+    ON public.trades (seller_id, created_at DESC, id DESC);
@@ -0,0 +1,220 @@
+-- SolCraft Nexus - Marketplace search index
+-- Denormalised search rows over marketplace_assets joined with tokenizations,
+-- kept current by triggers, with a weighted tsvector under a GIN index. The
+-- search_marketplace_assets RPC returns one page of matches plus facet counts
+-- in a single round trip.
+
+CREATE TABLE IF NOT EXISTS public.marketplace_search (
+    asset_id TEXT PRIMARY KEY,
+    tokenization_id TEXT,
+    name TEXT,
+    description TEXT,
+    location TEXT,
+    category TEXT,
+    asset_type TEXT,
+    token_symbol TEXT,
+    token_price NUMERIC,
+    apy NUMERIC,
+    volume_24h NUMERIC,
+    market_cap NUMERIC,
+    created_at TIMESTAMPTZ,
+    search_vector TSVECTOR NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS marketplace_search_vector_idx
+    ON public.marketplace_search USING GIN (search_vector);
+CREATE INDEX IF NOT EXISTS marketplace_search_category_idx
+    ON public.marketplace_search (category);
+CREATE INDEX IF NOT EXISTS marketplace_search_asset_type_idx
+    ON public.marketplace_search (asset_type);
+CREATE INDEX IF NOT EXISTS marketplace_search_apy_idx
+    ON public.marketplace_search (apy);
+CREATE INDEX IF NOT EXISTS marketplace_search_volume_idx
+    ON public.marketplace_search (volume_24h DESC, asset_id DESC);
+CREATE INDEX IF NOT EXISTS marketplace_search_market_cap_idx
+    ON public.marketplace_search (market_cap DESC, asset_id DESC);
+CREATE INDEX IF NOT EXISTS marketplace_search_created_at_idx
+    ON public.marketplace_search (created_at DESC, asset_id DESC);
+
+-- Rebuild the search row of one listing (deletes it when the listing is gone)
+CREATE OR REPLACE FUNCTION public.refresh_marketplace_search(p_asset_id TEXT)
+RETURNS void
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    DELETE FROM public.marketplace_search WHERE asset_id = p_asset_id;
+
+    INSERT INTO public.marketplace_search (
+        asset_id, tokenization_id, name, description, location, category, asset_type,
+        token_symbol, token_price, apy, volume_24h, market_cap, created_at, search_vector
+    )
+    SELECT
+        m.id::TEXT,
+        t.id::TEXT,
+        COALESCE(m.name, t.asset_name),
+        COALESCE(m.description, t.asset_description),
+        COALESCE(m.location, t.metadata->>'location'),
+        m.category,
+        COALESCE(t.asset_type, m.category),
+        COALESCE(m.token_symbol, t.token_symbol),
+        m.token_price,
+        m.apy,
+        COALESCE(m.volume_24h, 0),
+        COALESCE(m.market_cap, 0),
+        m.created_at,
+        setweight(to_tsvector('simple', COALESCE(m.name, t.asset_name, '')), 'A') ||
+        setweight(to_tsvector('simple', COALESCE(m.location, t.metadata->>'location', '')), 'B') ||
+        setweight(to_tsvector('english', COALESCE(m.description, t.asset_description, '')), 'C')
+    FROM public.marketplace_assets m
+    LEFT JOIN public.tokenizations t ON t.id = m.tokenization_id
+    WHERE m.id::TEXT = p_asset_id;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.marketplace_search_listing_changed()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM public.refresh_marketplace_search(OLD.id::TEXT);
+    ELSE
+        PERFORM public.refresh_marketplace_search(NEW.id::TEXT);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.marketplace_search_tokenization_changed()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM public.refresh_marketplace_search(m.id::TEXT)
+    FROM public.marketplace_assets m
+    WHERE m.tokenization_id = NEW.id;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS marketplace_search_listing_sync ON public.marketplace_assets;
+CREATE TRIGGER marketplace_search_listing_sync
+    AFTER INSERT OR UPDATE OR DELETE ON public.marketplace_assets
+    FOR EACH ROW EXECUTE FUNCTION public.marketplace_search_listing_changed();
+
+DROP TRIGGER IF EXISTS marketplace_search_tokenization_sync ON public.tokenizations;
+CREATE TRIGGER marketplace_search_tokenization_sync
+    AFTER UPDATE OF asset_name, asset_description, asset_type, token_symbol, metadata ON public.tokenizations
+    FOR EACH ROW EXECUTE FUNCTION public.marketplace_search_tokenization_changed();
+
+-- APY range bucket; keep in step with APY_RANGES in services/marketplace_search.py
+CREATE OR REPLACE FUNCTION public.marketplace_apy_range(p_apy NUMERIC)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+AS $$
+    SELECT CASE
+        WHEN p_apy IS NULL THEN NULL
+        WHEN p_apy < 5 THEN '0-5'
+        WHEN p_apy < 10 THEN '5-10'
+        WHEN p_apy < 15 THEN '10-15'
+        ELSE '15+'
+    END;
+$$;
+
+-- One page of matches plus facet counts. Each facet is counted under every
+-- filter except its own, so selecting a category still shows the others.
+CREATE OR REPLACE FUNCTION public.search_marketplace_assets(
+    p_query TEXT DEFAULT NULL,
+    p_categories TEXT[] DEFAULT NULL,
+    p_asset_types TEXT[] DEFAULT NULL,
+    p_apy_ranges TEXT[] DEFAULT NULL,
+    p_min_price NUMERIC DEFAULT NULL,
+    p_max_price NUMERIC DEFAULT NULL,
+    p_sort_by TEXT DEFAULT 'relevance',
+    p_sort_desc BOOLEAN DEFAULT TRUE,
+    p_limit INTEGER DEFAULT 50,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS JSONB
+LANGUAGE sql
+STABLE
+AS $$
+    WITH q AS (
+        SELECT CASE WHEN COALESCE(p_query, '') = '' THEN NULL
+                    ELSE websearch_to_tsquery('english', p_query) || websearch_to_tsquery('simple', p_query)
+               END AS ts
+    ),
+    base AS (
+        SELECT s.*,
+               public.marketplace_apy_range(s.apy) AS apy_range,
+               CASE WHEN q.ts IS NULL THEN 0 ELSE ts_rank(s.search_vector, q.ts) END AS rank,
+               (p_categories IS NULL OR s.category = ANY (p_categories)) AS category_ok,
+               (p_asset_types IS NULL OR s.asset_type = ANY (p_asset_types)) AS asset_type_ok,
+               (p_apy_ranges IS NULL OR public.marketplace_apy_range(s.apy) = ANY (p_apy_ranges)) AS apy_ok
+        FROM public.marketplace_search s, q
+        WHERE (q.ts IS NULL OR s.search_vector @@ q.ts)
+          AND (p_min_price IS NULL OR s.token_price >= p_min_price)
+          AND (p_max_price IS NULL OR s.token_price <= p_max_price)
+    ),
+    matched AS (
+        SELECT * FROM base WHERE category_ok AND asset_type_ok AND apy_ok
+    ),
+    page AS (
+        SELECT * FROM matched
+        ORDER BY
+            CASE WHEN p_sort_desc THEN
+                CASE p_sort_by
+                    WHEN 'volume' THEN volume_24h
+                    WHEN 'market_cap' THEN market_cap
+                    WHEN 'apy' THEN apy
+                    WHEN 'price' THEN token_price
+                    WHEN 'created_at' THEN EXTRACT(EPOCH FROM created_at)::NUMERIC
+                    ELSE rank::NUMERIC
+                END
+            END DESC NULLS LAST,
+            CASE WHEN NOT p_sort_desc THEN
+                CASE p_sort_by
+                    WHEN 'volume' THEN volume_24h
+                    WHEN 'market_cap' THEN market_cap
+                    WHEN 'apy' THEN apy
+                    WHEN 'price' THEN token_price
+                    WHEN 'created_at' THEN EXTRACT(EPOCH FROM created_at)::NUMERIC
+                    ELSE rank::NUMERIC
+                END
+            END ASC NULLS LAST,
+            asset_id
+        LIMIT p_limit OFFSET p_offset
+    )
+    SELECT jsonb_build_object(
+        'assets', COALESCE((
+            SELECT jsonb_agg(to_jsonb(page) - 'search_vector' - 'category_ok' - 'asset_type_ok' - 'apy_ok')
+            FROM page
+        ), '[]'::jsonb),
+        'total', (SELECT COUNT(*) FROM matched),
+        'facets', jsonb_build_object(
+            'category', COALESCE((
+                SELECT jsonb_object_agg(category, n) FROM (
+                    SELECT category, COUNT(*) AS n FROM base
+                    WHERE asset_type_ok AND apy_ok AND category IS NOT NULL GROUP BY category
+                ) c
+            ), '{}'::jsonb),
+            'asset_type', COALESCE((
+                SELECT jsonb_object_agg(asset_type, n) FROM (
+                    SELECT asset_type, COUNT(*) AS n FROM base
+                    WHERE category_ok AND apy_ok AND asset_type IS NOT NULL GROUP BY asset_type
+                ) t
+            ), '{}'::jsonb),
+            'apy_range', COALESCE((
+                SELECT jsonb_object_agg(apy_range, n) FROM (
+                    SELECT apy_range, COUNT(*) AS n FROM base
+                    WHERE category_ok AND asset_type_ok AND apy_range IS NOT NULL GROUP BY apy_range
+                ) a
+            ), '{}'::jsonb)
+        )
+    );
+$$;
+
+-- Backfill existing listings
+SELECT public.refresh_marketplace_search(id::TEXT) FROM public.marketplace_assets;
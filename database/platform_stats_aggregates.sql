@@ -0,0 +1,47 @@
+-- SolCraft Nexus - Platform statistics aggregates
+-- Precomputes the /api/analytics/platform counters into platform_stats so the API
+-- reads one row per metric instead of running exact counts on every request.
+
+-- One row per metric per day (matches the upsert in update_platform_metric)
+CREATE UNIQUE INDEX IF NOT EXISTS platform_stats_metric_date_idx
+    ON public.platform_stats (metric_name, date_recorded);
+
+-- Recompute all counters with a single pass over each table: every table's
+-- counts come from one SELECT and are unnested into one row per metric
+CREATE OR REPLACE FUNCTION public.refresh_platform_stats()
+RETURNS void
+LANGUAGE sql
+SECURITY DEFINER
+AS $$
+    INSERT INTO public.platform_stats (metric_name, metric_value, date_recorded)
+    SELECT metric.name, metric.value, CURRENT_DATE
+    FROM (
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE last_active >= NOW() - INTERVAL '30 days') AS active
+        FROM public.wallets
+    ) AS wallets,
+    (
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE status = 'active') AS active
+        FROM public.tokenizations
+    ) AS tokenizations,
+    (
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE status = 'validated') AS successful
+        FROM public.token_transactions
+    ) AS transactions,
+    LATERAL unnest(
+        ARRAY['total_users', 'active_users',
+              'total_tokenizations', 'active_tokenizations',
+              'total_transactions', 'successful_transactions'],
+        ARRAY[wallets.total, wallets.active,
+              tokenizations.total, tokenizations.active,
+              transactions.total, transactions.successful]::DECIMAL[]
+    ) AS metric(name, value)
+    ON CONFLICT (metric_name, date_recorded)
+    DO UPDATE SET metric_value = EXCLUDED.metric_value;
+$$;
+
+-- Optional: refresh inside the database every 5 minutes (requires pg_cron).
+-- When enabled, set PLATFORM_STATS_REFRESH_INTERVAL=0 on the API.
+-- SELECT cron.schedule('refresh-platform-stats', '*/5 * * * *', 'SELECT public.refresh_platform_stats()');
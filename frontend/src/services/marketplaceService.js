@@ -38,6 +38,7 @@ class MarketplaceService {
       if (filters.sort_order) params.append('sort_order', filters.sort_order);
       if (filters.limit) params.append('limit', filters.limit);
       if (filters.offset) params.append('offset', filters.offset);
+      if (filters.cursor) params.append('cursor', filters.cursor);
 
       const response = await fetch(`${this.baseURL}/marketplace/assets?${params}`);
       
@@ -53,6 +54,39 @@ class MarketplaceService {
     }
   }
 
+  /**
+   * Search marketplace assets; facet filters accept arrays or comma-separated strings
+   */
+  async searchMarketplaceAssets(filters = {}) {
+    try {
+      const params = new URLSearchParams();
+      const list = (value) => (Array.isArray(value) ? value.join(',') : value);
+
+      if (filters.q) params.append('q', filters.q);
+      if (filters.category) params.append('category', list(filters.category));
+      if (filters.asset_type) params.append('asset_type', list(filters.asset_type));
+      if (filters.apy_range) params.append('apy_range', list(filters.apy_range));
+      if (filters.min_price) params.append('min_price', filters.min_price);
+      if (filters.max_price) params.append('max_price', filters.max_price);
+      if (filters.sort_by) params.append('sort_by', filters.sort_by);
+      if (filters.sort_order) params.append('sort_order', filters.sort_order);
+      if (filters.limit) params.append('limit', filters.limit);
+      if (filters.offset) params.append('offset', filters.offset);
+
+      const response = await fetch(`${this.baseURL}/marketplace/search?${params}`);
+
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}: Failed to search marketplace assets`);
+      }
+
+      const data = await response.json();
+      return data.data;
+    } catch (error) {
+      console.error('Error searching marketplace assets:', error);
+      throw error;
+    }
+  }
+
   /**
    * Get detailed information about a specific asset
    */
@@ -122,11 +156,12 @@ class MarketplaceService {
   /**
    * Get user's trading orders
    */
-  async getUserOrders(userId, status = null, limit = 50) {
+  async getUserOrders(userId, status = null, limit = 50, cursor = null) {
     try {
       const params = new URLSearchParams();
       if (status) params.append('status', status);
       if (limit) params.append('limit', limit);
+      if (cursor) params.append('cursor', cursor);
 
       const response = await fetch(`${this.baseURL}/marketplace/orders/${userId}?${params}`);
       
@@ -166,12 +201,13 @@ class MarketplaceService {
   /**
    * Get trading history
    */
-  async getTradingHistory(userId = null, assetId = null, limit = 100) {
+  async getTradingHistory(userId = null, assetId = null, limit = 100, cursor = null) {
     try {
       const params = new URLSearchParams();
       if (userId) params.append('user_id', userId);
       if (assetId) params.append('asset_id', assetId);
       if (limit) params.append('limit', limit);
+      if (cursor) params.append('cursor', cursor);
 
       const response = await fetch(`${this.baseURL}/marketplace/trading-history?${params}`);
       
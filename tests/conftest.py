@@ -0,0 +1,74 @@
+import itertools
+import os
+import sys
+
+import pytest
+
+# Backend modules are imported as in the apps: services.* (FastAPI) and src.* (Flask)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+_counter = itertools.count()
+
+
+@pytest.fixture
+def flask_db():
+    """Flask-SQLAlchemy bound to a fresh in-memory SQLite app, inside its app context"""
+    pytest.importorskip("flask_sqlalchemy")
+    from flask import Flask
+    from src.models.user import db
+    import src.models.transaction  # noqa: F401 - registers every model
+    import src.services.revaluation_service  # noqa: F401 - registers the flush listener
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield db
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def make_user(flask_db):
+    from src.models.user import User
+
+    def make(**fields):
+        n = next(_counter)
+        user = User(email=f"user{n}@example.com", password_hash="x", first_name="Test", last_name=f"User{n}", **fields)
+        flask_db.session.add(user)
+        flask_db.session.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def make_asset(flask_db, make_user):
+    from src.models.asset import Asset
+
+    def make(issuer=None, initial_price=10, **fields):
+        n = next(_counter)
+        asset = Asset(
+            name=f"Asset {n}", symbol=f"AS{n}", asset_type="real_estate",
+            total_supply=1000, current_supply=1000, initial_price=initial_price,
+            estimated_value=10000, issuer_id=(issuer or make_user()).id, **fields
+        )
+        flask_db.session.add(asset)
+        flask_db.session.commit()
+        return asset
+    return make
+
+
+@pytest.fixture
+def fake_supabase(monkeypatch):
+    """Point the shared Supabase service at an in-memory PostgREST double"""
+    pytest.importorskip("supabase")
+    try:
+        from services.supabase_service import supabase_service
+    except ValueError:
+        pytest.skip("Supabase is not configured")
+    from tests.fake_supabase import FakeSupabase
+
+    client = FakeSupabase()
+    monkeypatch.setattr(supabase_service, "supabase", client)
+    return client
@@ -0,0 +1,161 @@
+"""In-memory stand-in for the Supabase client's PostgREST query builders
+
+Rows live in plain lists per table; filters, ordering, ranges, upserts and
+exact counts behave like PostgREST for the subset the services use. RPCs are
+plain callables registered in ``functions``.
+"""
+
+import threading
+
+
+class Response:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.operation = "select"
+        self.payload = None
+        self.on_conflict = None
+        self.count = None
+        self.filters = []
+        self.orders = []
+        self.offset = 0
+        self.limit_to = None
+
+    # Operations
+    def select(self, columns="*", count=None):
+        self.count = count
+        return self
+
+    def insert(self, rows):
+        self.operation, self.payload = "insert", rows
+        return self
+
+    def upsert(self, rows, on_conflict=None):
+        self.operation, self.payload, self.on_conflict = "upsert", rows, on_conflict
+        return self
+
+    def update(self, values):
+        self.operation, self.payload = "update", values
+        return self
+
+    def delete(self):
+        self.operation = "delete"
+        return self
+
+    # Filters
+    def _where(self, column, test):
+        self.filters.append((column, test))
+        return self
+
+    def eq(self, column, value):
+        return self._where(column, lambda v: v == value)
+
+    def neq(self, column, value):
+        return self._where(column, lambda v: v != value)
+
+    def lt(self, column, value):
+        return self._where(column, lambda v: v is not None and v < value)
+
+    def lte(self, column, value):
+        return self._where(column, lambda v: v is not None and v <= value)
+
+    def gt(self, column, value):
+        return self._where(column, lambda v: v is not None and v > value)
+
+    def gte(self, column, value):
+        return self._where(column, lambda v: v is not None and v >= value)
+
+    def in_(self, column, values):
+        values = list(values)
+        return self._where(column, lambda v: v in values)
+
+    def is_(self, column, value):
+        return self._where(column, lambda v: v is None if value == "null" else v == value)
+
+    # Shaping
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def range(self, start, end):
+        self.offset, self.limit_to = start, end - start + 1
+        return self
+
+    def limit(self, count):
+        self.limit_to = count
+        return self
+
+    def _matches(self, row):
+        return all(test(row.get(column)) for column, test in self.filters)
+
+    def execute(self):
+        with self.client.lock:
+            self.client.executed.append(self)
+            if self.table in self.client.failing:
+                raise Exception(f"{self.table} is unavailable")
+            rows = self.client.tables.setdefault(self.table, [])
+
+            if self.operation == "select":
+                matched = [row for row in rows if self._matches(row)]
+                for column, desc in reversed(self.orders):
+                    matched.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=desc)
+                end = None if self.limit_to is None else self.offset + self.limit_to
+                return Response([dict(row) for row in matched[self.offset:end]], count=len(matched))
+
+            if self.operation in ("insert", "upsert"):
+                payload = self.payload if isinstance(self.payload, list) else [self.payload]
+                keys = self.on_conflict.split(",") if self.on_conflict else ["id"]
+                for new in payload:
+                    existing = None
+                    if self.operation == "upsert":
+                        existing = next(
+                            (row for row in rows if all(row.get(k) == new.get(k) for k in keys)), None
+                        )
+                    if existing is not None:
+                        existing.update(new)
+                    else:
+                        rows.append(dict(new))
+                return Response([dict(row) for row in payload])
+
+            matched = [row for row in rows if self._matches(row)]
+            if self.operation == "update":
+                for row in matched:
+                    row.update(self.payload)
+            else:
+                rows[:] = [row for row in rows if not self._matches(row)]
+            return Response([dict(row) for row in matched])
+
+
+class FakeRpc:
+    def __init__(self, client, name, params):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        self.client.executed.append(self)
+        function = self.client.functions.get(self.name)
+        if function is None:
+            raise Exception(f"function {self.name} does not exist")
+        return Response(function(**self.params))
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.tables = {}
+        self.functions = {}
+        self.failing = set()
+        self.executed = []
+        self.lock = threading.RLock()
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params):
+        return FakeRpc(self, name, params)
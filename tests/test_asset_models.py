@@ -0,0 +1,43 @@
+from decimal import Decimal
+
+
+def _hold(db, user, asset, amount, invested=0):
+    from src.models.asset import TokenHolding
+
+    holding = TokenHolding(user_id=user.id, asset_id=asset.id, amount=amount, total_invested=invested)
+    db.session.add(holding)
+    db.session.commit()
+    return holding
+
+
+def test_holder_stats_are_grouped_per_asset(flask_db, make_user, make_asset):
+    from src.models.asset import Asset
+
+    alice, bob = make_user(), make_user()
+    held, empty = make_asset(), make_asset()
+    _hold(flask_db, alice, held, 10)
+    _hold(flask_db, bob, held, 5)
+    _hold(flask_db, bob, empty, 0)
+
+    stats = Asset.get_holder_stats([held.id, empty.id, "missing"])
+
+    assert stats[held.id] == (2, Decimal("15"))
+    # A zero holding counts towards supply but not holders
+    assert stats[empty.id][0] == 0
+    assert stats["missing"] == (0, Decimal("0"))
+    assert Asset.get_holder_stats([]) == {}
+
+
+def test_to_dict_many_matches_to_dict(flask_db, make_user, make_asset):
+    from src.models.asset import Asset
+
+    user = make_user()
+    assets = [make_asset(), make_asset(), make_asset()]
+    _hold(flask_db, user, assets[0], 7)
+    _hold(flask_db, user, assets[2], 3)
+
+    many = Asset.to_dict_many(assets, include_sensitive=True)
+
+    assert many == [asset.to_dict(include_sensitive=True) for asset in assets]
+    assert [d["total_holders"] for d in many] == [1, 0, 1]
+    assert many[0]["circulating_supply"] == str(assets[0].get_circulating_supply())
@@ -0,0 +1,107 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("supabase")
+
+try:
+    from services.candle_service import BASE_INTERVALS, CandleService, aggregate_bars, merge_bar, to_epoch
+except ValueError:
+    # The Supabase client is created at import time and needs SUPABASE_URL and a key
+    pytest.skip("Supabase is not configured", allow_module_level=True)
+
+
+def test_to_epoch_reads_naive_timestamps_as_utc():
+    aware = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+    assert to_epoch("2024-01-01T12:00:00") == int(aware.timestamp())
+    assert to_epoch("2024-01-01T12:00:00Z") == int(aware.timestamp())
+    assert to_epoch(aware) == int(aware.timestamp())
+
+
+def test_aggregate_bars_rolls_trades_into_buckets():
+    ts = np.array([0, 10, 59, 60, 130], dtype=np.int64)
+    prices = np.array([5.0, 7.0, 6.0, 8.0, 4.0])
+    volume = np.array([1.0, 2.0, 3.0, 4.0, 5.0])
+    counts = np.ones(len(ts))
+
+    bars = aggregate_bars(ts, prices, prices, prices, prices, volume, counts, 60)
+
+    assert bars["bucket"].tolist() == [0, 60, 120]
+    assert bars["open"].tolist() == [5.0, 8.0, 4.0]
+    assert bars["high"].tolist() == [7.0, 8.0, 4.0]
+    assert bars["low"].tolist() == [5.0, 8.0, 4.0]
+    assert bars["close"].tolist() == [6.0, 8.0, 4.0]
+    assert bars["volume"].tolist() == [6.0, 4.0, 5.0]
+    assert bars["trade_count"].tolist() == [3, 1, 1]
+
+
+def test_aggregate_bars_downsamples_finer_bars():
+    ts = np.array([0, 60, 120], dtype=np.int64)
+    bars = aggregate_bars(
+        ts, np.array([1.0, 2.0, 3.0]), np.array([2.0, 5.0, 3.5]), np.array([0.5, 1.5, 2.5]),
+        np.array([2.0, 3.0, 3.0]), np.array([1.0, 1.0, 1.0]), np.array([2.0, 3.0, 4.0]), 300
+    )
+
+    assert bars["bucket"].tolist() == [0]
+    assert (bars["open"][0], bars["high"][0], bars["low"][0], bars["close"][0]) == (1.0, 5.0, 0.5, 3.0)
+    assert bars["trade_count"][0] == 9
+
+
+def test_merge_bar_keeps_open_and_adds_volume():
+    bar = {"open": 5.0, "high": 6.0, "low": 4.0, "close": 5.5, "volume": 2.0, "trade_count": 2}
+
+    merge_bar(bar, {"open": 7.0, "high": 7.0, "low": 3.0, "close": 3.5, "volume": 1.0, "trade_count": 1})
+
+    assert bar == {"open": 5.0, "high": 7.0, "low": 3.0, "close": 3.5, "volume": 3.0, "trade_count": 3}
+
+
+def test_add_trade_updates_pending_bar_of_every_interval():
+    service = CandleService()
+    service.add_trade({"asset_id": "a", "created_at": "2024-01-01T00:00:30+00:00", "price": 10, "quantity": 2})
+    service.add_trade({"asset_id": "a", "created_at": "2024-01-01T00:00:45+00:00", "price": 12, "quantity": 1})
+
+    start = to_epoch("2024-01-01T00:00:00Z")
+    bar = service.pending[("a", "1m", start)]
+    assert bar == {"open": 10.0, "high": 12.0, "low": 10.0, "close": 12.0, "volume": 3.0, "trade_count": 2}
+    assert {interval for _, interval, _ in service.pending} == set(BASE_INTERVALS)
+
+
+def test_backfill_rebuilds_whole_bars_when_start_is_mid_bucket(fake_supabase):
+    trades = [
+        ("2024-01-01T14:05:00+00:00", 10.0, 1.0),
+        ("2024-01-01T14:30:00+00:00", 14.0, 2.0),
+        ("2024-01-01T14:50:00+00:00", 9.0, 3.0),
+        ("2024-01-01T15:10:00+00:00", 11.0, 4.0),
+    ]
+    fake_supabase.tables["trades"] = [
+        {"id": str(i), "asset_id": "a", "created_at": created_at, "price": price, "quantity": quantity}
+        for i, (created_at, price, quantity) in enumerate(trades)
+    ]
+
+    result = asyncio.run(CandleService().backfill(
+        "a", start="2024-01-01T14:37:00+00:00", end="2024-01-01T16:00:00+00:00"
+    ))
+
+    assert result["success"] and result["trades"] == 4
+    bars = {(row["interval"], row["bucket_start"]): row for row in fake_supabase.tables["candles"]}
+    hour = bars[("1h", "2024-01-01T14:00:00+00:00")]
+    # Built from every trade of the bucket, not only those after start
+    assert (hour["open"], hour["high"], hour["low"], hour["close"]) == (10.0, 14.0, 9.0, 9.0)
+    assert (hour["volume"], hour["trade_count"]) == (6.0, 3)
+    assert ("1h", "2024-01-01T15:00:00+00:00") in bars
+    # The day has not closed at end, so its live bar is left alone
+    assert not any(interval == "1d" for interval, _ in bars)
+
+
+def test_backfill_refuses_while_pending_deltas_cannot_be_written(fake_supabase):
+    fake_supabase.tables["trades"] = []
+    service = CandleService()
+    service.add_trade({"asset_id": "a", "created_at": "2024-01-01T14:05:00+00:00", "price": 10, "quantity": 1})
+
+    result = asyncio.run(service.backfill("a", end="2024-01-02T00:00:00+00:00"))
+
+    assert result["success"] is False
+    assert "candles" not in fake_supabase.tables
@@ -0,0 +1,206 @@
+import asyncio
+import os
+import signal
+
+import pytest
+
+from services.matching_engine import BookOrder
+from services.matching_shards import HashRing, LocalEngineClient, ShardedEngineClient
+
+
+def order(id, asset_id, side, quantity, price, user_id="user"):
+    return BookOrder(
+        id=id, asset_id=asset_id, user_id=user_id, wallet_address="",
+        order_type="limit", side=side, quantity=quantity, price=price
+    )
+
+
+def test_submit_many_returns_one_result_per_order_in_order():
+    client = LocalEngineClient()
+    orders = [
+        order("a1", "x", "sell", 5, 10.0),
+        order("a2", "y", "sell", 5, 20.0),
+        order("b1", "x", "buy", 3, 10.0),
+    ]
+
+    results = asyncio.run(client.submit_many(orders))
+
+    assert [result["orders"][0]["id"] for result in results] == ["a1", "a2", "b1"]
+    assert [trade["quantity"] for trade in results[2]["trades"]] == [3]
+
+
+def test_cancel_only_by_owner():
+    client = LocalEngineClient()
+
+    async def scenario():
+        await client.submit(order("b1", "x", "buy", 5, 10.0, user_id="owner"))
+        denied = await client.cancel("b1", user_id="someone-else")
+        cancelled = await client.cancel("b1", user_id="owner")
+        return denied, cancelled, await client.get_order("b1")
+
+    denied, cancelled, remaining = asyncio.run(scenario())
+    assert denied is None
+    assert cancelled["order"]["status"] == "cancelled"
+    assert remaining is None
+
+
+def test_reading_unknown_books_does_not_create_them():
+    client = LocalEngineClient()
+
+    async def scenario():
+        snapshot = await client.snapshot("nobody-trades-this", 10)
+        caught_up = await client.diffs_since("nobody-trades-this", 0)
+        stale = await client.diffs_since("nobody-trades-this", 5, "old-epoch")
+        return snapshot, caught_up, stale
+
+    snapshot, caught_up, stale = asyncio.run(scenario())
+
+    assert client.engine.books == {}
+    assert snapshot["sequence"] == 0 and snapshot["bids"] == [] and snapshot["asks"] == []
+    assert caught_up["diffs"] == []
+    assert stale["diffs"] is None
+
+
+def test_empty_snapshot_is_followed_by_the_first_diffs_of_a_new_book():
+    client = LocalEngineClient()
+
+    async def scenario():
+        snapshot = await client.snapshot("x", 10)
+        await client.submit(order("a1", "x", "sell", 5, 10.0))
+        return await client.diffs_since("x", snapshot["sequence"], snapshot["epoch"])
+
+    result = asyncio.run(scenario())
+
+    assert [diff["sequence"] for diff in result["diffs"]] == [1]
+
+
+def test_hash_ring_is_stable_and_uses_every_shard():
+    ring = HashRing(4)
+
+    shards = [ring.shard_for(f"asset-{i}") for i in range(1000)]
+
+    assert shards == [HashRing(4).shard_for(f"asset-{i}") for i in range(1000)]
+    assert set(shards) == {0, 1, 2, 3}
+
+
+def sharded_client(**kwargs):
+    client = ShardedEngineClient(2, **kwargs)
+    client.start()
+    return client
+
+
+def test_sharded_client_matches_like_the_local_engine():
+    async def scenario():
+        client = sharded_client()
+        try:
+            await client.submit(order("a1", "x", "sell", 5, 10.0))
+            result = await client.submit(order("b1", "x", "buy", 3, 10.0))
+            return result, await client.snapshot("x", 5), await client.get_order("a1")
+        finally:
+            await client.stop()
+
+    result, snapshot, maker = asyncio.run(scenario())
+    assert [trade["quantity"] for trade in result["trades"]] == [3]
+    assert snapshot["asks"] == [{"price": 10.0, "quantity": 2, "orders": 1}]
+    assert maker["status"] == "partial"
+
+
+def test_dead_shard_fails_its_commands_and_is_restarted():
+    restarted = []
+
+    async def scenario():
+        client = sharded_client()
+
+        async def on_restart(shard):
+            restarted.append(shard)
+        client.on_restart = on_restart
+
+        try:
+            await client.submit(order("b1", "x", "buy", 1, 10.0))
+            shard = client.ring.shard_for("x")
+            client._processes[shard].kill()
+            with pytest.raises(RuntimeError):
+                await client.snapshot("x", 5)
+            await asyncio.sleep(0.2)
+            return shard, client._processes[shard].is_alive(), await client.snapshot("x", 5)
+        finally:
+            await client.stop()
+
+    shard, alive, snapshot = asyncio.run(scenario())
+    assert restarted == [shard]
+    assert alive
+    # The restarted shard starts empty; its open orders are reloaded through on_restart
+    assert snapshot["bids"] == []
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGSTOP"), reason="needs SIGSTOP")
+def test_unresponsive_shard_times_out():
+    async def scenario():
+        client = sharded_client()
+        try:
+            await client.snapshot("x", 5)
+            process = client._processes[client.ring.shard_for("x")]
+            os.kill(process.pid, signal.SIGSTOP)
+            client.timeout = 0.5
+            try:
+                with pytest.raises(TimeoutError):
+                    await client.snapshot("x", 5)
+            finally:
+                os.kill(process.pid, signal.SIGCONT)
+        finally:
+            await client.stop()
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGSTOP"), reason="needs SIGSTOP")
+def test_timed_out_command_is_not_applied_late():
+    async def scenario():
+        client = sharded_client()
+        try:
+            # Wait for the shard to come up before shortening the timeout
+            await client.snapshot("x", 5)
+            process = client._processes[client.ring.shard_for("x")]
+            os.kill(process.pid, signal.SIGSTOP)
+            client.timeout = 0.3
+            try:
+                with pytest.raises(TimeoutError):
+                    await client.submit(order("b1", "x", "buy", 1, 10.0))
+            finally:
+                client.timeout = 10.0
+                os.kill(process.pid, signal.SIGCONT)
+            return await client.snapshot("x", 5), client.order_assets, client._pending
+        finally:
+            await client.stop()
+
+    snapshot, order_assets, pending = asyncio.run(scenario())
+    # The shard reached the submit after its deadline and skipped it
+    assert snapshot["bids"] == []
+    assert order_assets == {}
+    assert pending == {}
+
+
+def test_reply_after_timeout_is_tracked_and_handed_on():
+    late = []
+
+    async def scenario():
+        client = ShardedEngineClient(2)
+
+        async def on_late_result(op, result):
+            late.append((op, result))
+        client.on_late_result = on_late_result
+
+        # The shard applied the submit, but its reply arrives after the caller gave up
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        client._pending[7] = (0, loop, future, "submit")
+        future.cancel()
+        result = await LocalEngineClient().submit(order("b1", "x", "buy", 1, 10.0))
+        client._deliver([(7, True, result)])
+        await asyncio.sleep(0.01)
+        return client, result
+
+    client, result = asyncio.run(scenario())
+    assert late == [("submit", result)]
+    assert client.order_assets == {"b1": "x"}
+    assert client._pending == {}
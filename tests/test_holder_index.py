@@ -0,0 +1,142 @@
+import asyncio
+import json
+from decimal import Decimal
+
+from services.holder_index import HolderIndexRegistry, TokenHolderIndex
+from services.single_flight import SingleFlight
+from services.xrpl_cache import ValidatedLedgerCache
+
+ISSUER = "rIssuer"
+
+
+def ripple_state(holder, value, issuer_is_low=False, currency="USD"):
+    issuer_side, holder_side = {"issuer": ISSUER}, {"issuer": holder}
+    return {
+        "Balance": {"currency": currency, "issuer": "rrrrrrrrrrrrrrrrrrrrBZbvji", "value": value},
+        "LowLimit": issuer_side if issuer_is_low else holder_side,
+        "HighLimit": holder_side if issuer_is_low else issuer_side,
+    }
+
+
+def meta(*nodes):
+    return {"AffectedNodes": [
+        {kind: {"LedgerEntryType": "RippleState", fields_key: fields}}
+        for kind, fields_key, fields in nodes
+    ]}
+
+
+def test_balance_sign_follows_the_issuer_side():
+    index = TokenHolderIndex("USD", ISSUER)
+
+    # Issuer is the high account: the low holder's balance is positive
+    index.apply_ripple_state(ripple_state("rLow", "25"))
+    # Issuer is the low account: the high holder's balance is negative
+    index.apply_ripple_state(ripple_state("rHigh", "-15", issuer_is_low=True))
+    # Positive from a low issuer means the holder owes the issuer: not a holding
+    index.apply_ripple_state(ripple_state("rDebtor", "5", issuer_is_low=True))
+    # Other currencies and lines without the issuer are ignored
+    index.apply_ripple_state(ripple_state("rOther", "99", currency="EUR"))
+
+    assert index.balances == {"rLow": Decimal("25"), "rHigh": Decimal("15")}
+    assert index.supply == Decimal("40")
+    assert index.holder_count == 2
+
+
+def test_metadata_creates_modifies_and_deletes_trust_lines():
+    index = TokenHolderIndex("USD", ISSUER)
+    index.apply_metadata(meta(
+        ("CreatedNode", "NewFields", ripple_state("rA", "10")),
+        ("CreatedNode", "NewFields", ripple_state("rB", "-7", issuer_is_low=True)),
+    ))
+
+    index.apply_metadata(meta(
+        ("ModifiedNode", "FinalFields", ripple_state("rA", "4")),
+        ("DeletedNode", "FinalFields", ripple_state("rB", "0", issuer_is_low=True)),
+    ))
+
+    assert index.balances == {"rA": Decimal("4")}
+    assert index.supply == Decimal("4")
+    assert index.top_holders(5) == [{"address": "rA", "balance": 4.0}]
+
+
+class FakeXrpl:
+    """The parts of XRPLService the holder index uses"""
+
+    def __init__(self, ledger_index, lines=(), transactions=()):
+        self.cache = ValidatedLedgerCache()
+        self.cache.advance(ledger_index)
+        self.single_flight = SingleFlight()
+        self.lines = list(lines)
+        self.transactions = list(transactions)
+        self.scans = 0
+
+    async def get_validated_ledger_index(self):
+        return self.cache.ledger_index
+
+    async def iter_account_lines(self, account, ledger_index=None):
+        self.scans += 1
+        for line in self.lines:
+            yield line
+
+    async def iter_account_transactions(self, account, forward=True, ledger_index_min=None):
+        for tx in self.transactions:
+            if tx["ledger_index"] >= ledger_index_min:
+                yield tx
+
+
+def registry(monkeypatch, tmp_path, xrpl):
+    monkeypatch.setenv("XRPL_HOLDER_INDEX_DIR", str(tmp_path))
+    monkeypatch.setenv("XRPL_HOLDER_INDEX_MAX_REPLAY", "1000")
+    return HolderIndexRegistry(xrpl)
+
+
+def test_first_use_seeds_from_account_lines_and_writes_a_snapshot(monkeypatch, tmp_path):
+    xrpl = FakeXrpl(500, lines=[
+        {"account": "rA", "currency": "USD", "balance": "-12"},
+        {"account": "rB", "currency": "EUR", "balance": "-3"},
+    ])
+    holders = registry(monkeypatch, tmp_path, xrpl)
+
+    index = asyncio.run(holders.get_index("USD", ISSUER))
+
+    assert index.balances == {"rA": Decimal("12")}
+    assert index.ledger_index == 500
+    snapshot = json.loads((tmp_path / f"{ISSUER}_USD.json").read_text())
+    assert snapshot == {"currency": "USD", "issuer": ISSUER, "ledger_index": 500, "balances": {"rA": "12"}}
+
+
+def test_snapshot_is_replayed_forward_instead_of_reseeded(monkeypatch, tmp_path):
+    (tmp_path / f"{ISSUER}_USD.json").write_text(json.dumps(
+        {"currency": "USD", "issuer": ISSUER, "ledger_index": 100, "balances": {"rA": "10"}}
+    ))
+    xrpl = FakeXrpl(105, transactions=[
+        # Already in the snapshot
+        {"ledger_index": 100, "validated": True, "meta": meta(("ModifiedNode", "FinalFields", ripple_state("rA", "99")))},
+        {"ledger_index": 103, "validated": True, "meta": meta(
+            ("ModifiedNode", "FinalFields", ripple_state("rA", "4")),
+            ("CreatedNode", "NewFields", ripple_state("rB", "6")),
+        )},
+        {"ledger_index": 104, "validated": False, "meta": meta(("CreatedNode", "NewFields", ripple_state("rC", "1")))},
+    ])
+    holders = registry(monkeypatch, tmp_path, xrpl)
+
+    index = asyncio.run(holders.get_index("USD", ISSUER))
+
+    assert xrpl.scans == 0
+    assert index.balances == {"rA": Decimal("4"), "rB": Decimal("6")}
+    assert index.ledger_index == 105
+    snapshot = json.loads((tmp_path / f"{ISSUER}_USD.json").read_text())
+    assert snapshot["ledger_index"] == 105 and snapshot["balances"] == {"rA": "4", "rB": "6"}
+
+
+def test_snapshot_too_far_behind_is_reseeded(monkeypatch, tmp_path):
+    (tmp_path / f"{ISSUER}_USD.json").write_text(json.dumps(
+        {"currency": "USD", "issuer": ISSUER, "ledger_index": 100, "balances": {"rA": "10"}}
+    ))
+    xrpl = FakeXrpl(5000, lines=[{"account": "rB", "currency": "USD", "balance": "-2"}])
+    holders = registry(monkeypatch, tmp_path, xrpl)
+
+    index = asyncio.run(holders.get_index("USD", ISSUER))
+
+    assert xrpl.scans == 1
+    assert index.balances == {"rB": Decimal("2")}
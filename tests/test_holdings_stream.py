@@ -0,0 +1,76 @@
+import json
+
+import pytest
+
+
+def _holdings(db, user, assets):
+    from src.models.asset import TokenHolding
+
+    db.session.add_all([
+        TokenHolding(user_id=user.id, asset_id=asset.id, amount=i + 1, total_invested=10 * (i + 1))
+        for i, asset in enumerate(assets)
+    ])
+    db.session.commit()
+
+
+def _failing_service(after):
+    """A HoldingsService whose serialize fails once ``after`` holdings are serialized"""
+    from src.services.holdings_service import HoldingsService
+
+    class FailingHoldingsService(HoldingsService):
+        calls = 0
+
+        def serialize(self, row):
+            self.calls += 1
+            if self.calls > after:
+                raise RuntimeError("boom")
+            return super().serialize(row)
+    return FailingHoldingsService()
+
+
+def test_stream_is_one_json_document_in_batches(flask_db, make_user, make_asset):
+    from src.services.holdings_service import HoldingsService
+
+    user = make_user()
+    assets = [make_asset() for _ in range(5)]
+    _holdings(flask_db, user, assets)
+
+    chunks = list(HoldingsService().stream_portfolio_tokens(user.id, "p1", batch_size=2))
+    document = json.loads("".join(chunks))
+
+    # Header with the first batch, two more batches, then the footer
+    assert len(chunks) == 4
+    assert document["portfolio_id"] == "p1"
+    assert document["total_holdings"] == 5
+    symbols = [holding["symbol"] for holding in document["holdings"]]
+    assert symbols == sorted(symbols)
+    assert "error" not in document
+
+
+def test_stream_of_empty_portfolio(flask_db, make_user):
+    from src.services.holdings_service import HoldingsService
+
+    chunks = HoldingsService().stream_portfolio_tokens(make_user().id, "p1")
+
+    assert json.loads("".join(chunks)) == {"portfolio_id": "p1", "holdings": [], "total_holdings": 0}
+
+
+def test_first_batch_errors_raise_before_the_first_chunk(flask_db, make_user, make_asset):
+    user = make_user()
+    _holdings(flask_db, user, [make_asset(), make_asset()])
+
+    chunks = _failing_service(after=1).stream_portfolio_tokens(user.id, "p1", batch_size=2)
+
+    with pytest.raises(RuntimeError):
+        next(chunks)
+
+
+def test_later_errors_end_the_document_with_an_error(flask_db, make_user, make_asset):
+    user = make_user()
+    _holdings(flask_db, user, [make_asset() for _ in range(5)])
+
+    chunks = _failing_service(after=3).stream_portfolio_tokens(user.id, "p1", batch_size=2)
+    document = json.loads("".join(chunks))
+
+    assert document["error"] == "Holdings stream interrupted"
+    assert document["total_holdings"] == len(document["holdings"]) == 2
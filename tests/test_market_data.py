@@ -0,0 +1,90 @@
+import asyncio
+
+from services.market_data import MarketDataHub, asset_channel
+
+
+def make_hub(max_queue=10):
+    hub = MarketDataHub()
+    hub.max_queue = max_queue
+    return hub
+
+
+def test_publish_reaches_only_channel_subscribers():
+    hub = make_hub()
+    subscribed, other = hub.open(), hub.open()
+    subscribed.subscribe([asset_channel("a")])
+    other.subscribe([asset_channel("b")])
+
+    hub.publish(asset_channel("a"), {"type": "trade", "price": 1.0})
+
+    assert subscribed.queue.get_nowait() == {"channel": "asset:a", "type": "trade", "price": 1.0}
+    assert other.queue.empty()
+
+
+def test_close_unsubscribes_every_channel():
+    hub = make_hub()
+    subscription = hub.open()
+    subscription.subscribe([asset_channel("a"), asset_channel("b")])
+
+    subscription.close()
+
+    assert not hub.has_subscribers(asset_channel("a"))
+    assert not hub.has_subscribers(asset_channel("b"))
+
+
+def test_slow_subscriber_gets_one_overflow_notice():
+    hub = make_hub(max_queue=3)
+    subscription = hub.open()
+    subscription.subscribe([asset_channel("a")])
+
+    for i in range(10):
+        hub.publish(asset_channel("a"), {"type": "diff", "sequence": i})
+
+    events = [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+    assert subscription.overflowed
+    # The stale events are gone, so the notice is delivered next
+    assert events == [{"type": "overflow"}]
+
+
+def test_events_queue_again_once_the_overflow_is_handled():
+    hub = make_hub(max_queue=2)
+    subscription = hub.open()
+    subscription.subscribe([asset_channel("a")])
+    for i in range(3):
+        hub.publish(asset_channel("a"), {"type": "diff", "sequence": i})
+
+    async def consume():
+        notice = await subscription.get()
+        subscription.overflowed = False
+        hub.publish(asset_channel("a"), {"type": "diff", "sequence": 3})
+        return notice, await subscription.get()
+
+    notice, resumed = asyncio.run(consume())
+    assert notice == {"type": "overflow"}
+    assert resumed["sequence"] == 3
+
+
+def test_drain_discards_queued_events():
+    hub = make_hub()
+    subscription = hub.open()
+    subscription.subscribe([asset_channel("a")])
+    hub.publish(asset_channel("a"), {"type": "diff", "sequence": 1})
+
+    subscription.drain()
+
+    assert subscription.queue.empty()
+
+
+def test_snapshot_requests_are_queued_in_order_with_events():
+    hub = make_hub()
+    subscription = hub.open()
+    subscription.subscribe([asset_channel("a")])
+    hub.publish(asset_channel("a"), {"type": "diff", "sequence": 1})
+    subscription.request_snapshots([asset_channel("a")])
+
+    async def consume():
+        return [await subscription.get(), await subscription.get()]
+
+    first, second = asyncio.run(consume())
+    assert first["type"] == "diff"
+    assert second == {"type": "snapshot_request", "channels": ["asset:a"]}
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+
+@pytest.fixture
+def marketplace(fake_supabase):
+    from services.marketplace_service import MarketplaceService
+
+    batches = []
+    fake_supabase.functions["apply_order_batch"] = lambda orders, trades: batches.append((orders, trades))
+    return MarketplaceService(), batches
+
+
+def limit(asset_id, side, quantity, price):
+    return {"asset_id": asset_id, "order_type": "limit", "side": side, "quantity": quantity, "price": price}
+
+
+def test_batch_is_stored_in_one_call(marketplace, fake_supabase):
+    service, batches = marketplace
+
+    result = asyncio.run(service.create_orders("user", "", [
+        limit("x", "sell", 5, 10.0),
+        limit("x", "buy", 3, 10.0),
+        {"asset_id": "x", "order_type": "limit", "side": "buy", "quantity": 0, "price": 1.0},
+    ]))
+
+    assert result["success"]
+    assert [item["success"] for item in result["results"]] == [True, True, False]
+    assert len(batches) == 1
+    orders, trades = batches[0]
+    assert sorted(row["status"] for row in orders) == ["filled", "partial"]
+    assert [trade["quantity"] for trade in trades] == [3]
+    # Nothing is written table by table
+    assert fake_supabase.tables == {}
+
+
+def test_unstored_batch_is_reported_as_a_failure(marketplace, fake_supabase):
+    from fastapi import HTTPException
+
+    service, _ = marketplace
+    del fake_supabase.functions["apply_order_batch"]
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.create_orders("user", "", [limit("x", "sell", 5, 10.0)]))
+
+    assert error.value.status_code == 503
+
+
+def test_cancel_batch_stores_cancellations(marketplace):
+    service, batches = marketplace
+
+    async def scenario():
+        created = await service.create_order("x", "user", "", "limit", "buy", 5, 9.0)
+        cancelled = await service.cancel_orders([created["order_id"], "unknown"], "user")
+        return created, cancelled
+
+    created, cancelled = asyncio.run(scenario())
+
+    assert [item["success"] for item in cancelled["results"]] == [True, False]
+    orders, trades = batches[-1]
+    assert [(row["id"], row["status"]) for row in orders] == [(created["order_id"], "cancelled")]
+    assert orders[0]["cancelled_at"] is not None
+    assert trades == []
+
+
+def test_late_engine_result_is_stored(marketplace):
+    from services.matching_engine import BookOrder
+    from services.matching_shards import LocalEngineClient
+
+    service, batches = marketplace
+    engine = LocalEngineClient()
+
+    async def scenario():
+        await engine.submit(BookOrder(id="a1", asset_id="x", user_id="u", wallet_address="",
+                                      order_type="limit", side="sell", quantity=2, price=10.0))
+        result = await engine.submit(BookOrder(id="b1", asset_id="x", user_id="u", wallet_address="",
+                                               order_type="limit", side="buy", quantity=2, price=10.0))
+        await service._apply_late_result("submit", result)
+
+    asyncio.run(scenario())
+
+    orders, trades = batches[0]
+    assert {row["id"] for row in orders} == {"a1", "b1"}
+    assert len(trades) == 1
+
+
+def test_market_order_without_liquidity_is_rejected_and_not_stored(marketplace):
+    from fastapi import HTTPException
+
+    service, batches = marketplace
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(service.create_order("x", "user", "", "market", "buy", 5))
+
+    assert error.value.status_code == 400
+    assert batches == []
+
+
+def test_market_order_is_stored_at_its_average_fill_price(marketplace):
+    service, batches = marketplace
+
+    async def scenario():
+        await service.create_orders("maker", "", [limit("x", "sell", 1, 10.0), limit("x", "sell", 1, 12.0)])
+        return await service.create_orders("user", "", [
+            {"asset_id": "x", "order_type": "market", "side": "buy", "quantity": 2},
+            {"asset_id": "x", "order_type": "market", "side": "buy", "quantity": 2},
+        ])
+
+    result = asyncio.run(scenario())
+
+    filled, unfilled = result["results"]
+    assert filled["order"]["price"] == 11.0
+    assert unfilled == {"index": 1, "success": False, "error": "No liquidity for a market order"}
+    stored = {row["id"]: row for row in batches[-1][0]}
+    assert stored[filled["order_id"]]["price"] == 11.0
+    assert all(row["price"] is not None for row in stored.values())
@@ -0,0 +1,55 @@
+from services.marketplace_search import SearchIndex, apy_range, tokenize
+
+
+def listing(id, name, category, price, apy=None, **fields):
+    return {"id": id, "name": name, "category": category, "token_price": price, "apy": apy, **fields}
+
+
+def make_index():
+    index = SearchIndex()
+    index.upsert(listing("1", "Manhattan Office Tower", "real_estate", 250.0, 8.5, location="New York"))
+    index.upsert(listing("2", "Brooklyn Office Loft", "real_estate", 120.0, 12.0))
+    index.upsert(listing("3", "Gold Reserve", "commodities", 50.0, 4.0, description="Vaulted office gold"))
+    index.upsert(listing("4", "Art Collection", "art", 75.0))
+    return index
+
+
+def test_tokenize_and_apy_ranges():
+    assert tokenize("Class-A Office, NY") == ["class", "a", "office", "ny"]
+    assert [apy_range(apy) for apy in (None, 0, 5, 9.9, 14, 30)] == [None, "0-5", "5-10", "5-10", "10-15", "15+"]
+
+
+def test_every_term_must_match_and_name_matches_rank_first():
+    result = make_index().search("office")
+
+    assert [asset["id"] for asset in result["assets"]] == ["2", "1", "3"]
+    assert [asset["id"] for asset in make_index().search("office manhattan")["assets"]] == ["1"]
+
+
+def test_facets_are_counted_under_the_other_filters():
+    result = make_index().search(filters={"category": ["real_estate"]})
+
+    assert result["total"] == 2
+    assert result["facets"]["category"] == {"real_estate": 2, "commodities": 1, "art": 1}
+    assert result["facets"]["apy_range"] == {"5-10": 1, "10-15": 1}
+
+
+def test_sort_puts_missing_values_last_and_pages():
+    index = make_index()
+
+    ascending = index.search(sort_by="apy", sort_desc=False)
+    page = index.search(sort_by="price", sort_desc=True, limit=2, offset=1)
+
+    assert [asset["id"] for asset in ascending["assets"]] == ["3", "1", "2", "4"]
+    assert [asset["id"] for asset in page["assets"]] == ["2", "4"]
+
+
+def test_upsert_replaces_and_remove_forgets_a_listing():
+    index = make_index()
+    index.upsert(listing("1", "Harbour Warehouse", "real_estate", 90.0, 6.0))
+    index.remove("4")
+
+    assert [asset["id"] for asset in index.search("manhattan")["assets"]] == []
+    assert [asset["id"] for asset in index.search("warehouse")["assets"]] == ["1"]
+    assert len(index) == 3
+    assert "art" not in index.search()["facets"]["category"]
@@ -0,0 +1,291 @@
+from datetime import datetime, timezone
+
+from services.matching_engine import MatchingEngine, OrderBook, BookOrder, timestamp
+
+
+def order(id, side, quantity, price=None, order_type="limit", **fields):
+    return BookOrder(
+        id=id, asset_id="asset", user_id=fields.pop("user_id", f"user-{id}"), wallet_address="",
+        order_type=order_type, side=side, quantity=quantity, price=price, **fields
+    )
+
+
+def test_limit_order_rests_when_nothing_crosses():
+    book = OrderBook("asset")
+    result = book.submit(order("b1", "buy", 10, 100.0))
+
+    assert result["trades"] == []
+    assert book.snapshot()["bids"] == [{"price": 100.0, "quantity": 10, "orders": 1}]
+    assert book.snapshot()["asks"] == []
+
+
+def test_matches_best_price_first_then_time_priority():
+    book = OrderBook("asset")
+    book.submit(order("a1", "sell", 5, 101.0))
+    book.submit(order("a2", "sell", 5, 100.0))
+    book.submit(order("a3", "sell", 5, 100.0))
+
+    result = book.submit(order("b1", "buy", 12, 101.0))
+
+    assert [(trade["sell_order_id"], trade["price"], trade["quantity"]) for trade in result["trades"]] == [
+        ("a2", 100.0, 5), ("a3", 100.0, 5), ("a1", 101.0, 2)
+    ]
+    assert book.snapshot()["asks"] == [{"price": 101.0, "quantity": 3, "orders": 1}]
+    assert book.last_price == 101.0
+
+
+def test_partial_fill_rests_remainder():
+    book = OrderBook("asset")
+    book.submit(order("a1", "sell", 4, 100.0))
+
+    result = book.submit(order("b1", "buy", 10, 100.0))
+    taker = next(row for row in result["orders"] if row.id == "b1")
+
+    assert taker.status == "partial"
+    assert taker.remaining_quantity == 6
+    assert book.snapshot()["bids"] == [{"price": 100.0, "quantity": 6, "orders": 1}]
+
+
+def test_market_order_never_rests():
+    book = OrderBook("asset")
+    book.submit(order("a1", "sell", 3, 100.0))
+
+    result = book.submit(order("m1", "buy", 5, order_type="market"))
+    taker = next(row for row in result["orders"] if row.id == "m1")
+
+    assert sum(trade["quantity"] for trade in result["trades"]) == 3
+    assert taker.status == "cancelled"
+    assert book.snapshot()["bids"] == []
+
+
+def test_market_order_records_its_average_fill_price():
+    book = OrderBook("asset")
+    book.submit(order("a1", "sell", 1, 100.0))
+    book.submit(order("a2", "sell", 3, 104.0))
+
+    result = book.submit(order("m1", "buy", 4, order_type="market"))
+    taker = next(row for row in result["orders"] if row.id == "m1")
+
+    assert taker.price == 103.0
+    assert taker.status == "filled"
+
+
+def test_cancel_removes_order_from_levels():
+    engine = MatchingEngine()
+    engine.submit(order("b1", "buy", 10, 100.0))
+    engine.submit(order("b2", "buy", 5, 100.0))
+
+    result = engine.cancel("b1")
+
+    assert result["order"].status == "cancelled"
+    assert engine.book("asset").snapshot()["bids"] == [{"price": 100.0, "quantity": 5, "orders": 1}]
+    assert engine.cancel("b1") is None
+    assert engine.get_order("b2").remaining_quantity == 5
+
+
+def test_cancelled_order_is_skipped_by_matching():
+    engine = MatchingEngine()
+    engine.submit(order("a1", "sell", 5, 100.0))
+    engine.submit(order("a2", "sell", 5, 100.0))
+    engine.cancel("a1")
+
+    result = engine.submit(order("b1", "buy", 5, 100.0))
+
+    assert [trade["sell_order_id"] for trade in result["trades"]] == ["a2"]
+
+
+def test_book_order_round_trips_through_dict():
+    original = order("b1", "buy", 10, 100.0, filled_quantity=4, status="partial", expires_at="2030-01-01T00:00:00+00:00")
+
+    copy = BookOrder.from_dict(original.to_dict())
+
+    assert copy.to_dict() == original.to_dict()
+
+
+def test_diffs_carry_consecutive_sequences_and_level_aggregates():
+    book = OrderBook("asset")
+    first = book.submit(order("b1", "buy", 10, 100.0))["diff"]
+    second = book.submit(order("b2", "buy", 5, 100.0))["diff"]
+
+    assert (first["sequence"], second["sequence"]) == (1, 2)
+    assert second["bids"] == [{"price": 100.0, "quantity": 15, "orders": 2}]
+    assert second["epoch"] == book.epoch == book.snapshot()["epoch"]
+
+
+def test_diffs_since_returns_missed_diffs():
+    book = OrderBook("asset")
+    for i in range(3):
+        book.submit(order(f"b{i}", "buy", 1, 100.0 + i))
+
+    assert [diff["sequence"] for diff in book.diffs_since(1)] == [2, 3]
+    assert book.diffs_since(3) == []
+
+
+def test_diffs_since_requests_resync_when_diffs_were_dropped():
+    book = OrderBook("asset", diff_history=2)
+    for i in range(4):
+        book.submit(order(f"b{i}", "buy", 1, 100.0 + i))
+
+    assert book.diffs_since(1) is None
+    assert [diff["sequence"] for diff in book.diffs_since(2)] == [3, 4]
+
+
+def test_diffs_since_requests_resync_when_client_is_ahead():
+    book = OrderBook("asset")
+    book.submit(order("b1", "buy", 1, 100.0))
+
+    assert book.diffs_since(5) is None
+
+
+def test_diffs_since_requests_resync_for_another_epoch():
+    book = OrderBook("asset")
+    book.submit(order("b1", "buy", 1, 100.0))
+    restarted = OrderBook("asset")
+    restarted.submit(order("b1", "buy", 1, 100.0))
+
+    assert restarted.diffs_since(1, book.epoch) is None
+    assert restarted.diffs_since(1, restarted.epoch) == []
+
+
+def test_snapshot_plus_diffs_rebuilds_the_book():
+    book = OrderBook("asset")
+    book.submit(order("b1", "buy", 10, 99.0))
+    book.submit(order("a1", "sell", 10, 101.0))
+    snapshot = book.snapshot()
+    levels = {("bids", level["price"]): level["quantity"] for level in snapshot["bids"]}
+    levels.update({("asks", level["price"]): level["quantity"] for level in snapshot["asks"]})
+
+    book.submit(order("b2", "buy", 4, 101.0))
+    book.submit(order("a2", "sell", 2, 100.0))
+    for diff in book.diffs_since(snapshot["sequence"]):
+        for side in ("bids", "asks"):
+            for level in diff[side]:
+                levels[(side, level["price"])] = level["quantity"]
+
+    current = book.snapshot()
+    expected = {("bids", level["price"]): level["quantity"] for level in current["bids"]}
+    expected.update({("asks", level["price"]): level["quantity"] for level in current["asks"]})
+    assert {key: quantity for key, quantity in levels.items() if quantity} == expected
+
+
+def test_orders_and_trades_are_stamped_in_utc():
+    book = OrderBook("asset")
+    book.submit(order("a1", "sell", 1, 100.0))
+    trade = book.submit(order("b1", "buy", 1, 100.0))["trades"][0]
+
+    assert datetime.fromisoformat(trade["created_at"]).utcoffset().total_seconds() == 0
+    assert datetime.fromisoformat(order("o", "buy", 1, 1.0).created_at).utcoffset().total_seconds() == 0
+
+
+def test_timestamp_reads_naive_values_as_utc():
+    expected = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc).timestamp()
+
+    assert timestamp("2024-01-01T12:00:00") == expected
+    assert timestamp("2024-01-01T12:00:00Z") == expected
+
+
+def test_ioc_fills_what_it_can_and_cancels_the_rest():
+    book = OrderBook("asset")
+    book.submit(order("a1", "sell", 3, 100.0))
+
+    result = book.submit(order("b1", "buy", 5, 100.0, time_in_force="IOC"))
+    taker = next(row for row in result["orders"] if row.id == "b1")
+
+    assert taker.filled_quantity == 3
+    assert taker.status == "cancelled"
+    assert book.snapshot()["bids"] == []
+
+
+def test_fok_fills_completely_or_not_at_all():
+    book = OrderBook("asset")
+    book.submit(order("a1", "sell", 3, 100.0))
+    book.submit(order("a2", "sell", 3, 102.0))
+
+    rejected = book.submit(order("b1", "buy", 5, 101.0, time_in_force="FOK"))
+    filled = book.submit(order("b2", "buy", 5, 102.0, time_in_force="FOK"))
+
+    assert rejected["trades"] == []
+    assert rejected["orders"][0].status == "cancelled"
+    assert sum(trade["quantity"] for trade in filled["trades"]) == 5
+    assert filled["orders"][0].status == "filled"
+
+
+def test_expire_due_expires_only_due_open_orders():
+    engine = MatchingEngine()
+    engine.submit(order("b1", "buy", 1, 100.0, expires_at="2030-01-01T00:00:00+00:00"))
+    engine.submit(order("b2", "buy", 1, 99.0, expires_at="2030-01-02T00:00:00+00:00"))
+    engine.submit(order("b3", "buy", 1, 98.0))
+
+    due = timestamp("2030-01-01T12:00:00+00:00")
+    assert engine.next_expiry() == timestamp("2030-01-01T00:00:00+00:00")
+
+    groups = engine.expire_due(due)
+
+    assert [(row.id, row.status) for row in groups[0]["orders"]] == [("b1", "expired")]
+    assert groups[0]["diff"]["bids"] == [{"price": 100.0, "quantity": 0, "orders": 0}]
+    assert engine.get_order("b1") is None
+    assert engine.next_expiry() == timestamp("2030-01-02T00:00:00+00:00")
+
+
+def test_closed_orders_do_not_expire_or_hold_the_next_expiry():
+    engine = MatchingEngine()
+    engine.submit(order("b1", "buy", 1, 100.0, expires_at="2030-01-01T00:00:00+00:00"))
+    engine.cancel("b1")
+
+    assert engine.next_expiry() is None
+    assert engine.expire_due(timestamp("2031-01-01T00:00:00+00:00")) == []
+
+
+def test_expiry_heap_is_compacted_as_orders_close():
+    engine = MatchingEngine()
+    for i in range(1000):
+        engine.submit(order(f"b{i}", "buy", 1, 100.0, expires_at="2030-01-01T00:00:00+00:00"))
+        engine.cancel(f"b{i}")
+    for i in range(100):
+        engine.submit(order(f"a{i}", "sell", 1, 101.0, expires_at="2030-01-01T00:00:00+00:00"))
+        engine.submit(order(f"t{i}", "buy", 1, 101.0))
+
+    assert not engine.scheduled
+    assert len(engine.expiries) <= 130
+
+
+def test_buy_stop_triggers_on_a_print_at_or_above_its_stop_price():
+    book = OrderBook("asset")
+    book.submit(order("s1", "buy", 2, order_type="stop", stop_price=101.0))
+    book.submit(order("a1", "sell", 1, 100.0))
+    book.submit(order("a2", "sell", 5, 101.0))
+
+    untouched = book.submit(order("b1", "buy", 1, 100.0))
+    assert book.stops.get("s1") is not None
+    assert [trade["buy_order_id"] for trade in untouched["trades"]] == ["b1"]
+
+    result = book.submit(order("b2", "buy", 1, 101.0))
+
+    stop = next(row for row in result["orders"] if row.id == "s1")
+    assert stop.order_type == "market"
+    assert stop.status == "filled"
+    assert stop.price == 101.0
+    assert [trade["buy_order_id"] for trade in result["trades"]] == ["b2", "s1"]
+    assert len(book.stops) == 0
+
+
+def test_sell_stop_limit_rests_at_its_limit_price():
+    book = OrderBook("asset")
+    book.submit(order("s1", "sell", 3, 98.0, order_type="stop", stop_price=99.0))
+    book.submit(order("b1", "buy", 1, 99.0))
+
+    book.submit(order("a1", "sell", 1, 99.0))
+
+    assert book.orders["s1"].order_type == "limit"
+    assert book.snapshot()["asks"] == [{"price": 98.0, "quantity": 3, "orders": 1}]
+
+
+def test_cancelled_stop_never_triggers():
+    engine = MatchingEngine()
+    engine.submit(order("s1", "buy", 1, order_type="stop", stop_price=100.0))
+    engine.submit(order("a1", "sell", 2, 100.0))
+
+    assert engine.cancel("s1")["order"].status == "cancelled"
+    result = engine.submit(order("b1", "buy", 1, 100.0))
+
+    assert [trade["buy_order_id"] for trade in result["trades"]] == ["b1"]
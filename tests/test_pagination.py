@@ -0,0 +1,98 @@
+import pytest
+
+fastapi = pytest.importorskip("fastapi")
+
+from services.pagination import apply_keyset, decode_cursor, encode_cursor, page_result
+
+
+class RecordingQuery:
+    """Stands in for a PostgREST query builder and records the calls made on it"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            return self
+        return call
+
+    def filters(self):
+        return [args[0] for name, args, _ in self.calls if name == "or_"]
+
+
+@pytest.mark.parametrize("value", ["2024-01-01T00:00:00+00:00", 12.5, 0, "a,b.c\"d", None])
+def test_cursor_round_trips(value):
+    cursor = encode_cursor("created_at", {"id": "row-1", "created_at": value})
+
+    assert decode_cursor(cursor, "created_at") == (value, "row-1")
+
+
+def test_cursor_rejects_another_sort_and_garbage():
+    cursor = encode_cursor("created_at", {"id": "row-1", "created_at": "2024-01-01"})
+
+    with pytest.raises(fastapi.HTTPException) as error:
+        decode_cursor(cursor, "token_price")
+    assert error.value.status_code == 400
+
+    with pytest.raises(fastapi.HTTPException) as error:
+        decode_cursor("not a cursor", "created_at")
+    assert error.value.status_code == 400
+
+
+def test_page_result_trims_look_ahead_row_and_builds_next_cursor():
+    rows = [{"id": str(i), "apy": i} for i in range(4)]
+
+    page = page_result(rows, "apy", 3)
+
+    assert page["rows"] == rows[:3]
+    assert page["has_more"]
+    assert decode_cursor(page["next_cursor"], "apy") == (2, "2")
+    assert page_result(rows[:2], "apy", 3)["next_cursor"] is None
+
+
+def test_first_page_only_orders_and_limits():
+    query = apply_keyset(RecordingQuery(), "apy", True, None, 10, ("apy",))
+
+    assert query.filters() == []
+    assert ("order", ("apy",), {"desc": True}) in query.calls
+    assert ("order", ("id",), {"desc": True}) in query.calls
+    assert ("limit", (11,), {}) in query.calls
+
+
+def test_unlisted_sort_column_is_rejected():
+    with pytest.raises(fastapi.HTTPException) as error:
+        apply_keyset(RecordingQuery(), "apy.gt.0,id", False, None, 10, ("apy",))
+    assert error.value.status_code == 400
+
+
+def test_next_page_filter_after_a_value():
+    cursor = encode_cursor("apy", {"id": "x", "apy": 5.5})
+
+    ascending = apply_keyset(RecordingQuery(), "apy", False, cursor, 10, ("apy",))
+    descending = apply_keyset(RecordingQuery(), "apy", True, cursor, 10, ("apy",))
+
+    assert ascending.filters() == ['and(or(apy.gt."5.5",apy.is.null,and(apy.eq."5.5",id.gt."x")))']
+    assert descending.filters() == ['and(or(apy.lt."5.5",and(apy.eq."5.5",id.lt."x")))']
+
+
+def test_next_page_filter_after_a_null():
+    cursor = encode_cursor("apy", {"id": "x", "apy": None})
+
+    ascending = apply_keyset(RecordingQuery(), "apy", False, cursor, 10, ("apy",))
+    descending = apply_keyset(RecordingQuery(), "apy", True, cursor, 10, ("apy",))
+
+    assert ascending.filters() == ['and(and(apy.is.null,id.gt."x"))']
+    assert descending.filters() == ['and(or(apy.not.is.null,and(apy.is.null,id.lt."x")))']
+
+
+def test_condition_and_cursor_are_combined_with_and():
+    cursor = encode_cursor("created_at", {"id": "x", "created_at": "2024-01-01"})
+    condition = 'or(buyer_id.eq."u",seller_id.eq."u")'
+
+    query = apply_keyset(RecordingQuery(), "created_at", True, cursor, 10, ("created_at",), condition)
+
+    assert query.filters() == [
+        'and(or(buyer_id.eq."u",seller_id.eq."u"),'
+        'or(created_at.lt."2024-01-01",and(created_at.eq."2024-01-01",id.lt."x")))'
+    ]
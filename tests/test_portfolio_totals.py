@@ -0,0 +1,105 @@
+from decimal import Decimal
+
+
+def _totals(portfolio):
+    return (portfolio.total_value, portfolio.total_invested, portfolio.total_pnl, portfolio.total_dividends)
+
+
+def _reconciled(db, portfolio):
+    """Stored totals, then the totals calculate_metrics recomputes from holdings"""
+    db.session.refresh(portfolio)
+    stored = _totals(portfolio)
+    portfolio.calculate_metrics()
+    return stored, _totals(portfolio)
+
+
+def test_holding_deltas_match_calculate_metrics(flask_db, make_user, make_asset):
+    from src.models.asset import Portfolio, TokenHolding
+
+    user = make_user()
+    portfolio = Portfolio(user_id=user.id)
+    flask_db.session.add(portfolio)
+    flask_db.session.commit()
+    unpriced = make_asset(initial_price=10)
+    priced = make_asset(initial_price=5, current_price=7)
+
+    first = TokenHolding(user_id=user.id, asset_id=unpriced.id, amount=10, total_invested=100)
+    second = TokenHolding(user_id=user.id, asset_id=priced.id, amount=4, total_invested=20,
+                          realized_pnl=3, total_dividends_received=2)
+    flask_db.session.add_all([first, second])
+    flask_db.session.commit()
+    stored, recomputed = _reconciled(flask_db, portfolio)
+    assert stored == recomputed
+    assert recomputed[:2] == (Decimal("128"), Decimal("120"))
+
+    # Amount change and first price on the same flush; the price revalues unrealized P&L
+    first.amount = 15
+    unpriced.current_price = 12
+    flask_db.session.commit()
+    stored, recomputed = _reconciled(flask_db, portfolio)
+    assert stored == recomputed
+    assert recomputed[0] == Decimal("208")
+
+    flask_db.session.delete(second)
+    flask_db.session.commit()
+    stored, recomputed = _reconciled(flask_db, portfolio)
+    assert stored == recomputed
+    assert recomputed == (Decimal("180"), Decimal("100"), Decimal("80"), Decimal("0"))
+
+
+def test_reconcile_all_fixes_stale_totals(flask_db, make_user, make_asset):
+    from src.models.asset import Portfolio, TokenHolding
+
+    holder, empty = make_user(), make_user()
+    asset = make_asset(initial_price=10)
+    flask_db.session.add(TokenHolding(user_id=holder.id, asset_id=asset.id, amount=3, total_invested=25))
+    stale = Portfolio(user_id=holder.id, total_value=999, total_invested=999, total_pnl=999, total_dividends=999)
+    drifted = Portfolio(user_id=empty.id, total_value=5)
+    flask_db.session.add_all([stale, drifted])
+    flask_db.session.commit()
+
+    assert Portfolio.reconcile_all() == 2
+
+    flask_db.session.refresh(stale)
+    flask_db.session.refresh(drifted)
+    assert _totals(stale) == (Decimal("30"), Decimal("25"), Decimal("0"), Decimal("0"))
+    assert _totals(drifted) == (0, 0, 0, 0)
+
+
+def test_reconciliation_service_records_last_run(flask_db, make_user):
+    from src.models.asset import Portfolio
+    from src.services.reconciliation_service import ReconciliationService
+
+    flask_db.session.add(Portfolio(user_id=make_user().id))
+    flask_db.session.commit()
+    service = ReconciliationService()
+
+    assert service.last_run is None
+    run = service.reconcile()
+    assert run is service.last_run
+    assert run["portfolios"] == 1
+    # A non-positive interval disables the background thread
+    service.start(app=None, interval=0)
+    assert service._thread is None
+
+
+def test_reconcile_all_locks_the_portfolio_rows_before_recomputing(flask_db, make_user, monkeypatch):
+    from sqlalchemy.dialects import postgresql
+    from src.models.asset import Portfolio
+
+    flask_db.session.add(Portfolio(user_id=make_user().id))
+    flask_db.session.commit()
+    statements = []
+    execute = flask_db.session.execute
+
+    def recording(statement, *args, **kwargs):
+        statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        return execute(statement, *args, **kwargs)
+    monkeypatch.setattr(flask_db.session, "execute", recording)
+
+    assert Portfolio.reconcile_all() == 1
+
+    # Same transaction: the lock, then the UPDATE reading holdings after it
+    assert len(statements) == 2
+    assert statements[0].startswith("SELECT") and statements[0].endswith("FOR UPDATE")
+    assert statements[1].startswith("UPDATE portfolios")
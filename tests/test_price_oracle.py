@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("supabase")
+
+try:
+    from services.price_oracle import AssetPrice, PriceOracle
+except ValueError:
+    # The Supabase client is created at import time and needs SUPABASE_URL and a key
+    pytest.skip("Supabase is not configured", allow_module_level=True)
+
+
+def test_vwap_covers_only_trades_inside_the_window():
+    price = AssetPrice()
+    price.add_trade(10.0, 1.0, window=60, now=0)
+    price.add_trade(20.0, 3.0, window=60, now=30)
+
+    assert price.vwap(60, now=30) == pytest.approx(17.5)
+    assert price.vwap(60, now=75) == pytest.approx(20.0)
+    assert price.vwap(60, now=200) is None
+    assert price.last_price == 20.0
+
+
+def test_mid_price_needs_both_sides():
+    price = AssetPrice()
+    price.best_bid = 99.0
+    assert price.mid_price is None
+
+    price.best_ask = 101.0
+    assert price.mid_price == 100.0
+
+
+def test_get_price_falls_back_to_other_sources():
+    oracle = PriceOracle()
+    oracle.record_trade({"asset_id": "a", "price": 12, "quantity": 1})
+
+    assert oracle.get_price("a", "mid") == 12.0
+    assert oracle.get_price("missing") is None
+
+    oracle.record_book({"asset_id": "a", "best_bid": 10.0, "best_ask": 11.0})
+    assert oracle.get_price("a", "mid") == 10.5
+    assert oracle.get_price("a", "last") == 12.0
@@ -0,0 +1,80 @@
+from decimal import Decimal
+
+
+def _setup(db, make_user, make_asset, holders=3):
+    from src.models.asset import Portfolio, TokenHolding
+
+    asset = make_asset(initial_price=10)
+    users = [make_user() for _ in range(holders)]
+    portfolios = [Portfolio(user_id=user.id) for user in users]
+    holdings = [
+        TokenHolding(user_id=user.id, asset_id=asset.id, amount=i + 1, total_invested=10 * (i + 1))
+        for i, user in enumerate(users)
+    ]
+    db.session.add_all(portfolios + holdings)
+    db.session.commit()
+    return asset, portfolios, holdings
+
+
+def test_price_change_revalues_every_holder_in_the_same_flush(flask_db, make_user, make_asset):
+    asset, portfolios, holdings = _setup(flask_db, make_user, make_asset)
+
+    asset.current_price = 13
+    flask_db.session.commit()
+
+    # Loaded holdings were expired, so they show the bulk-updated P&L
+    assert [h.unrealized_pnl for h in holdings] == [Decimal("3"), Decimal("6"), Decimal("9")]
+    for portfolio, holding in zip(portfolios, holdings):
+        flask_db.session.refresh(portfolio)
+        assert portfolio.total_pnl == holding.unrealized_pnl
+
+
+def test_update_pnl_with_a_price_change_in_the_same_flush_counts_once(flask_db, make_user, make_asset):
+    asset, portfolios, holdings = _setup(flask_db, make_user, make_asset, holders=1)
+
+    asset.current_price = 15
+    holdings[0].update_pnl()
+    holdings[0].update_pnl()
+    flask_db.session.commit()
+
+    flask_db.session.refresh(portfolios[0])
+    assert holdings[0].unrealized_pnl == Decimal("5")
+    assert portfolios[0].total_pnl == Decimal("5")
+    stored = portfolios[0].total_pnl
+    portfolios[0].calculate_metrics()
+    assert portfolios[0].total_pnl == stored
+
+
+def test_revalue_all_and_metrics(flask_db, make_user, make_asset):
+    from src.services.revaluation_service import RevaluationService
+
+    _setup(flask_db, make_user, make_asset)
+    service = RevaluationService()
+
+    # Prices are unchanged, so a full revaluation finds nothing to move
+    run = service.revalue_all()
+
+    assert run["holdings"] == 3
+    assert run["asset_id"] is None
+    metrics = service.get_metrics()
+    assert metrics["runs"] == 1
+    assert metrics["holdings_revalued"] == 3
+    assert metrics["last_run"] == run
+
+
+def test_revalue_asset_repairs_a_price_written_outside_the_orm(flask_db, make_user, make_asset):
+    from src.models.asset import Asset
+    from src.services.revaluation_service import RevaluationService
+
+    asset, portfolios, holdings = _setup(flask_db, make_user, make_asset)
+    # A Core UPDATE skips the flush listener, so nothing is revalued yet
+    flask_db.session.execute(Asset.__table__.update().where(Asset.__table__.c.id == asset.id).values(current_price=12))
+    flask_db.session.commit()
+    assert [h.unrealized_pnl for h in holdings] == [0, 0, 0]
+
+    RevaluationService().revalue_asset(asset.id)
+
+    assert [h.unrealized_pnl for h in holdings] == [Decimal("2"), Decimal("4"), Decimal("6")]
+    for portfolio, holding in zip(portfolios, holdings):
+        flask_db.session.refresh(portfolio)
+        assert portfolio.total_pnl == holding.unrealized_pnl
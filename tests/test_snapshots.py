@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+# 1e11 * 1e8 does not fit in an int64
+OVERFLOWING_AMOUNT = Decimal("100000000000.5")
+
+
+def _snapshot(asset_id, encoded):
+    from src.models.asset import HoldingsSnapshot
+
+    encoding, user_ids, amounts = encoded
+    return HoldingsSnapshot(
+        asset_id=asset_id, record_date=datetime(2026, 1, 1),
+        amount_encoding=encoding, user_ids=user_ids, amounts=amounts
+    )
+
+
+@pytest.mark.parametrize("amounts, encoding", [
+    ([Decimal("1.5"), Decimal("0.00000001"), Decimal("250")], "i64"),
+    ([Decimal("1.5"), OVERFLOWING_AMOUNT, Decimal("250")], "text"),
+])
+def test_encode_decode_round_trip(flask_db, amounts, encoding):
+    from src.services.snapshot_service import SnapshotService
+
+    user_ids = ["a", "b", "c"]
+    encoded = SnapshotService._encode(user_ids, amounts)
+    assert encoded[0] == encoding
+
+    columns = SnapshotService._decode(_snapshot("asset", encoded))
+
+    assert list(columns) == list(zip(user_ids, amounts))
+    assert columns.amount_of("b") == amounts[1]
+    assert columns.amount_of("missing") == Decimal("0")
+    assert columns.total_amount() == sum(amounts)
+
+
+def test_encode_decode_empty(flask_db):
+    from src.services.snapshot_service import SnapshotService
+
+    columns = SnapshotService._decode(_snapshot("asset", SnapshotService._encode([], [])))
+
+    assert len(columns) == 0
+    assert columns.total_amount() == Decimal("0")
+
+
+def _change(db, asset, user, amount_after, changed_at):
+    from src.models.asset import HoldingChange
+
+    db.session.add(HoldingChange(
+        asset_id=asset.id, user_id=user.id, delta=0, amount_after=amount_after, changed_at=changed_at
+    ))
+    db.session.commit()
+
+
+def test_capture_reconstructs_holders_at_the_record_date(flask_db, make_user, make_asset):
+    from src.services.snapshot_service import SnapshotService
+
+    asset = make_asset()
+    stayed, left, joined_late = make_user(), make_user(), make_user()
+    record_date = datetime(2026, 3, 31)
+    _change(flask_db, asset, stayed, 10, record_date - timedelta(days=10))
+    _change(flask_db, asset, stayed, 4, record_date)
+    _change(flask_db, asset, left, 7, record_date - timedelta(days=5))
+    _change(flask_db, asset, left, 0, record_date - timedelta(days=1))
+    _change(flask_db, asset, joined_late, 3, record_date + timedelta(seconds=1))
+
+    service = SnapshotService()
+    snapshot = service.capture(asset.id, record_date)
+
+    assert snapshot.holder_count == 1
+    assert snapshot.total_amount == Decimal("4")
+    assert list(service.get_snapshot(asset.id, record_date)) == [(stayed.id, Decimal("4"))]
+    # Captured once per asset and record date
+    assert service.capture(asset.id, record_date).id == snapshot.id
+
+
+def test_capture_refuses_future_record_dates(flask_db, make_asset):
+    from src.services.snapshot_service import SnapshotService
+
+    with pytest.raises(ValueError):
+        SnapshotService().capture(make_asset().id, datetime.utcnow() + timedelta(days=1))
+
+
+def test_concurrent_capture_returns_the_stored_snapshot(flask_db, make_asset):
+    from src.models.asset import HoldingsSnapshot
+    from src.services.snapshot_service import SnapshotService
+
+    asset = make_asset()
+    record_date = datetime(2026, 3, 31)
+
+    class RacingSnapshotService(SnapshotService):
+        def _holdings_at(self, asset_id, record_date):
+            # Another worker stores the snapshot between our lookup and insert
+            encoding, user_ids, amounts = self._encode(["winner"], [Decimal("1")])
+            flask_db.session.execute(HoldingsSnapshot.__table__.insert().values(
+                id="theirs", asset_id=asset_id, record_date=record_date, holder_count=1,
+                total_amount=1, amount_encoding=encoding, user_ids=user_ids, amounts=amounts
+            ))
+            flask_db.session.commit()
+            return []
+
+    snapshot = RacingSnapshotService().capture(asset.id, record_date)
+
+    assert snapshot.id == "theirs"
+    assert HoldingsSnapshot.query.count() == 1
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def service(fake_supabase, monkeypatch):
+    from services.supabase_service import supabase_service
+    monkeypatch.setattr(supabase_service, "_platform_stats_cache", None)
+    return supabase_service
+
+
+class BlockingQuery:
+    """A query whose execute() blocks its thread until released"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.thread = None
+
+    def execute(self):
+        self.thread = threading.current_thread()
+        self.started.set()
+        self.release.wait(5)
+        return "rows"
+
+
+def test_queries_run_on_the_supabase_pool_not_the_event_loop(service):
+    query = BlockingQuery()
+
+    async def main():
+        execution = asyncio.create_task(service.execute(query))
+        # The loop keeps running while the query blocks its worker thread
+        while not query.started.is_set():
+            await asyncio.sleep(0.01)
+        assert not execution.done()
+        query.release.set()
+        return await execution
+
+    assert asyncio.run(main()) == "rows"
+    assert query.thread is not threading.main_thread()
+    assert query.thread.name.startswith("supabase")
+
+
+def test_slow_queries_do_not_serialise_each_other(service):
+    queries = [BlockingQuery() for _ in range(3)]
+
+    async def main():
+        executions = [asyncio.create_task(service.execute(query)) for query in queries]
+        # All three are in flight at once before any is released
+        while not all(query.started.is_set() for query in queries):
+            await asyncio.sleep(0.01)
+        for query in queries:
+            query.release.set()
+        return await asyncio.gather(*executions)
+
+    assert asyncio.run(main()) == ["rows"] * 3
+    assert len({query.thread for query in queries}) == 3
+
+
+def seed_platform(fake_supabase):
+    fake_supabase.tables.update({
+        "wallets": [
+            {"id": 1, "last_active": datetime.utcnow().isoformat()},
+            {"id": 2, "last_active": "2000-01-01T00:00:00"},
+        ],
+        "tokenizations": [{"id": 1, "status": "active"}, {"id": 2, "status": "pending"}],
+        "token_transactions": [{"id": n, "status": "validated" if n % 2 else "failed"} for n in range(5)],
+    })
+
+
+def stats_queries(fake_supabase):
+    return [q for q in fake_supabase.executed if getattr(q, "table", None) == "platform_stats"]
+
+
+def test_platform_stats_are_refreshed_by_the_database_function(service, fake_supabase):
+    today = datetime.utcnow().date().isoformat()
+
+    def refresh_platform_stats():
+        fake_supabase.tables["platform_stats"] = [
+            {"metric_name": name, "metric_value": str(n), "date_recorded": today}
+            for n, name in enumerate(service.PLATFORM_METRICS)
+        ]
+    fake_supabase.functions["refresh_platform_stats"] = refresh_platform_stats
+
+    result = asyncio.run(service.get_platform_stats())
+
+    assert result["success"]
+    assert result["data"]["total_users"] == 0
+    assert result["data"]["successful_transactions"] == 5
+    # Nothing was counted row by row
+    assert not any(getattr(q, "table", None) == "wallets" for q in fake_supabase.executed)
+
+
+def test_platform_stats_fall_back_to_concurrent_counts(service, fake_supabase):
+    seed_platform(fake_supabase)
+
+    stats = asyncio.run(service.get_platform_stats())["data"]
+    stats.pop("total_value_locked")
+
+    assert stats == {
+        "total_users": 2, "active_users": 1,
+        "total_tokenizations": 2, "active_tokenizations": 1,
+        "total_transactions": 5, "successful_transactions": 2,
+    }
+    count_queries = [q for q in fake_supabase.executed if getattr(q, "count", None) == "exact"]
+    assert len(count_queries) == len(service.PLATFORM_METRICS)
+    assert all(q.limit_to == 1 for q in count_queries)
+    # The counts were stored for the next reader, one row per metric
+    assert {row["metric_name"] for row in fake_supabase.tables["platform_stats"]} == set(service.PLATFORM_METRICS)
+
+
+def test_platform_stats_are_cached_until_the_ttl_expires(service, fake_supabase):
+    seed_platform(fake_supabase)
+    asyncio.run(service.get_platform_stats())
+    reads = len(stats_queries(fake_supabase))
+
+    fake_supabase.tables["wallets"].append({"id": 3, "last_active": None})
+    assert asyncio.run(service.get_platform_stats())["data"]["total_users"] == 2
+    assert len(stats_queries(fake_supabase)) == reads
+
+    # Expired: read the stored aggregates again, which still hold the old count
+    service._platform_stats_cache = (0.0, service._platform_stats_cache[1])
+    assert asyncio.run(service.get_platform_stats())["data"]["total_users"] == 2
+    assert len(stats_queries(fake_supabase)) == reads + 1
+
+    # A refresh drops the cached values
+    asyncio.run(service.refresh_platform_stats())
+    assert asyncio.run(service.get_platform_stats())["data"]["total_users"] == 3
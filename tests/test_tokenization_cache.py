@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("xumm")
+
+
+@pytest.fixture
+def service(fake_supabase):
+    from services.tokenization_service import TokenizationService
+
+    fake_supabase.tables["tokenizations"] = [
+        {"id": f"t{n}", "token_symbol": f"TK{n}", "issuer_address": f"rIssuer{n}",
+         "asset_name": f"Asset {n}", "asset_type": "art", "asset_value_usd": 100.0 * n}
+        for n in range(3)
+    ]
+    return TokenizationService()
+
+
+def tokenization_queries(fake_supabase):
+    return [q for q in fake_supabase.executed if getattr(q, "table", None) == "tokenizations"]
+
+
+def test_metadata_for_many_tokens_comes_from_one_bulk_query(service, fake_supabase):
+    tokens = [("TK0", "rIssuer0"), ("TK1", "rIssuer1"), ("TK2", "rIssuer2"), ("TK0", "rIssuer1")]
+
+    found = asyncio.run(service._get_tokenization_metadata(tokens))
+
+    assert len(tokenization_queries(fake_supabase)) == 1
+    assert found[("TK1", "rIssuer1")]["id"] == "t1"
+    # Symbol and issuer both exist, but not as a pair
+    assert found[("TK0", "rIssuer1")] is None
+
+
+def test_cached_records_are_served_until_the_ttl_expires(service, fake_supabase):
+    asyncio.run(service._get_tokenization_metadata([("TK0", "rIssuer0")]))
+    asyncio.run(service._get_tokenization_metadata([("TK0", "rIssuer0")]))
+    assert len(tokenization_queries(fake_supabase)) == 1
+
+    service._metadata_cache[("TK0", "rIssuer0")] = (0.0, service._metadata_cache[("TK0", "rIssuer0")][1])
+    asyncio.run(service._get_tokenization_metadata([("TK0", "rIssuer0")]))
+    assert len(tokenization_queries(fake_supabase)) == 2
+
+
+def test_missing_tokens_are_looked_up_again_once_created_elsewhere(service, fake_supabase):
+    assert asyncio.run(service._get_tokenization_metadata([("NEW", "rIssuer9")])) == {("NEW", "rIssuer9"): None}
+
+    fake_supabase.tables["tokenizations"].append(
+        {"id": "t9", "token_symbol": "NEW", "issuer_address": "rIssuer9"}
+    )
+    found = asyncio.run(service._get_tokenization_metadata([("NEW", "rIssuer9")]))
+
+    assert found[("NEW", "rIssuer9")]["id"] == "t9"
+
+
+def test_least_recently_used_records_are_evicted(service, fake_supabase):
+    service.metadata_max_entries = 2
+    asyncio.run(service._get_tokenization_metadata([("TK0", "rIssuer0"), ("TK1", "rIssuer1")]))
+    asyncio.run(service._get_tokenization_metadata([("TK0", "rIssuer0")]))
+    asyncio.run(service._get_tokenization_metadata([("TK2", "rIssuer2")]))
+
+    assert list(service._metadata_cache) == [("TK0", "rIssuer0"), ("TK2", "rIssuer2")]
+
+
+def test_user_tokens_are_enriched_from_the_bulk_lookup(service, fake_supabase, monkeypatch):
+    from services import tokenization_service as module
+
+    async def get_account_tokens(address):
+        return {"success": True, "tokens": [
+            {"currency": "TK1", "issuer": "rIssuer1", "balance": "5", "limit": "10"},
+            {"currency": "XYZ", "issuer": "rOther", "balance": "1", "limit": "10"},
+        ]}
+    monkeypatch.setattr(module.xrpl_service, "get_account_tokens", get_account_tokens)
+
+    result = asyncio.run(service.get_user_tokens("rUser"))
+
+    assert result["success"]
+    assert result["tokens"][0]["tokenization_id"] == "t1"
+    assert "tokenization_id" not in result["tokens"][1]
+    assert len(tokenization_queries(fake_supabase)) == 1
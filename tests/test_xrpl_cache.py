@@ -0,0 +1,60 @@
+import time
+
+from services.xrpl_cache import ValidatedLedgerCache
+
+
+def test_make_key_ignores_param_order():
+    assert ValidatedLedgerCache.make_key("account_info", {"a": 1, "b": 2}) == \
+        ValidatedLedgerCache.make_key("account_info", {"b": 2, "a": 1})
+
+
+def test_hit_and_miss():
+    cache = ValidatedLedgerCache()
+    key = cache.make_key("account_info", {"account": "r1"})
+
+    assert cache.get(key) is None
+    cache.set(key, {"balance": 1}, ledger_index=10)
+
+    assert cache.get(key) == {"balance": 1}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_newer_ledger_invalidates_and_older_results_are_not_cached():
+    cache = ValidatedLedgerCache()
+    key = cache.make_key("account_info", {"account": "r1"})
+    cache.set(key, "at 10", ledger_index=10)
+
+    cache.advance(11)
+    assert cache.get(key) is None
+    assert cache.invalidations == 1
+
+    # A late response from ledger 10 must not be served as ledger 11
+    cache.set(key, "at 10", ledger_index=10)
+    assert cache.get(key) is None
+    cache.set(key, "at 11", ledger_index=11)
+    assert cache.get(key) == "at 11"
+
+
+def test_ttl_expiry():
+    cache = ValidatedLedgerCache(ttl=0.01)
+    key = cache.make_key("server_info", {})
+    cache.set(key, "info")
+
+    time.sleep(0.02)
+
+    assert cache.get(key) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_eviction():
+    cache = ValidatedLedgerCache(max_entries=2)
+    first, second, third = (cache.make_key("m", {"n": n}) for n in range(3))
+    cache.set(first, 1)
+    cache.set(second, 2)
+    cache.get(first)
+
+    cache.set(third, 3)
+
+    assert cache.get(second) is None
+    assert cache.get(first) == 1
+    assert cache.evictions == 1
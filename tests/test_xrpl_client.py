@@ -0,0 +1,188 @@
+import asyncio
+import json
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("xrpl")
+from websockets.asyncio.server import serve
+from xrpl.models.requests import AccountInfo
+
+from services.xrpl_client import MultiplexedWebsocketClient, PooledJsonRpcClient
+
+
+def account_info(account):
+    return AccountInfo(account=account)
+
+
+def reply(request, **result):
+    return json.dumps({"id": request["id"], "status": "success", "type": "response", "result": result})
+
+
+class FakeRippled:
+    """Websocket server answering account_info with the requested account
+
+    ``behaviour`` maps an account to a coroutine taking (websocket, request)
+    that replaces the default immediate answer.
+    """
+
+    def __init__(self, **behaviour):
+        self.behaviour = behaviour
+        self.connections = 0
+        self.server = None
+
+    async def handler(self, websocket):
+        self.connections += 1
+        async for message in websocket:
+            request = json.loads(message)
+            special = self.behaviour.get(request["account"])
+            if special is not None:
+                await special(self, websocket, request)
+            else:
+                await websocket.send(reply(request, account=request["account"]))
+
+    async def __aenter__(self):
+        self.server = await serve(self.handler, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = f"ws://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def websocket_client(rippled, **kwargs):
+    return MultiplexedWebsocketClient(rippled.url, backoff_base=0.01, **kwargs)
+
+
+async def slow(rippled, websocket, request):
+    await asyncio.sleep(0.2)
+    await websocket.send(reply(request, account=request["account"]))
+
+
+def test_dropped_socket_reconnects_and_answers_in_flight_requests():
+    async def drop_once(rippled, websocket, request):
+        if rippled.connections == 1:
+            await websocket.close()
+        else:
+            await websocket.send(reply(request, account=request["account"]))
+
+    async def scenario():
+        async with FakeRippled(rDrop=drop_once) as rippled:
+            client = websocket_client(rippled, timeout=5)
+            try:
+                response = await client.request(account_info("rDrop"))
+                return response.result, rippled.connections
+            finally:
+                await client.close()
+
+    result, connections = asyncio.run(scenario())
+    assert result["account"] == "rDrop"
+    assert connections == 2
+
+
+def test_in_flight_request_fails_when_reconnecting_fails():
+    async def drop_and_stop(rippled, websocket, request):
+        rippled.server.close()
+        await websocket.close()
+
+    async def scenario():
+        async with FakeRippled(rDrop=drop_and_stop) as rippled:
+            client = websocket_client(rippled, timeout=5, max_reconnect_attempts=2)
+            try:
+                started = asyncio.get_running_loop().time()
+                with pytest.raises(Exception):
+                    await client.request(account_info("rDrop"))
+                return asyncio.get_running_loop().time() - started
+            finally:
+                await client.close()
+
+    # Failed by the drop, not left waiting for the 5s timeout
+    assert asyncio.run(scenario()) < 2
+
+
+def test_websocket_close_waits_for_in_flight_requests():
+    async def scenario():
+        async with FakeRippled(rSlow=slow) as rippled:
+            client = websocket_client(rippled)
+            await client.open()
+            pending = asyncio.ensure_future(client.request(account_info("rSlow")))
+            await asyncio.sleep(0.05)
+            await client.close()
+            return pending.done(), (await pending).result, client.is_open
+
+    done, result, is_open = asyncio.run(scenario())
+    assert done
+    assert result["account"] == "rSlow"
+    assert not is_open
+
+
+def test_json_rpc_close_waits_for_in_flight_requests():
+    async def handler(request):
+        await asyncio.sleep(0.1)
+        account = json.loads(request.content)["params"][0]["account"]
+        return httpx.Response(200, json={"result": {"status": "success", "account": account}})
+
+    async def scenario():
+        client = PooledJsonRpcClient("http://rippled")
+        client._http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        pending = asyncio.ensure_future(client.request(account_info("rSlow")))
+        await asyncio.sleep(0.01)
+        await client.close()
+        return pending.done(), (await pending).result, client.is_open
+
+    done, result, is_open = asyncio.run(scenario())
+    assert done
+    assert result["account"] == "rSlow"
+    assert not is_open
+
+
+def test_concurrent_requests_get_their_own_responses():
+    waiting = []
+
+    async def answer_in_reverse(rippled, websocket, request):
+        waiting.append(request)
+        if len(waiting) == 3:
+            for queued in reversed(waiting):
+                await websocket.send(reply(queued, account=queued["account"], seen=len(waiting)))
+
+    async def scenario():
+        accounts = ["rA", "rB", "rC"]
+        async with FakeRippled(**{account: answer_in_reverse for account in accounts}) as rippled:
+            client = websocket_client(rippled)
+            try:
+                responses = await asyncio.gather(*(client.request(account_info(a)) for a in accounts))
+                return accounts, [response.result["account"] for response in responses]
+            finally:
+                await client.close()
+
+    accounts, answered = asyncio.run(scenario())
+    assert answered == accounts
+    assert len({request["id"] for request in waiting}) == 3
+
+
+def test_timed_out_request_is_cleaned_up_and_the_socket_stays_usable():
+    async def never(rippled, websocket, request):
+        pass
+
+    async def scenario():
+        async with FakeRippled(rSilent=never) as rippled:
+            client = websocket_client(rippled)
+            try:
+                with pytest.raises(asyncio.TimeoutError):
+                    await client.request(account_info("rSilent"), timeout=0.1)
+                ws = client._ws
+                open_requests = dict(ws._open_requests)
+                response = await client.request(account_info("rA"))
+                return open_requests, response.result, client._ws is ws, ws._messages.qsize(), client._inflight
+            finally:
+                await client.close()
+
+    open_requests, result, same_socket, queued, inflight = asyncio.run(scenario())
+    assert open_requests == {}
+    assert result["account"] == "rA"
+    assert same_socket
+    # Responses are delivered through their futures only, never queued
+    assert queued == 0
+    assert inflight == 0
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("xrpl")
+from xrpl.models.response import Response, ResponseStatus
+
+from services.xrpl_client import XRPLRequestError
+from services.xrpl_service import XRPLService
+
+
+class PagedClient:
+    """Answers requests with the given result pages in order, recording each request"""
+
+    def __init__(self, *pages):
+        self.pages = list(pages)
+        self.requests = []
+
+    async def request(self, request, timeout=None):
+        self.requests.append(request.to_dict())
+        result = self.pages.pop(0)
+        status = ResponseStatus.ERROR if "error" in result else ResponseStatus.SUCCESS
+        return Response(status=status, result=result)
+
+
+def service_with(client):
+    service = XRPLService()
+    service.client = client
+    return service
+
+
+async def collect(iterator):
+    return [item async for item in iterator]
+
+
+def line(n):
+    return {"account": f"r{n}", "currency": "USD", "balance": str(n)}
+
+
+def test_account_lines_follow_the_marker_on_one_ledger_until_it_is_missing():
+    client = PagedClient(
+        {"lines": [line(1), line(2)], "marker": "m1", "ledger_index": 500},
+        {"lines": [line(3)], "marker": "m2", "ledger_index": 500},
+        {"lines": [line(4)], "ledger_index": 500},
+    )
+
+    lines = asyncio.run(collect(service_with(client).iter_account_lines("rIssuer", page_size=2)))
+
+    assert [entry["account"] for entry in lines] == ["r1", "r2", "r3", "r4"]
+    assert [request.get("marker") for request in client.requests] == [None, "m1", "m2"]
+    # Later pages are pinned to the ledger the first marker was issued for
+    assert [request["ledger_index"] for request in client.requests] == ["validated", 500, 500]
+
+
+def test_account_lines_stop_at_max_items_without_fetching_more():
+    client = PagedClient({"lines": [line(1), line(2)], "marker": "m1", "ledger_index": 500})
+
+    lines = asyncio.run(collect(service_with(client).iter_account_lines("rIssuer", max_items=1)))
+
+    assert [entry["account"] for entry in lines] == ["r1"]
+    assert len(client.requests) == 1
+
+
+def test_error_mid_run_raises_after_the_pages_already_yielded():
+    client = PagedClient(
+        {"lines": [line(1)], "marker": "m1", "ledger_index": 500},
+        {"error": "lgrNotFound", "error_message": "ledgerNotFound"},
+    )
+    seen = []
+
+    async def scenario():
+        async for entry in service_with(client).iter_account_lines("rIssuer"):
+            seen.append(entry["account"])
+
+    with pytest.raises(XRPLRequestError) as error:
+        asyncio.run(scenario())
+
+    assert error.value.error == "lgrNotFound"
+    assert seen == ["r1"]
+
+
+def test_account_transactions_page_forward_and_cap_the_last_page():
+    client = PagedClient(
+        {"transactions": [{"hash": "a"}, {"hash": "b"}], "marker": {"ledger": 10, "seq": 2}},
+        {"transactions": [{"hash": "c"}]},
+    )
+
+    transactions = asyncio.run(collect(service_with(client).iter_account_transactions(
+        "rIssuer", page_size=2, max_items=3, forward=True, ledger_index_min=7
+    )))
+
+    assert [tx["hash"] for tx in transactions] == ["a", "b", "c"]
+    assert [request["limit"] for request in client.requests] == [2, 1]
+    assert client.requests[1]["marker"] == {"ledger": 10, "seq": 2}
+    assert all(request["forward"] and request["ledger_index_min"] == 7 for request in client.requests)